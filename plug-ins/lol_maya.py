@@ -1,8 +1,17 @@
 from maya.OpenMaya import *
 from maya.OpenMayaAnim import *
 from maya.OpenMayaMPx import *
-from math import sqrt
+import maya.api.OpenMaya as OM2
+import maya.api.OpenMayaAnim as OMA2
+from math import sqrt, ceil, floor, sin, cos, acos, radians
 from struct import Struct
+from mmap import mmap, ACCESS_READ
+from contextlib import contextmanager
+from array import array
+from itertools import chain
+from bisect import bisect_right
+from collections import deque
+from glob import glob
 from random import choice
 from cProfile import Profile
 from pstats import Stats
@@ -176,7 +185,8 @@ class SkinTranslator(MPxFileTranslator):
         skn = SKN()
         skn.dump(skl, riot_skn)
         skn.flip()
-        skn.write(path)
+        # reorder triangles and vertices for gpu cache
+        skn.write(path, optimize='optimize=1' in options)
         return True
 
 
@@ -231,10 +241,40 @@ class ANMTranslator(MPxFileTranslator):
         if not path.endswith('.anm'):
             path += '.anm'
 
+        values = {}
+        for option in options.split(';'):
+            if '=' in option:
+                name, value = option.split('=', 1)
+                values[name.strip()] = value.strip()
+        try:
+            translation_error = float(values.get('translationerror') or 0.1)
+            rotation_error = float(values.get('rotationerror') or 0.1)
+            scale_error = float(values.get('scaleerror') or 0.001)
+            tolerance = float(values.get('tolerance') or 0.000001)
+        except ValueError:
+            raise FunnyError(
+                f'[ANMTranslator.writer()]: Invalid export options: {options}')
+        if tolerance <= 0.0:
+            raise FunnyError(
+                f'[ANMTranslator.writer()]: Tolerance must be positive: {tolerance}')
+
         anm = ANM()
         anm.dump()
         anm.flip()
-        anm.write(path)
+        # sparse keys need r3d2canm, so reduce also compress
+        reduce = values.get('reduce') == '1'
+        compress = reduce or values.get('compress') == '1'
+        if reduce:
+            # drop keys within error
+            anm.reduce(translation_error, rotation_error, scale_error)
+        elif compress:
+            # only drop keys that interpolation rebuilds exactly
+            anm.reduce(0.0, 0.0, 0.0)
+        if compress:
+            anm.write_canm(path)
+        else:
+            anm.write(path, version=5 if values.get('version') == '5' else 4,
+                      tolerance=tolerance)
         return True
 
 
@@ -406,10 +446,17 @@ class MAPGEOTranslator(MPxFileTranslator):
         if 'ssmat=1' not in options:
             ssmat = False
 
+        # only load models on some layers, of a bucket hash or bush/non bush
+        model_filter = MAPGEOFilter.from_options(options)
+
+        # lazy read: geometry of kept models is decoded when flip() first touches it
         mg = MAPGEO()
-        mg.read(path)
-        mg.flip()
-        mg.load(ssmat)
+        try:
+            mg.read(path, lazy=True, model_filter=model_filter)
+            mg.flip()
+            mg.load(ssmat)
+        finally:
+            mg.close()
         return True
 
     def writer(self, file, options, access):
@@ -422,17 +469,18 @@ class MAPGEOTranslator(MPxFileTranslator):
             path += '.mapgeo'
 
         # read riot.mapgeo, path1 = riot_{same name}.mapgeo > path2 = riot.mapgeo
+        # only bucket grids and planar reflector are needed, skip buffers and models
         riot_mapgeo = None
         dirname, basename = MFPath.split(path)
         path1 = dirname + '/' + 'riot_' + basename
         if MFPath.exists(path1):
             riot_mapgeo = MAPGEO()
-            riot_mapgeo.read(path1)
+            riot_mapgeo.read(path1, models=False)
         else:
             path2 = dirname + '/' + 'riot.mapgeo'
             if MFPath.exists(path2):
                 riot_mapgeo = MAPGEO()
-                riot_mapgeo.read(path2)
+                riot_mapgeo.read(path2, models=False)
 
         mg = MAPGEO()
         mg.dump(riot=riot_mapgeo)
@@ -440,10 +488,12 @@ class MAPGEOTranslator(MPxFileTranslator):
         version_choices = ('Version 15 (Latest)', 'Version 13 (Aram)')
         version_choosed = MGlobal.executeCommandStringResult(
             f'confirmDialog -title "Export MAPGEO" -message "Choose .mapgeo file version to export:" -button "{version_choices[0]}" -button "{version_choices[1]}" -icon "question"')
+        # reorder triangles and vertices for gpu cache
+        optimize = 'optimize=1' in options
         if version_choosed ==  version_choices[0]:
-            mg.write(path, version=15)
+            mg.write(path, version=15, optimize=optimize)
         else:
-            mg.write(path, version=13)
+            mg.write(path, version=13, optimize=optimize)
         return True
 
 
@@ -457,7 +507,7 @@ def initializePlugin(obj):
             None,
             SKNTranslator.creator,
             'SKNTranslatorOpts',
-            'skl=1;sepmat=0',
+            'skl=1;sepmat=0;optimize=0',
             True
         )
     except Exception as e:
@@ -496,7 +546,7 @@ def initializePlugin(obj):
             None,
             ANMTranslator.creator,
             'ANMTranslatorOpts',
-            'delchannel=0',
+            'delchannel=0;version=4;compress=0;reduce=0;translationerror=0.1;rotationerror=0.1;scaleerror=0.001;tolerance=0.000001',
             True
         )
     except Exception as e:
@@ -535,7 +585,7 @@ def initializePlugin(obj):
             None,
             MAPGEOTranslator.creator,
             'MAPGEOTranslatorOpts',
-            'ssmat=0',
+            'ssmat=0;layers=;buckethash=;bush=;box=;sphere=;optimize=0',
             True
         )
     except Exception as e:
@@ -619,6 +669,212 @@ class MFPath:
         return dirname, basename
 
 
+# bulk mesh data through maya api 2.0, bridged by dagpath name
+class MMesh:
+
+    @staticmethod
+    def get(dagpath):
+        # api 1.0 dagpath -> api 2.0 MFnMesh
+        selections = OM2.MSelectionList()
+        selections.add(dagpath.fullPathName())
+        return OM2.MFnMesh(selections.getDagPath(0))
+
+    @staticmethod
+    def create(positions, indices, u_values, v_values, uv_indices=None):
+        # create triangle mesh from flat sequences in bulk
+        # positions: x, y, z of each vertex, uv_indices: uv of each index, default = indices
+        # return api 1.0 MFnMesh
+        face_count = len(indices) // 3
+        poly_count = [3] * face_count
+        mesh2 = OM2.MFnMesh()
+        # points array built from (x, y, z) tuples, no python MFloatPoint object per vertex
+        mesh2.create(
+            OM2.MFloatPointArray(
+                list(zip(positions[0::3], positions[1::3], positions[2::3]))),
+            poly_count,
+            list(indices),
+            list(u_values),
+            list(v_values)
+        )
+        mesh2.assignUVs(
+            poly_count, list(indices if uv_indices == None else uv_indices))
+
+        # back to api 1.0 by shape name
+        selections = MSelectionList()
+        selections.add(OM2.MDagPath.getAPathTo(
+            mesh2.object()).fullPathName())
+        dagpath = MDagPath()
+        selections.getDagPath(0, dagpath)
+        return MFnMesh(dagpath)
+
+    @staticmethod
+    def add_uv_set(mesh, name, u_values, v_values, uv_indices):
+        # add a uv set to api 1.0 MFnMesh of triangle mesh in bulk
+        dagpath = MDagPath()
+        mesh.getPath(dagpath)
+        mesh2 = MMesh.get(dagpath)
+        name = mesh2.createUVSet(name)
+        mesh2.setUVs(list(u_values), list(v_values), name)
+        mesh2.assignUVs([3] * (len(uv_indices) // 3),
+                        list(uv_indices), name)
+
+    @staticmethod
+    def set_colors(mesh, colors):
+        # set vertex colors (r, g, b, a of each vertex) of api 1.0 MFnMesh in bulk
+        dagpath = MDagPath()
+        mesh.getPath(dagpath)
+        vertex_count = len(colors) // 4
+        # colors array built from (r, g, b, a) tuples, no python MColor object per vertex
+        MMesh.get(dagpath).setVertexColors(
+            OM2.MColorArray(
+                list(zip(colors[0::4], colors[1::4], colors[2::4], colors[3::4]))),
+            list(range(vertex_count))
+        )
+
+    @staticmethod
+    def select(dagpath, component_type, ids):
+        # select vertices/faces of a mesh in scene
+        component = MFnSingleIndexedComponent()
+        mobject = component.create(component_type)
+        for id in sorted(ids):
+            component.addElement(id)
+        selections = MSelectionList()
+        selections.add(dagpath, mobject)
+        MGlobal.selectCommand(selections)
+
+
+# reorder triangles and vertices for gpu post transform cache and vertex fetch
+class VertexCache:
+    # triangles use the cache of 16 last vertices
+    cache_size = 16
+
+    # simulate a fifo post transform cache, return number of cache misses
+    @staticmethod
+    def misses(indices, cache_size=None):
+        if cache_size == None:
+            cache_size = VertexCache.cache_size
+        cache = deque()
+        cached = set()
+        misses = 0
+        for index in indices:
+            if index not in cached:
+                misses += 1
+                cache.append(index)
+                cached.add(index)
+                if len(cache) > cache_size:
+                    cached.discard(cache.popleft())
+        return misses
+
+    # average cache miss ratio: cache misses per triangle
+    @staticmethod
+    def acmr(indices, cache_size=None):
+        triangle_count = len(indices) // 3
+        if triangle_count == 0:
+            return 0.0
+        return VertexCache.misses(indices, cache_size) / triangle_count
+
+    # tipsify: fan triangles around a vertex still in cache, return reordered indices
+    # Sander, Nehab, Barczak - Fast Triangle Reordering for Vertex Locality and Reduced Overdraw
+    @staticmethod
+    def tipsify(indices, cache_size=None):
+        if cache_size == None:
+            cache_size = VertexCache.cache_size
+        # local vertex ids in order of first use
+        local_ids = {}
+        vertices = []
+        local_indices = []
+        for index in indices:
+            local_id = local_ids.get(index)
+            if local_id == None:
+                local_id = local_ids[index] = len(vertices)
+                vertices.append(index)
+            local_indices.append(local_id)
+        vertex_count = len(vertices)
+        triangle_count = len(indices) // 3
+        if triangle_count == 0:
+            return list(indices)
+
+        # vertex -> triangles use it, unique vertices of each triangle
+        triangles = [
+            tuple(dict.fromkeys(local_indices[i*3:i*3+3])) for i in range(triangle_count)]
+        adjacency = [[] for i in range(vertex_count)]
+        for triangle_id in range(triangle_count):
+            for vertex in triangles[triangle_id]:
+                adjacency[vertex].append(triangle_id)
+        live = [len(triangle_ids) for triangle_ids in adjacency]
+        timestamps = [0]*vertex_count
+        emitted = [False]*triangle_count
+        dead_end = []
+        result = []
+
+        time = cache_size + 1
+        cursor = 0
+        fanning = 0
+        while fanning >= 0:
+            # emit all triangles around fanning vertex
+            candidates = []
+            for triangle_id in adjacency[fanning]:
+                if emitted[triangle_id]:
+                    continue
+                emitted[triangle_id] = True
+                result.extend(local_indices[triangle_id*3:triangle_id*3+3])
+                for vertex in triangles[triangle_id]:
+                    dead_end.append(vertex)
+                    candidates.append(vertex)
+                    live[vertex] -= 1
+                    if time - timestamps[vertex] > cache_size:
+                        timestamps[vertex] = time
+                        time += 1
+
+            # next fanning vertex: still in cache after fanning, oldest one first
+            fanning = -1
+            best_priority = -1
+            for vertex in candidates:
+                if live[vertex] > 0:
+                    priority = 0
+                    if time - timestamps[vertex] + 2*live[vertex] <= cache_size:
+                        priority = time - timestamps[vertex]
+                    if priority > best_priority:
+                        best_priority = priority
+                        fanning = vertex
+            # dead end: recently used vertex that still has triangles
+            if fanning == -1:
+                while len(dead_end) > 0:
+                    vertex = dead_end.pop()
+                    if live[vertex] > 0:
+                        fanning = vertex
+                        break
+            # no recent vertex left: next vertex in input order
+            if fanning == -1:
+                while cursor < vertex_count:
+                    if live[cursor] > 0:
+                        fanning = cursor
+                        break
+                    cursor += 1
+        return [vertices[local_id] for local_id in result]
+
+    # vertices in [start, start+count) by order of first use in indices, then unused ones
+    @staticmethod
+    def fetch_order(indices, start, count):
+        end = start + count
+        order = list(dict.fromkeys(
+            index for index in indices if index >= start and index < end))
+        if len(order) < count:
+            used = set(order)
+            order.extend(
+                index for index in range(start, end) if index not in used)
+        return order
+
+    # new vertex column: new vertex i = old vertex order[i]
+    @staticmethod
+    def reorder(column, width, order):
+        result = array(column.typecode, column)
+        for i in range(width):
+            result[i::width] = array(
+                column.typecode, [column[index*width+i] for index in order])
+        return result
+
+
 # funny error to catch
 class FunnyError(Exception):
     def __init__(self, message):
@@ -687,9 +943,53 @@ class BinaryStream:
     struct_vec3 = Struct('3f')
     struct_quat = Struct('4f')
 
+    # compiled structs of counted reads/writes, example: '12f'
+    structs = {}
+
     def __init__(self, f):
         self.stream = f
 
+    @staticmethod
+    def struct(format):
+        struct = BinaryStream.structs.get(format)
+        if struct == None:
+            struct = Struct(format)
+            BinaryStream.structs[format] = struct
+        return struct
+
+    # open file for reading
+    # mapped: read through a memory map of the file instead of file object
+    @staticmethod
+    @contextmanager
+    def reader(path, mapped=True):
+        with open(path, 'rb') as f:
+            if not mapped:
+                yield BinaryStream(f)
+                return
+            try:
+                buffer = mmap(f.fileno(), 0, access=ACCESS_READ)
+            except ValueError:
+                # empty file cant be mapped
+                yield MemoryStream(b'')
+                return
+            try:
+                yield MemoryStream(buffer)
+            finally:
+                buffer.close()
+
+    # open file for writing
+    # everything is written into 1 bytearray, then flushed to file with 1 write
+    @staticmethod
+    @contextmanager
+    def writer(path):
+        bs = MemoryStream(bytearray())
+        yield bs
+        if len(bs.placeholders) > 0:
+            raise FunnyError(
+                f'[BinaryStream.writer()]: Unfilled placeholders: {", ".join(bs.placeholders)}')
+        with open(path, 'wb') as f:
+            f.write(bs.buffer)
+
     # stuffs
     def seek(self, pos, mode=0):
         self.stream.seek(pos, mode)
@@ -715,48 +1015,51 @@ class BinaryStream:
     def read_bytes(self, length):
         return self.stream.read(length)
 
+    def unpack(self, struct):
+        return struct.unpack(self.stream.read(struct.size))
+
     def read_int16(self, count=1, forcetuple=False):
         if count > 1 or forcetuple:
-            return Struct(f'{count}h').unpack(self.stream.read(2*count))
-        return BinaryStream.struct_int16.unpack(self.stream.read(2))[0]
+            return self.unpack(BinaryStream.struct(f'{count}h'))
+        return self.unpack(BinaryStream.struct_int16)[0]
 
     def read_uint16(self, count=1, forcetuple=False):
         if count > 1 or forcetuple:
-            return Struct(f'{count}H').unpack(self.stream.read(2*count))
-        return BinaryStream.struct_uint16.unpack(self.stream.read(2))[0]
+            return self.unpack(BinaryStream.struct(f'{count}H'))
+        return self.unpack(BinaryStream.struct_uint16)[0]
 
     def read_int32(self, count=1, forcetuple=False):
         if count > 1 or forcetuple:
-            return Struct(f'{count}i').unpack(self.stream.read(4*count))
-        return BinaryStream.struct_int32.unpack(self.stream.read(4))[0]
+            return self.unpack(BinaryStream.struct(f'{count}i'))
+        return self.unpack(BinaryStream.struct_int32)[0]
 
     def read_uint32(self, count=1, forcetuple=False):
         if count > 1 or forcetuple:
-            return Struct(f'{count}I').unpack(self.stream.read(4*count))
-        return BinaryStream.struct_uint32.unpack(self.stream.read(4))[0]
+            return self.unpack(BinaryStream.struct(f'{count}I'))
+        return self.unpack(BinaryStream.struct_uint32)[0]
 
     def read_float(self, count=1, forcetuple=False):
         if count > 1 or forcetuple:
-            return Struct(f'{count}f').unpack(self.stream.read(4*count))
-        return BinaryStream.struct_float.unpack(self.stream.read(4))[0]
+            return self.unpack(BinaryStream.struct(f'{count}f'))
+        return self.unpack(BinaryStream.struct_float)[0]
 
     def read_vec2(self, count=1, forcetuple=False):
         if count > 1 or forcetuple:
-            floats = Struct(f'{count*2}f').unpack(self.stream.read(8*count))
+            floats = self.unpack(BinaryStream.struct(f'{count*2}f'))
             return [Vector(floats[i], floats[i+1]) for i in range(0, len(floats), 2)]
-        return Vector(*BinaryStream.struct_vec2.unpack(self.stream.read(8)))
+        return Vector(*self.unpack(BinaryStream.struct_vec2))
 
     def read_vec3(self, count=1, forcetuple=False):
         if count > 1 or forcetuple:
-            floats = Struct(f'{count*3}f').unpack(self.stream.read(12*count))
+            floats = self.unpack(BinaryStream.struct(f'{count*3}f'))
             return [Vector(floats[i], floats[i+1], floats[i+2]) for i in range(0, len(floats), 3)]
-        return Vector(*BinaryStream.struct_vec3.unpack(self.stream.read(12)))
+        return Vector(*self.unpack(BinaryStream.struct_vec3))
 
     def read_quat(self, count=1, forcetuple=False):
         if count > 1 or forcetuple:
-            floats = Struct(f'{count*4}f').unpack(self.stream.read(16*count))
+            floats = self.unpack(BinaryStream.struct(f'{count*4}f'))
             return [Quaternion(floats[i], floats[i+1], floats[i+2], floats[i+3]) for i in range(0, len(floats), 4)]
-        return Quaternion(*BinaryStream.struct_quat.unpack(self.stream.read(16)))
+        return Quaternion(*self.unpack(BinaryStream.struct_quat))
 
     def read_ascii(self, length):
         return self.stream.read(length).decode('ascii')
@@ -777,79 +1080,259 @@ class BinaryStream:
     def write_bytes(self, bytes):
         self.stream.write(bytes)
 
+    def pack(self, struct, *values):
+        self.write_bytes(struct.pack(*values))
+
     def write_int16(self, *values):
         count = len(values)
         if count > 1:
-            self.stream.write(Struct(f'{count}h').pack(*values))
+            self.pack(BinaryStream.struct(f'{count}h'), *values)
             return
-        self.stream.write(BinaryStream.struct_int16.pack(values[0]))
+        self.pack(BinaryStream.struct_int16, values[0])
 
     def write_uint16(self, *values):
         count = len(values)
         if count > 1:
-            self.stream.write(Struct(f'{count}H').pack(*values))
+            self.pack(BinaryStream.struct(f'{count}H'), *values)
             return
-        self.stream.write(BinaryStream.struct_uint16.pack(values[0]))
+        self.pack(BinaryStream.struct_uint16, values[0])
 
     def write_int32(self, *values):
         count = len(values)
         if count > 1:
-            self.stream.write(Struct(f'{count}i').pack(*values))
+            self.pack(BinaryStream.struct(f'{count}i'), *values)
             return
-        self.stream.write(BinaryStream.struct_int32.pack(values[0]))
+        self.pack(BinaryStream.struct_int32, values[0])
 
     def write_uint32(self, *values):
         count = len(values)
         if count > 1:
-            self.stream.write(Struct(f'{count}I').pack(*values))
+            self.pack(BinaryStream.struct(f'{count}I'), *values)
             return
-        self.stream.write(BinaryStream.struct_uint32.pack(values[0]))
+        self.pack(BinaryStream.struct_uint32, values[0])
 
     def write_float(self, *values):
         count = len(values)
         if count > 1:
-            self.stream.write(Struct(f'{count}f').pack(*values))
+            self.pack(BinaryStream.struct(f'{count}f'), *values)
             return
-        self.stream.write(BinaryStream.struct_float.pack(values[0]))
+        self.pack(BinaryStream.struct_float, values[0])
 
     def write_vec2(self, *vec2s):
         count = len(vec2s)
         if count > 1:
             floats = [value for vec in vec2s for value in vec]
-            self.stream.write(Struct(f'{len(floats)}f').pack(*floats))
+            self.pack(BinaryStream.struct(f'{len(floats)}f'), *floats)
             return
-        self.stream.write(BinaryStream.struct_vec2.pack(*vec2s[0]))
+        self.pack(BinaryStream.struct_vec2, *vec2s[0])
 
     def write_vec3(self, *vec3s):
         count = len(vec3s)
         if count > 1:
             floats = [value for vec in vec3s for value in vec]
-            self.stream.write(Struct(f'{len(floats)}f').pack(*floats))
+            self.pack(BinaryStream.struct(f'{len(floats)}f'), *floats)
             return
-        self.stream.write(BinaryStream.struct_vec3.pack(*vec3s[0]))
+        self.pack(BinaryStream.struct_vec3, *vec3s[0])
 
     def write_quat(self, *quats):
         count = len(quats)
         if count > 1:
             floats = [value for vec in quats for value in vec]
-            self.stream.write(Struct(f'{len(floats)}f').pack(*floats))
+            self.pack(BinaryStream.struct(f'{len(floats)}f'), *floats)
             return
-        self.stream.write(BinaryStream.struct_quat.pack(*quats[0]))
+        self.pack(BinaryStream.struct_quat, *quats[0])
 
     def write_ascii(self, value):
-        self.stream.write(value.encode('ascii'))
+        self.write_bytes(value.encode('ascii'))
 
     def write_padded_ascii(self, length, value):
-        self.stream.write(
+        self.write_bytes(
             value.encode('ascii') + bytes([0])*(length-len(value)))
 
 
+# same as BinaryStream but work on a buffer (bytes, bytearray, mmap) with its own cursor
+# read with unpack_from straight from buffer, no file read + bytes object per field
+# write with pack_into a growable bytearray, no file write per field
+class MemoryStream(BinaryStream):
+    def __init__(self, buffer):
+        self.stream = None
+        self.buffer = buffer
+        self.pos = 0
+
+        # name -> (offset, struct) of values to fill later
+        self.placeholders = {}
+
+    # stuffs
+    def seek(self, pos, mode=0):
+        if mode == 1:
+            pos += self.pos
+        elif mode == 2:
+            pos += len(self.buffer)
+        self.pos = pos
+
+    def tell(self):
+        return self.pos
+
+    def pad(self, length):
+        self.pos += length
+        return None
+
+    def end(self):
+        return len(self.buffer)
+
+    # reads
+    def read_byte(self):
+        pos = self.pos
+        self.pos += 1
+        return bytes(self.buffer[pos:pos+1])
+
+    def read_bytes(self, length):
+        pos = self.pos
+        self.pos += length
+        return bytes(self.buffer[pos:pos+length])
+
+    def unpack(self, struct):
+        pos = self.pos
+        self.pos += struct.size
+        return struct.unpack_from(self.buffer, pos)
+
+    def read_ascii(self, length):
+        return self.read_bytes(length).decode('ascii')
+
+    def read_padded_ascii(self, length):
+        return self.read_bytes(length).replace(b'\x00', b'').decode('ascii')
+
+    def read_char_until_zero(self):
+        pos = self.pos
+        end = self.buffer.find(b'\x00', pos)
+        if end == -1:
+            raise IndexError(
+                f'[MemoryStream.read_char_until_zero()]: No zero byte found after {pos}.')
+        self.pos = end + 1
+        # 1 byte = 1 char, same as chr()
+        return bytes(self.buffer[pos:end]).decode('latin-1')
+
+    # writes
+    def write_bytes(self, data):
+        pos = self.pos
+        end = pos + len(data)
+        if pos == len(self.buffer):
+            self.buffer += data
+        else:
+            if end > len(self.buffer):
+                # writing after a seek past the end: fill the gap with 0
+                self.buffer.extend(bytes(end - len(self.buffer)))
+            self.buffer[pos:end] = data
+        self.pos = end
+
+    def pack(self, struct, *values):
+        pos = self.pos
+        end = pos + struct.size
+        if end > len(self.buffer):
+            self.buffer.extend(bytes(end - len(self.buffer)))
+        struct.pack_into(self.buffer, pos, *values)
+        self.pos = end
+
+    # reserve space for values that are only known later: offsets, resource size...
+    def placeholder(self, name, struct):
+        self.placeholders[name] = (self.pos, struct)
+        self.write_bytes(bytes(struct.size))
+
+    def fill(self, name, *values):
+        pos, struct = self.placeholders.pop(name)
+        struct.pack_into(self.buffer, pos, *values)
+
+
+# fixed size record layout of binary tables, example: skl joint, scb face
+# compiled once into cached structs, read/write N records in 1 pass
+class Record:
+    def __init__(self, *fields):
+        # fields: (name, format), name = None for padding
+        self.fields = fields
+        self.format = '<' + ''.join(format for name, format in fields)
+        self.struct = Struct(self.format)
+        self.size = self.struct.size
+
+        # name -> slice of values in an unpacked record
+        # name -> byte offset in a packed record
+        self.slices = {}
+        self.offsets = {}
+        value_index = 0
+        offset = 0
+        for name, format in fields:
+            field_struct = Struct('<' + format)
+            value_count = len(field_struct.unpack(bytes(field_struct.size)))
+            if name != None:
+                self.slices[name] = slice(value_index, value_index + value_count)
+                self.offsets[name] = offset
+            value_index += value_count
+            offset += field_struct.size
+
+        # name -> struct to read only that field of each record
+        self.column_structs = {}
+
+    def read(self, bs, count):
+        data = bs.read_bytes(self.size * count)
+        return list(self.struct.iter_unpack(data))
+
+    def pack(self, records):
+        size = self.size
+        pack_into = self.struct.pack_into
+        buffer = bytearray(size * len(records))
+        offset = 0
+        for record in records:
+            pack_into(buffer, offset, *record)
+            offset += size
+        return buffer
+
+    def write(self, bs, records):
+        bs.write_bytes(self.pack(records))
+
+    # unpack only 1 field of all records in data
+    def column(self, data, name):
+        struct = self.column_structs.get(name)
+        if struct == None:
+            format = next(
+                format for field_name, format in self.fields if field_name == name)
+            before = self.offsets[name]
+            after = self.size - before - Struct('<' + format).size
+            struct = Struct(f'<{before}x{format}{after}x')
+            self.column_structs[name] = struct
+        return struct.iter_unpack(data)
+
+    # unpack only 1 field of all records in data into a flat array
+    # the field must be values of typecode only
+    # and its offset, record size must be multiples of typecode size
+    def column_array(self, data, name, typecode):
+        values = array(typecode, data)
+        item_size = values.itemsize
+        stride = self.size // item_size
+        start = self.offsets[name] // item_size
+        width = self.slices[name].stop - self.slices[name].start
+        column = array(typecode, bytes(len(values) // stride * width * item_size))
+        for i in range(width):
+            column[i::width] = values[start+i::stride]
+        return column
+
+
 # for convert anm/skl joint name to elf hash
 class Hash:
+    # lowercase name -> elf hash
+    elf_cache = {}
+    # elf hash -> known names, loaded on first unhash
+    names = None
+    # known names file next to this plugin, 1 name per line
+    # built from characters folder if not existed, user can add more names to it
+    names_path = MFPath.split(__file__.replace('\\', '/'))[0] + \
+        '/lol_maya_names.txt'
+
     # ay yo check out this elf: https://i.imgur.com/Cvl8PFu.png
     @staticmethod
     def elf(s):
         s = s.lower()
+        h = Hash.elf_cache.get(s)
+        if h != None:
+            return h
         h = 0
         for c in s:
             h = (h << 4) + ord(c)
@@ -857,8 +1340,49 @@ class Hash:
             if t != 0:
                 h ^= (t >> 24)
             h &= ~t
+        Hash.elf_cache[s] = h
         return h
 
+    @staticmethod
+    def unhash(h):
+        # return known names of this hash
+        if Hash.names == None:
+            Hash.load_names()
+        return Hash.names.get(h, [])
+
+    @staticmethod
+    def add_name(name):
+        h = Hash.elf(name)
+        if h not in Hash.names:
+            Hash.names[h] = []
+        if name not in Hash.names[h]:
+            Hash.names[h].append(name)
+
+    @staticmethod
+    def load_names():
+        Hash.names = {}
+        if not MFPath.exists(Hash.names_path):
+            Hash.build_names()
+        with open(Hash.names_path, 'r') as f:
+            for line in f:
+                name = line.strip()
+                if name != '' and not name.startswith('#'):
+                    Hash.add_name(name)
+
+    @staticmethod
+    def build_names():
+        # collect joint names of all skls in characters folder
+        names = set()
+        root = MFPath.split(MFPath.split(Hash.names_path)[0])[0]
+        for path in glob(root + '/characters/**/*.skl', recursive=True):
+            skl = SKL()
+            skl.read(path.replace('\\', '/'))
+            names.update(joint.name for joint in skl.joints)
+        with open(Hash.names_path, 'w') as f:
+            f.write('# known joint names for unhashing, 1 name per line\n')
+            for name in sorted(names):
+                f.write(name + '\n')
+
 
 # for decompress v5 anm vecs & quats
 class CTransform:
@@ -894,6 +1418,104 @@ class CTransform:
             (max.z - min.z) / 65535.0 * (bytes[4] | bytes[5] << 8) + min.z
         )
 
+    @staticmethod
+    def decompress_quats(data):
+        # decompress a buffer of packed 6 bytes quats at once
+        # return flat array of x, y, z, w
+        count = len(data) // 6
+        words = BinaryStream.struct(f'<{count*3}H').unpack(data)
+        first = words[0::3]
+        second = words[1::3]
+        third = words[2::3]
+        one_div_sqrt2 = 0.70710678118
+        sqrt2_div_32767 = 0.00004315969
+
+        # same bits as decompress_quat, split on 16 bits words
+        a = [(((s >> 14) | (t << 2)) & 32767) * sqrt2_div_32767 - one_div_sqrt2
+             for s, t in zip(second, third)]
+        b = [(((f >> 15) | (s << 1)) & 32767) * sqrt2_div_32767 - one_div_sqrt2
+             for f, s in zip(first, second)]
+        c = [(f & 32767) * sqrt2_div_32767 - one_div_sqrt2
+             for f in first]
+        d = [sqrt(max(0.0, 1.0 - (x * x + y * y + z * z)))
+             for x, y, z in zip(a, b, c)]
+        max_indices = [(t >> 13) & 3 for t in third]
+
+        # the largest component is d, others keep their order
+        quats = array('f', bytes(count * 16))
+        quats[0::4] = array('f', [
+            dd if i == 0 else aa
+            for i, aa, dd in zip(max_indices, a, d)
+        ])
+        quats[1::4] = array('f', [
+            dd if i == 1 else (aa if i == 0 else bb)
+            for i, aa, bb, dd in zip(max_indices, a, b, d)
+        ])
+        quats[2::4] = array('f', [
+            dd if i == 2 else (cc if i == 3 else bb)
+            for i, bb, cc, dd in zip(max_indices, b, c, d)
+        ])
+        quats[3::4] = array('f', [
+            dd if i == 3 else cc
+            for i, cc, dd in zip(max_indices, c, d)
+        ])
+        return quats
+
+    @staticmethod
+    def decompress_vecs(min, max, data):
+        # decompress a buffer of packed 6 bytes vecs at once
+        # return flat array of x, y, z
+        count = len(data) // 6
+        words = BinaryStream.struct(f'<{count*3}H').unpack(data)
+        vecs = array('f', bytes(count * 12))
+        for i, low, high in ((0, min.x, max.x), (1, min.y, max.y), (2, min.z, max.z)):
+            step = (high - low) / 65535.0
+            vecs[i::3] = array('f', [step * word + low for word in words[i::3]])
+        return vecs
+
+    @staticmethod
+    def compress_quats(data):
+        # compress flat array of x, y, z, w into packed 6 bytes quats
+        # inverse of decompress_quats
+        one_div_sqrt2 = 0.70710678118
+        sqrt2_div_32767 = 0.00004315969
+
+        words = []
+        for x, y, z, w in zip(data[0::4], data[1::4], data[2::4], data[3::4]):
+            length = sqrt(x * x + y * y + z * z + w * w)
+            quat = [x / length, y / length, z / length, w / length] if length > 0.0 else [
+                0.0, 0.0, 0.0, 1.0]
+            # drop the largest component, keep it positive so it can be rebuilt from the others
+            max_index = 0
+            for i in range(1, 4):
+                if abs(quat[i]) > abs(quat[max_index]):
+                    max_index = i
+            if quat[max_index] < 0.0:
+                quat = [-value for value in quat]
+            del quat[max_index]
+
+            bits = max_index << 45
+            for value, shift in zip(quat, (30, 15, 0)):
+                word = round((value + one_div_sqrt2) / sqrt2_div_32767)
+                bits |= min(max(word, 0), 32767) << shift
+            words.extend((bits & 65535, (bits >> 16) & 65535, bits >> 32))
+        return BinaryStream.struct(f'<{len(words)}H').pack(*words)
+
+    @staticmethod
+    def compress_vecs(min, max, data):
+        # compress flat array of x, y, z into packed 6 bytes vecs in min/max range
+        # inverse of decompress_vecs
+        count = len(data) // 3
+        words = [0] * (count * 3)
+        for i, low, high in ((0, min.x, max.x), (1, min.y, max.y), (2, min.z, max.z)):
+            # min/max are the range here, clamp by hand
+            scale = 65535.0 / (high - low) if high > low else 0.0
+            words[i::3] = [
+                0 if word < 0 else (65535 if word > 65535 else word)
+                for word in (round((value - low) * scale) for value in data[i::3])
+            ]
+        return BinaryStream.struct(f'<{count*3}H').pack(*words)
+
 
 # for set skl joint transform (transformation matrix)
 class MTransform:
@@ -983,12 +1605,59 @@ class SKLJoint:
 
 
 class SKL:
+    joint_record = Record(
+        ('flags', 'H'),
+        ('id', 'H'),
+        ('parent', 'h'),  # cant be uint
+        ('flags2', 'H'),
+        ('hash', 'I'),
+        ('radius', 'f'),
+        ('local_translation', '3f'),
+        ('local_scale', '3f'),
+        ('local_rotation', '4f'),
+        ('iglobal_translation', '3f'),
+        ('iglobal_scale', '3f'),
+        ('iglobal_rotation', '4f'),
+        ('name_offset', 'i')
+    )
+    legacy_joint_record = Record(
+        ('name', '32s'),
+        ('parent', 'i'),  # -1, cant be uint
+        ('radius', 'f'),
+        ('global_matrix', '12f')
+    )
+
     def __init__(self):
         self.joints = []
 
         # for loading as skincluster
         self.influences = []
 
+        # joint name -> joint id
+        self.name_indices = {}
+        # lowercase joint name -> joint ids
+        self.lower_name_indices = {}
+        # joint dagpath full path name -> joint id
+        self.dagpath_indices = {}
+
+    def index_joints(self):
+        # build joint indexes, first joint wins if names/dagpaths are duplicated
+        self.name_indices = {}
+        self.lower_name_indices = {}
+        self.dagpath_indices = {}
+        for i in range(len(self.joints)):
+            joint = self.joints[i]
+            if joint.name not in self.name_indices:
+                self.name_indices[joint.name] = i
+            lower_name = joint.name.lower()
+            if lower_name not in self.lower_name_indices:
+                self.lower_name_indices[lower_name] = []
+            self.lower_name_indices[lower_name].append(i)
+            if joint.dagpath != None:
+                dagpath_name = joint.dagpath.fullPathName()
+                if dagpath_name not in self.dagpath_indices:
+                    self.dagpath_indices[dagpath_name] = i
+
     def flip(self):
         # flip the L with R: https://youtu.be/2yzMUs3badc
         for joint in self.joints:
@@ -1002,10 +1671,8 @@ class SKL:
                 joint.iglobal_rotation.y = -joint.iglobal_rotation.y
                 joint.iglobal_rotation.z = -joint.iglobal_rotation.z
 
-    def read(self, path):
-        with open(path, 'rb') as f:
-            bs = BinaryStream(f)
-
+    def read(self, path, mapped=True):
+        with BinaryStream.reader(path, mapped) as bs:
             bs.pad(4)  # resource size
             magic = bs.read_uint32()
             if magic == 0x22FD4FC3:
@@ -1027,29 +1694,31 @@ class SKL:
                 # read joints
                 if joints_offset > 0 and joint_count > 0:
                     bs.seek(joints_offset)
+                    records = SKL.joint_record.read(bs, joint_count)
+                    slices = SKL.joint_record.slices
+                    name_offset_offset = SKL.joint_record.offsets['name_offset']
                     self.joints = [SKLJoint() for i in range(joint_count)]
                     for i in range(joint_count):
                         joint = self.joints[i]
+                        record = records[i]
 
-                        bs.pad(4)  # flags and id
-                        joint.parent = bs.read_int16()  # cant be uint
-                        bs.pad(2)  # flags
-                        joint_hash = bs.read_uint32()
-                        bs.pad(4)  # radius
+                        joint.parent = record[slices['parent']][0]
+                        joint_hash = record[slices['hash']][0]
 
                         # local
-                        joint.local_translation = bs.read_vec3()
-                        joint.local_scale = bs.read_vec3()
-                        joint.local_rotation = bs.read_quat()
+                        joint.local_translation = Vector(
+                            *record[slices['local_translation']])
+                        joint.local_scale = Vector(
+                            *record[slices['local_scale']])
+                        joint.local_rotation = Quaternion(
+                            *record[slices['local_rotation']])
 
                         # inversed global - no need to read
-                        # translation, scale, rotation (quat)
-                        bs.pad(40)
 
                         # name
-                        joint_name_offset = bs.read_int32()
-                        return_offset = bs.tell()
-                        bs.seek(return_offset - 4 + joint_name_offset)
+                        # offset is relative to the name offset field
+                        bs.seek(
+                            joints_offset + i * SKL.joint_record.size + name_offset_offset + record[slices['name_offset']][0])
                         joint.name = bs.read_char_until_zero()
 
                         # skl convert 0.1 fix before return
@@ -1060,13 +1729,15 @@ class SKL:
                             # read the rest
                             joint.name = bs.read_char_until_zero()
 
-                            # brute force unhash 2 letters
-
-                            table = '_abcdefighjklmnopqrstuvwxyz'
-                            names = [
-                                a+b+joint.name for a in table for b in table]
-                            founds = [name.capitalize() for name in names if Hash.elf(
-                                name) == joint_hash]
+                            # known names first, then brute force unhash 2 letters
+                            founds = [name for name in Hash.unhash(
+                                joint_hash) if name.lower().endswith(joint.name.lower())]
+                            if len(founds) == 0:
+                                table = '_abcdefighjklmnopqrstuvwxyz'
+                                names = [
+                                    a+b+joint.name for a in table for b in table]
+                                founds = [name.capitalize() for name in names if Hash.elf(
+                                    name) == joint_hash]
                             if len(founds) == 1:
                                 joint.name = founds[0]
                             else:
@@ -1076,8 +1747,6 @@ class SKL:
                                 MGlobal.displayWarning(
                                     f'[SKL.load()]: {joint.name} is a bad joint name, please rename it.{msg}')
 
-                        bs.seek(return_offset)
-
                 # read influences
                 if influences_offset > 0 and influence_count > 0:
                     bs.seek(influences_offset)
@@ -1103,17 +1772,22 @@ class SKL:
                 bs.pad(4)  # designer id or skl id
 
                 joint_count = bs.read_uint32()
+                records = SKL.legacy_joint_record.read(bs, joint_count)
+                slices = SKL.legacy_joint_record.slices
                 self.joints = [SKLJoint() for i in range(joint_count)]
                 for i in range(joint_count):
                     joint = self.joints[i]
+                    record = records[i]
 
-                    joint.name = bs.read_padded_ascii(32)
-                    joint.parent = bs.read_int32()  # -1, cant be uint
-                    bs.pad(4)  # radius/scale - pad
+                    joint.name = record[slices['name']][0].replace(
+                        b'\x00', b'').decode('ascii')
+                    joint.parent = record[slices['parent']][0]
+                    # radius/scale - pad
+                    global_matrix = record[slices['global_matrix']]
                     py_list = [0.0]*16
                     for c in range(3):
                         for r in range(4):
-                            py_list[r*4+c] = bs.read_float()
+                            py_list[r*4+c] = global_matrix[c*4+r]
                     py_list[15] = 1.0
                     matrix = MMatrix()
                     MScriptUtil.createMatrixFromList(py_list, matrix)
@@ -1140,13 +1814,13 @@ class SKL:
                                 joint.global_matrix * self.joints[joint.parent].global_matrix.inverse()),
                             MSpace.kWorld
                         )
+        self.index_joints()
 
     def write(self, path):
-        with open(path, 'wb') as f:
-            bs = BinaryStream(f)
-
+        with BinaryStream.writer(path) as bs:
             # resource size, magic, version
-            bs.write_uint32(0, 0x22FD4FC3, 0)
+            bs.placeholder('resource size', BinaryStream.struct_uint32)
+            bs.write_uint32(0x22FD4FC3, 0)
 
             joint_count = len(self.joints)
 
@@ -1179,25 +1853,29 @@ class SKL:
                 bs.write_bytes(bytes([0]))  # pad
 
             bs.seek(joints_offset)
+            name_offset_offset = SKL.joint_record.offsets['name_offset']
+            records = []
             for i in range(joint_count):
                 joint = self.joints[i]
-
-                bs.write_uint16(0, i)  # flags + id
-                bs.write_int16(joint.parent)  # -1, cant be uint
-                bs.write_uint16(0)  # flags
-                bs.write_uint32(Hash.elf(joint.name))
-                bs.write_float(2.1)  # radius/scale
-
-                # local
-                bs.write_vec3(joint.local_translation)
-                bs.write_vec3(joint.local_scale)
-                bs.write_quat(joint.local_rotation)
-                # inversed global
-                bs.write_vec3(joint.iglobal_translation)
-                bs.write_vec3(joint.iglobal_scale)
-                bs.write_quat(joint.iglobal_rotation)
-
-                bs.write_int32(joint_offset[i] - bs.tell())
+                records.append((
+                    0, i,  # flags + id
+                    joint.parent,  # -1, cant be uint
+                    0,  # flags
+                    Hash.elf(joint.name),
+                    2.1,  # radius/scale
+                    # local
+                    *joint.local_translation,
+                    *joint.local_scale,
+                    *joint.local_rotation,
+                    # inversed global
+                    *joint.iglobal_translation,
+                    *joint.iglobal_scale,
+                    *joint.iglobal_rotation,
+                    # name offset, relative to this field
+                    joint_offset[i] - (joints_offset + i *
+                                       SKL.joint_record.size + name_offset_offset)
+                ))
+            SKL.joint_record.write(bs, records)
 
             # influences v1: 0, 1, 2... -> len(joints)
             bs.seek(influences_offset)
@@ -1210,8 +1888,7 @@ class SKL:
                 bs.write_uint32(Hash.elf(joint.name))
 
             # resource size
-            bs.seek(0)
-            bs.write_uint32(bs.end())
+            bs.fill('resource size', bs.end())
 
     def load(self):
         # find joint existed in scene
@@ -1220,11 +1897,9 @@ class SKL:
             dagpath = MDagPath()
             iterator.getPath(dagpath)
             ik_joint = MFnIkJoint(dagpath)
-            joint_name = ik_joint.name()
-            match_joint = next(
-                (joint for joint in self.joints if joint.name == joint_name), None)
-            if match_joint != None:
-                match_joint.dagpath = dagpath
+            match_id = self.name_indices.get(ik_joint.name())
+            if match_id != None:
+                self.joints[match_id].dagpath = dagpath
             iterator.next()
 
         # create joint if not existed
@@ -1288,6 +1963,7 @@ class SKL:
             )
             self.joints.append(joint)
             iterator.next()
+        self.index_joints()
 
         # sort joints to match riot.skl joints order
         if riot != None:
@@ -1299,17 +1975,19 @@ class SKL:
             riot_joint_count = len(riot.joints)
             # for adding extra joint at the end of list
             flags = [True] * joint_count
+            # lowercase name -> scene joint ids that not matched yet
+            lower_name_indices = {
+                name: list(ids) for name, ids in self.lower_name_indices.items()}
 
             # find riot joint in scene
             for riot_joint in riot.joints:
-                riot_joint_name = riot_joint.name.lower()
+                ids = lower_name_indices.get(riot_joint.name.lower())
                 found = False
-                for i in range(joint_count):
-                    if flags[i] and self.joints[i].name.lower() == riot_joint_name:
-                        new_joints.append(self.joints[i])
-                        flags[i] = False
-                        found = True
-                        break
+                if ids != None and len(ids) > 0:
+                    i = ids.pop(0)
+                    new_joints.append(self.joints[i])
+                    flags[i] = False
+                    found = True
                 # if not found riot join in current scene -> not enough joints to match riot joints -> bad
                 # fill empty joint
                 if not found:
@@ -1403,7 +2081,8 @@ class SKL:
             self.joints = new_joints
 
         # link parent
-        joint_count = len(self.joints)
+        # joints are sorted, index again
+        self.index_joints()
         for joint in self.joints:
             if joint.dagpath == None:
                 continue
@@ -1413,8 +2092,8 @@ class SKL:
                 parent_dagpath = MDagPath()
                 MFnIkJoint(ik_joint.parent(0)).getPath(parent_dagpath)
                 # find parent id by parent dagpath
-                match_id = next((id for id in range(
-                    joint_count) if self.joints[id].dagpath == parent_dagpath), None)
+                match_id = self.dagpath_indices.get(
+                    parent_dagpath.fullPathName())
                 if match_id != None:
                     joint.parent = match_id
             else:
@@ -1429,28 +2108,10 @@ class SKL:
 
 
 # skn
-class SKNVertex:
-    __slots__ = (
-        'position', 'influences', 'weights', 'normal', 'uv',
-        'uv_index', 'new_index'
-    )
-
-    def __init__(self):
-        self.position = None
-        self.influences = None
-        self.weights = None
-        self.normal = None
-        self.uv = None
-
-        # for dumping
-        self.uv_index = None
-        self.new_index = None
-
-
 class SKNSubmesh:
     __slots__ = (
         'name', 'vertex_start', 'vertex_count', 'index_start', 'index_count',
-        'indices', 'vertices'
+        'indices', 'positions', 'influences', 'weights', 'normals', 'uvs'
     )
 
     def __init__(self):
@@ -1462,29 +2123,64 @@ class SKNSubmesh:
 
         # for dumping
         self.indices = []
-        self.vertices = []
+        self.positions = array('f')
+        self.influences = array('B')
+        self.weights = array('f')
+        self.normals = array('f')
+        self.uvs = array('f')
 
 
 class SKN:
+    submesh_record = Record(
+        ('name', '64s'),
+        ('vertex_start', 'I'),
+        ('vertex_count', 'I'),
+        ('index_start', 'I'),
+        ('index_count', 'I')
+    )
+    face_record = Record(
+        ('indices', '3H')
+    )
+    # vertex type -> vertex record
+    # 0: basic, 1: color, 2: tangent
+    vertex_records = {
+        vertex_type: Record(
+            ('position', '3f'),
+            ('influences', '4B'),
+            ('weights', '4f'),
+            ('normal', '3f'),
+            ('uv', '2f'),
+            (None, f'{pad}x')  # color, tangent
+        )
+        for vertex_type, pad in ((0, 0), (1, 4), (2, 20))
+    }
+
     def __init__(self):
-        self.indices = []
-        self.vertices = []
+        self.indices = array('H')
         self.submeshes = []
 
+        # vertices as flat arrays, not 1 object per vertex
+        # 3 floats position, 4 bytes influences, 4 floats weights, 3 floats normal, 2 floats uv
+        self.positions = array('f')
+        self.influences = array('B')
+        self.weights = array('f')
+        self.normals = None  # not read, only dumped
+        self.uvs = array('f')
+
         # for loading
         self.name = None
 
-    def flip(self):
-        for vertex in self.vertices:
-            vertex.position.x = -vertex.position.x
-            if vertex.normal != None:
-                vertex.normal.y = -vertex.normal.y
-                vertex.normal.z = -vertex.normal.z
+    def vertex_count(self):
+        return len(self.positions) // 3
 
-    def read(self, path):
-        with open(path, 'rb') as f:
-            bs = BinaryStream(f)
+    def flip(self):
+        self.positions[0::3] = array('f', [-x for x in self.positions[0::3]])
+        if self.normals != None:
+            self.normals[1::3] = array('f', [-y for y in self.normals[1::3]])
+            self.normals[2::3] = array('f', [-z for z in self.normals[2::3]])
 
+    def read(self, path, mapped=True):
+        with BinaryStream.reader(path, mapped) as bs:
             magic = bs.read_uint32()
             if magic != 0x00112233:
                 raise FunnyError(
@@ -1515,12 +2211,13 @@ class SKN:
             else:
                 # read submeshes
                 submesh_count = bs.read_uint32()
+                records = SKN.submesh_record.read(bs, submesh_count)
                 self.submeshes = [SKNSubmesh() for i in range(submesh_count)]
                 for i in range(submesh_count):
                     submesh = self.submeshes[i]
-                    submesh.name = bs.read_padded_ascii(64)
-                    submesh.vertex_start, submesh.vertex_count, submesh.index_start, submesh.index_count = bs.read_uint32(
-                        4)
+                    name, submesh.vertex_start, submesh.vertex_count, submesh.index_start, submesh.index_count = records[
+                        i]
+                    submesh.name = name.replace(b'\x00', b'').decode('ascii')
 
                 if major == 4:
                     bs.pad(4)  # flags
@@ -1542,87 +2239,193 @@ class SKN:
 
             # read indices by face
             face_count = index_count // 3
-            for i in range(face_count):
-                face = bs.read_uint16(3)
-                # check dupe index in a face
-                if not (face[0] == face[1] or face[1] == face[2] or face[2] == face[0]):
-                    self.indices.extend(face)
-
-            # read vertices
-            self.vertices = [SKNVertex() for i in range(vertex_count)]
-            for i in range(vertex_count):
-                vertex = self.vertices[i]
-                vertex.position = bs.read_vec3()
-                vertex.influences = bs.read_bytes(4)
-                vertex.weights = bs.read_float(4)
-                bs.pad(12)  # pad normal
-                vertex.uv = bs.read_vec2()
-                # 0: basic, 1: color, 2: tangent
-                if vertex_type >= 1:
-                    # pad 4 byte color
-                    bs.pad(4)
-                    if vertex_type == 2:
-                        # pad vec4 tangent
-                        bs.pad(16)
+            self.indices = array(
+                'H',
+                chain.from_iterable(
+                    face for face in SKN.face_record.read(bs, face_count)
+                    # check dupe index in a face
+                    if not (face[0] == face[1] or face[1] == face[2] or face[2] == face[0])
+                )
+            )
 
-    def write(self, path):
-        with open(path, 'wb') as f:
-            bs = BinaryStream(f)
+            # read vertices column by column
+            vertex_record = SKN.vertex_records[vertex_type]
+            data = bs.read_bytes(vertex_record.size * vertex_count)
+            self.positions = array('f', chain.from_iterable(
+                vertex_record.column(data, 'position')))
+            self.influences = array('B', chain.from_iterable(
+                vertex_record.column(data, 'influences')))
+            self.weights = array('f', chain.from_iterable(
+                vertex_record.column(data, 'weights')))
+            # pad normal
+            self.uvs = array('f', chain.from_iterable(
+                vertex_record.column(data, 'uv')))
+
+    # reorder triangles for vertex cache and vertices for fetch order
+    # inside each submesh range, in place
+    def optimize(self):
+        before = VertexCache.acmr(self.indices)
+        indices = array('H', self.indices)
+        # new vertex index -> old vertex index
+        order = list(range(self.vertex_count()))
+        for submesh in self.submeshes:
+            index_start = submesh.index_start
+            index_end = index_start + submesh.index_count
+            submesh_indices = VertexCache.tipsify(
+                self.indices[index_start:index_end])
+            indices[index_start:index_end] = array('H', submesh_indices)
+            order[submesh.vertex_start:submesh.vertex_start+submesh.vertex_count] = VertexCache.fetch_order(
+                submesh_indices, submesh.vertex_start, submesh.vertex_count)
+
+        # keep the original order if it is already better, for example riot meshes
+        before_misses = VertexCache.misses(self.indices)
+        if VertexCache.misses(indices) >= before_misses:
+            MGlobal.displayInfo(
+                f'[SKN.optimize()]: Vertex cache ACMR: {before:.3f}, already optimized.')
+            return
 
+        remap = [0]*len(order)
+        for new_index in range(len(order)):
+            remap[order[new_index]] = new_index
+        self.indices = array('H', [remap[index] for index in indices])
+        self.positions = VertexCache.reorder(self.positions, 3, order)
+        self.influences = VertexCache.reorder(self.influences, 4, order)
+        self.weights = VertexCache.reorder(self.weights, 4, order)
+        if self.normals != None:
+            self.normals = VertexCache.reorder(self.normals, 3, order)
+        self.uvs = VertexCache.reorder(self.uvs, 2, order)
+
+        after = VertexCache.acmr(self.indices)
+        MGlobal.displayInfo(
+            f'[SKN.optimize()]: Vertex cache ACMR: {before:.3f} -> {after:.3f}')
+
+    def write(self, path, optimize=False):
+        if optimize:
+            self.optimize()
+
+        with BinaryStream.writer(path) as bs:
             bs.write_uint32(0x00112233)  # magic
             bs.write_uint16(1, 1)  # major, minor
 
             bs.write_uint32(len(self.submeshes))
-            for submesh in self.submeshes:
-                bs.write_padded_ascii(64, submesh.name)
-                bs.write_uint32(
-                    submesh.vertex_start, submesh.vertex_count, submesh.index_start, submesh.index_count)
+            SKN.submesh_record.write(bs, [
+                (
+                    submesh.name.encode('ascii'),
+                    submesh.vertex_start, submesh.vertex_count, submesh.index_start, submesh.index_count
+                )
+                for submesh in self.submeshes
+            ])
+
+            bs.write_uint32(len(self.indices), self.vertex_count())
+
+            bs.write_bytes(self.indices.tobytes())
+
+            # interleave vertex columns back into records
+            positions = self.positions
+            influences = self.influences
+            weights = self.weights
+            normals = self.normals
+            uvs = self.uvs
+            SKN.vertex_records[0].write(bs, list(zip(
+                positions[0::3], positions[1::3], positions[2::3],
+                influences[0::4], influences[1::4], influences[2::4], influences[3::4],
+                weights[0::4], weights[1::4], weights[2::4], weights[3::4],
+                normals[0::3], normals[1::3], normals[2::3],
+                uvs[0::2], uvs[1::2]
+            )))
 
-            bs.write_uint32(len(self.indices), len(self.vertices))
+    def load(self, skl=None, sepmat=False):
+        def bind_skin(mesh, skin_cluster_name, vertex_start, vertex_count):
+            mesh_name = mesh.name()
+            mesh_dagpath = MDagPath()
+            mesh.getPath(mesh_dagpath)
 
-            bs.write_uint16(*self.indices)
+            # select mesh + joint
+            selections = MSelectionList()
+            selections.add(mesh_dagpath)
+            for dagpath in influence_dagpaths:
+                selections.add(dagpath)
+            MGlobal.selectCommand(selections)
 
-            for vertex in self.vertices:
-                bs.write_vec3(vertex.position)
-                bs.write_bytes(vertex.influences)
-                bs.write_float(*vertex.weights)
-                bs.write_vec3(vertex.normal)
-                bs.write_vec2(vertex.uv)
+            # bind selections
+            MGlobal.executeCommand(
+                f'skinCluster -mi 4 -tsb -n {skin_cluster_name}')
+
+            # get skin cluster
+            in_mesh = mesh.findPlug('inMesh')
+            plugs = MPlugArray()
+            in_mesh.connectedTo(plugs, True, False)
+            skin_cluster_name = MFnDependencyNode(plugs[0].node()).name()
+
+            # same skin cluster and mesh in api 2.0, bridged by name
+            selections = OM2.MSelectionList()
+            selections.add(mesh_dagpath.fullPathName())
+            selections.add(skin_cluster_name)
+            skin_cluster = OMA2.MFnSkinCluster(selections.getDependNode(1))
+
+            # mask influence: skl influence -> influence index in this skin cluster
+            influence_indices = {
+                dagpath.fullPathName(): index
+                for index, dagpath in enumerate(skin_cluster.influenceObjects())
+            }
+            mask_influence = [
+                influence_indices[dagpath.fullPathName()]
+                for dagpath in influence_dagpaths
+            ]
+
+            # weights
+            # group the non-zero weights (max 4 per vertex) by influence: influence -> (vertices, weights)
+            # only these pairs are allocated, never a vertex x influence table
+            sparse_weights = {}
+            for i in range(vertex_count):
+                vertex = vertex_start + i
+                for j in range(vertex*4, vertex*4+4):
+                    weight = self.weights[j]
+                    if weight > 0:
+                        influence = self.influences[j]
+                        if influence not in sparse_weights:
+                            sparse_weights[influence] = ([], [])
+                        vertices, values = sparse_weights[influence]
+                        vertices.append(i)
+                        values.append(weight)
+
+            # clear bind weights, then one api 2.0 call per used influence on the vertices it touches
+            MGlobal.executeCommand((
+                f'setAttr {skin_cluster_name}.normalizeWeights 0;'
+                f'skinPercent -pruneWeights 100 -normalize false {skin_cluster_name} {mesh_name};'
+            ))
+            mesh_dagpath2 = selections.getDagPath(0)
+            for influence, (vertices, values) in sparse_weights.items():
+                components = OM2.MFnSingleIndexedComponent()
+                components_object = components.create(
+                    OM2.MFn.kMeshVertComponent)
+                components.addElements(vertices)
+                skin_cluster.setWeights(
+                    mesh_dagpath2,
+                    components_object,
+                    OM2.MIntArray([mask_influence[influence]]),
+                    OM2.MDoubleArray(values),
+                    normalize=False
+                )
+            MGlobal.executeCommand((
+                f'setAttr {skin_cluster_name}.normalizeWeights 1;'
+                f'skinPercent -normalize true {skin_cluster_name} {mesh_name};'
+            ))
+
+        # influence joints dagpath, same for all skin clusters
+        if skl != None:
+            influence_dagpaths = [
+                skl.joints[influence].dagpath for influence in skl.influences]
 
-    def load(self, skl=None, sepmat=False):
         def load_combined():
-            vertex_count = len(self.vertices)
-            index_count = len(self.indices)
-            face_count = index_count // 3
+            vertex_count = self.vertex_count()
 
             # create mesh
-            vertices = MFloatPointArray(vertex_count)
-            u_values = MFloatArray(vertex_count)
-            v_values = MFloatArray(vertex_count)
-            poly_count = MIntArray(face_count, 3)
-            poly_indices = MIntArray(index_count)
-            for i in range(vertex_count):
-                vertex = self.vertices[i]
-                vertices[i].x = vertex.position.x
-                vertices[i].y = vertex.position.y
-                vertices[i].z = vertex.position.z
-                u_values[i] = vertex.uv.x
-                v_values[i] = 1.0 - vertex.uv.y
-            for i in range(index_count):
-                poly_indices[i] = self.indices[i]
-
-            mesh = MFnMesh()
-            mesh.create(
-                vertex_count,
-                face_count,
-                vertices,
-                poly_count,
-                poly_indices,
-                u_values,
-                v_values
-            )
-            mesh.assignUVs(
-                poly_count, poly_indices
+            mesh = MMesh.create(
+                self.positions,
+                self.indices,
+                self.uvs[0::2],
+                [1.0 - v for v in self.uvs[1::2]]
             )
 
             # name
@@ -1635,9 +2438,7 @@ class SKN:
             for submesh in self.submeshes:
                 # check duplicate name node
                 if skl != None:
-                    match_joint = next(
-                        (joint for joint in skl.joints if joint.name == submesh.name), None)
-                    if match_joint != None:
+                    if submesh.name in skl.name_indices:
                         submesh.name = submesh.name.lower()
 
                 # lambert material
@@ -1657,59 +2458,7 @@ class SKN:
             MGlobal.executeCommand(execmd)
 
             if skl != None:
-                influence_count = len(skl.influences)
-                mesh_dagpath = MDagPath()
-                mesh.getPath(mesh_dagpath)
-
-                # select mesh + joint
-                selections = MSelectionList()
-                selections.add(mesh_dagpath)
-                for influence in skl.influences:
-                    selections.add(skl.joints[influence].dagpath)
-                MGlobal.selectCommand(selections)
-
-                # bind selections
-                MGlobal.executeCommand(
-                    f'skinCluster -mi 4 -tsb -n {self.name}_skinCluster')
-
-                # get skin cluster
-                in_mesh = mesh.findPlug('inMesh')
-                plugs = MPlugArray()
-                in_mesh.connectedTo(plugs, True, False)
-                skin_cluster = MFnSkinCluster(plugs[0].node())
-                skin_cluster_name = skin_cluster.name()
-
-                # mask influence
-                influences_dagpath = MDagPathArray()
-                skin_cluster.influenceObjects(influences_dagpath)
-                mask_influence = MIntArray(influence_count)
-                for i in range(influence_count):
-                    dagpath = skl.joints[skl.influences[i]].dagpath
-                    match_j = next(j for j in range(influence_count)
-                                   if dagpath == influences_dagpath[j])
-                    if match_j != None:
-                        mask_influence[i] = match_j
-
-                # weights
-                MGlobal.executeCommand(
-                    f'setAttr {skin_cluster_name}.normalizeWeights 0')
-                component = MFnSingleIndexedComponent()
-                # empty vertex_component = all vertices
-                vertex_component = component.create(MFn.kMeshVertComponent)
-                weights = MDoubleArray(vertex_count * influence_count)
-                for i in range(vertex_count):
-                    vertex = self.vertices[i]
-                    for j in range(4):
-                        weight = vertex.weights[j]
-                        influence = vertex.influences[j]
-                        if weight > 0:
-                            weights[i * influence_count + influence] = weight
-                skin_cluster.setWeights(
-                    mesh_dagpath, vertex_component, mask_influence, weights, False)
-                MGlobal.executeCommand((
-                    f'setAttr {skin_cluster_name}.normalizeWeights 1;'
-                    f'skinPercent -normalize true {skin_cluster_name} {mesh_name};'
-                ))
+                bind_skin(mesh, f'{self.name}_skinCluster', 0, vertex_count)
 
             MGlobal.executeCommand('select -cl')
             # shud be final line
@@ -1723,13 +2472,14 @@ class SKN:
 
             # init seperated meshes data
             shader_count = len(self.submeshes)
-            shader_vertices = {}
+            shader_vertex_starts = {}
+            shader_vertex_counts = {}
             shader_indices = {}
             shader_meshes = []
             for shader_index in range(shader_count):
                 submesh = self.submeshes[shader_index]
-                shader_vertices[shader_index] = self.vertices[submesh.vertex_start:
-                                                              submesh.vertex_start+submesh.vertex_count]
+                shader_vertex_starts[shader_index] = submesh.vertex_start
+                shader_vertex_counts[shader_index] = submesh.vertex_count
                 shader_indices[shader_index] = self.indices[submesh.index_start:
                                                             submesh.index_start+submesh.index_count]
                 min_vertex = min(shader_indices[shader_index])
@@ -1738,38 +2488,16 @@ class SKN:
 
             execmd = ''
             for shader_index in range(shader_count):
-                vertex_count = len(shader_vertices[shader_index])
-                index_count = len(shader_indices[shader_index])
-                face_count = index_count // 3
+                vertex_start = shader_vertex_starts[shader_index]
+                vertex_end = vertex_start + shader_vertex_counts[shader_index]
+                face_count = len(shader_indices[shader_index]) // 3
 
                 # create mesh
-                vertices = MFloatPointArray(vertex_count)
-                u_values = MFloatArray(vertex_count)
-                v_values = MFloatArray(vertex_count)
-                poly_count = MIntArray(face_count, 3)
-                poly_indices = MIntArray(index_count)
-                for i in range(vertex_count):
-                    vertex = shader_vertices[shader_index][i]
-                    vertices[i].x = vertex.position.x
-                    vertices[i].y = vertex.position.y
-                    vertices[i].z = vertex.position.z
-                    u_values[i] = vertex.uv.x
-                    v_values[i] = 1.0 - vertex.uv.y
-                for i in range(index_count):
-                    poly_indices[i] = shader_indices[shader_index][i]
-
-                mesh = MFnMesh()
-                mesh.create(
-                    vertex_count,
-                    face_count,
-                    vertices,
-                    poly_count,
-                    poly_indices,
-                    u_values,
-                    v_values
-                )
-                mesh.assignUVs(
-                    poly_count, poly_indices
+                mesh = MMesh.create(
+                    self.positions[vertex_start*3:vertex_end*3],
+                    shader_indices[shader_index],
+                    self.uvs[vertex_start*2:vertex_end*2:2],
+                    [1.0 - v for v in self.uvs[vertex_start*2+1:vertex_end*2:2]]
                 )
 
                 # save the MFnMesh to bind later
@@ -1788,9 +2516,7 @@ class SKN:
 
                 # check duplicate name node
                 if skl != None:
-                    match_joint = next(
-                        (joint for joint in skl.joints if joint.name == submesh.name), None)
-                    if match_joint != None:
+                    if submesh.name in skl.name_indices:
                         submesh.name = submesh.name.lower()
 
                 # lambert material
@@ -1810,62 +2536,10 @@ class SKN:
                 for shader_index in range(shader_count):
                     # get mesh base on shader
                     mesh = shader_meshes[shader_index]
-                    mesh_name = mesh.name()
-                    influence_count = len(skl.influences)
-                    mesh_dagpath = MDagPath()
-                    mesh.getPath(mesh_dagpath)
-
-                    # select mesh + joint
-                    selections = MSelectionList()
-                    selections.add(mesh_dagpath)
-                    for influence in skl.influences:
-                        selections.add(skl.joints[influence].dagpath)
-                    MGlobal.selectCommand(selections)
-
-                    # bind selections
-                    MGlobal.executeCommand(
-                        f'skinCluster -mi 4 -tsb -n {mesh_name}_skinCluster')
-
-                    # get skin cluster
-                    in_mesh = mesh.findPlug('inMesh')
-                    plugs = MPlugArray()
-                    in_mesh.connectedTo(plugs, True, False)
-                    skin_cluster = MFnSkinCluster(
-                        plugs[0].node())
-                    skin_cluster_name = skin_cluster.name()
-
-                    # mask influence
-                    influences_dagpath = MDagPathArray()
-                    skin_cluster.influenceObjects(influences_dagpath)
-                    mask_influence = MIntArray(influence_count)
-                    for i in range(influence_count):
-                        dagpath = skl.joints[skl.influences[i]].dagpath
-                        match_j = next(j for j in range(
-                            influence_count) if dagpath == influences_dagpath[j])
-                        if match_j != None:
-                            mask_influence[i] = match_j
-
-                    # weights
-                    MGlobal.executeCommand(
-                        f'setAttr {skin_cluster_name}.normalizeWeights 0')
-                    component = MFnSingleIndexedComponent()
-                    vertex_component = component.create(MFn.kMeshVertComponent)
-                    vertex_count = len(shader_vertices[shader_index])
-                    weights = MDoubleArray(vertex_count * influence_count)
-                    for i in range(vertex_count):
-                        vertex = shader_vertices[shader_index][i]
-                        for j in range(4):
-                            weight = vertex.weights[j]
-                            influence = vertex.influences[j]
-                            if weight > 0:
-                                weights[i * influence_count +
-                                        influence] = weight
-                    skin_cluster.setWeights(
-                        mesh_dagpath, vertex_component, mask_influence, weights, False)
-                    MGlobal.executeCommand((
-                        f'setAttr {skin_cluster_name}.normalizeWeights 1;'
-                        f'skinPercent -normalize true {skin_cluster_name} {mesh_name}'
-                    ))
+                    bind_skin(
+                        mesh, f'{mesh.name()}_skinCluster',
+                        shader_vertex_starts[shader_index], shader_vertex_counts[shader_index]
+                    )
 
             MGlobal.executeCommand('select -cl')
             # shud be final line
@@ -1900,110 +2574,94 @@ class SKN:
                     f'[SKN.dump({mesh.name()})]: Mesh contains {hole_info.length()} holes.')
 
             # get shader/materials
-            shaders = MObjectArray()
-            face_shader = MIntArray()
+            mesh2 = MMesh.get(mesh_dagpath)
             instance = mesh_dagpath.instanceNumber() if mesh_dagpath.isInstanced() else 0
-            mesh.getConnectedShaders(instance, shaders, face_shader)
-            shader_count = shaders.length()
+            shaders, face_shader = mesh2.getConnectedShaders(instance)
+            face_shader = list(face_shader)
+            shader_count = len(shaders)
             # check no material assigned
             if shader_count < 1:
                 raise FunnyError(
                     f'[SKN.dump({mesh.name()})]: No material assigned to this mesh, please assign one.')
             # init shaders data to work on multiple shader
-            shader_vertices = []
+            shader_submeshes = []
             shader_indices = []
             shader_names = []
+            # uv_index -> new vertex index, per shader
+            map_vertices = {}
             for i in range(shader_count):
-                shader_vertices.append([])
+                shader_submeshes.append(SKNSubmesh())
                 shader_indices.append([])
+                map_vertices[i] = {}
                 # get shader name
-                ss = MFnDependencyNode(
-                    shaders[i]).findPlug('surfaceShader')
-                plugs = MPlugArray()
-                ss.connectedTo(plugs, True, False)
-                shader_node = MFnDependencyNode(plugs[0].node())
+                ss = OM2.MFnDependencyNode(
+                    shaders[i]).findPlug('surfaceShader', False)
+                plugs = ss.connectedTo(True, False)
+                shader_node = OM2.MFnDependencyNode(plugs[0].node())
                 shader_names.append(shader_node.name())
 
-            # iterator on faces - 1st
+            # get whole mesh data at once
+            points = mesh2.getPoints(OM2.MSpace.kWorld)
+            face_vertex_counts, face_vertices = mesh2.getVertices()
+            face_vertex_counts = list(face_vertex_counts)
+            face_vertices = list(face_vertices)
+            normals = mesh2.getNormals()
+            normal_ids = list(mesh2.getNormalIds()[1])
+            face_uv_counts, uv_ids = mesh2.getAssignedUVs()
+            face_uv_counts = list(face_uv_counts)
+            uv_ids = list(uv_ids)
+            u_values, v_values = mesh2.getUVs()
+            triangle_counts, triangle_offsets = mesh2.getTriangleOffsets()
+            triangle_counts = list(triangle_counts)
+            triangle_offsets = list(triangle_offsets)
+            face_count = len(face_vertex_counts)
+
+            # loop on faces - 1st
             # to get vertex_shader first base on face_shader
             # extra checking stuffs
-            bad_faces = MIntArray()  # invalid triangulation polygon
-            bad_faces2 = MIntArray()  # no material assigned
-            bad_faces3 = MIntArray()  # no uv assigned
-            bad_vertices = MIntArray()  # shared vertices
-            vertex_shader = MIntArray(mesh_vertex_count, -1)
-            iterator = MItMeshPolygon(mesh_dagpath)
-            iterator.reset()
-            while not iterator.isDone():
+            bad_faces = set()  # invalid triangulation polygon
+            bad_faces2 = set()  # no material assigned
+            bad_faces3 = set()  # no uv assigned
+            bad_vertices = set()  # shared vertices
+            vertex_shader = [-1] * mesh_vertex_count
+            face_vertex = 0
+            for face_index in range(face_count):
                 # get shader of this face
-                face_index = iterator.index()
                 shader_index = face_shader[face_index]
+                face_vertex_count = face_vertex_counts[face_index]
 
                 # check valid triangulation
-                if not iterator.hasValidTriangulation():
-                    if face_index not in bad_faces:
-                        bad_faces.append(face_index)
+                if triangle_counts[face_index] != face_vertex_count - 2:
+                    bad_faces.add(face_index)
                 # check face with no material assigned
                 if shader_index == -1:
-                    if face_index not in bad_faces2:
-                        bad_faces2.append(face_index)
+                    bad_faces2.add(face_index)
                 # check if face has no UVs
-                if not iterator.hasUVs():
-                    if face_index not in bad_faces3:
-                        bad_faces3.append(face_index)
-                # get face vertices
-                vertices = MIntArray()
-                iterator.getVertices(vertices)
-                face_vertex_count = vertices.length()
+                if face_uv_counts[face_index] == 0:
+                    bad_faces3.add(face_index)
                 # check if each vertex is shared by mutiple materials
-                for i in range(face_vertex_count):
-                    vertex = vertices[i]
+                for vertex in face_vertices[face_vertex:face_vertex+face_vertex_count]:
                     if vertex_shader[vertex] not in (-1, shader_index):
-                        if vertex not in bad_vertices:
-                            bad_vertices.append(vertex)
+                        bad_vertices.add(vertex)
                         continue
                     vertex_shader[vertex] = shader_index
-                iterator.next()
-            if bad_faces.length() > 0:
-                component = MFnSingleIndexedComponent()
-                face_component = component.create(
-                    MFn.kMeshPolygonComponent)
-                component.addElements(bad_faces)
-                selections = MSelectionList()
-                selections.add(mesh_dagpath, face_component)
-                MGlobal.selectCommand(selections)
+                face_vertex += face_vertex_count
+            if len(bad_faces) > 0:
+                MMesh.select(mesh_dagpath, MFn.kMeshPolygonComponent, bad_faces)
                 raise FunnyError(
-                    f'[SKN.dump({mesh.name()})]: Mesh contains {bad_faces.length()} invalid triangulation faces, those faces will be selected in scene.\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.')
-            if bad_faces2.length() > 0:
-                component = MFnSingleIndexedComponent()
-                face_component = component.create(
-                    MFn.kMeshPolygonComponent)
-                component.addElements(bad_faces2)
-                selections = MSelectionList()
-                selections.add(mesh_dagpath, face_component)
-                MGlobal.selectCommand(selections)
+                    f'[SKN.dump({mesh.name()})]: Mesh contains {len(bad_faces)} invalid triangulation faces, those faces will be selected in scene.\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.')
+            if len(bad_faces2) > 0:
+                MMesh.select(mesh_dagpath, MFn.kMeshPolygonComponent, bad_faces2)
                 raise FunnyError(
-                    f'[SKN.dump({mesh.name()})]: Mesh contains {bad_faces2.length()} faces have no material assigned, those faces will be selected in scene.\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.')
-            if bad_faces3.length() > 0:
-                component = MFnSingleIndexedComponent()
-                face_component = component.create(
-                    MFn.kMeshPolygonComponent)
-                component.addElements(bad_faces3)
-                selections = MSelectionList()
-                selections.add(mesh_dagpath, face_component)
-                MGlobal.selectCommand(selections)
+                    f'[SKN.dump({mesh.name()})]: Mesh contains {len(bad_faces2)} faces have no material assigned, those faces will be selected in scene.\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.')
+            if len(bad_faces3) > 0:
+                MMesh.select(mesh_dagpath, MFn.kMeshPolygonComponent, bad_faces3)
                 raise FunnyError(
-                    f'[SKN.dump({mesh.name()})]: Mesh contains {bad_faces3.length()} faces have no UVs assigned, or, those faces UVs are not in current UV set, those faces will be selected in scene.\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.')
-            if bad_vertices.length() > 0:
-                component = MFnSingleIndexedComponent()
-                vertex_component = component.create(
-                    MFn.kMeshVertComponent)
-                component.addElements(bad_vertices)
-                selections = MSelectionList()
-                selections.add(mesh_dagpath, vertex_component)
-                MGlobal.selectCommand(selections)
+                    f'[SKN.dump({mesh.name()})]: Mesh contains {len(bad_faces3)} faces have no UVs assigned, or, those faces UVs are not in current UV set, those faces will be selected in scene.\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.')
+            if len(bad_vertices) > 0:
+                MMesh.select(mesh_dagpath, MFn.kMeshVertComponent, bad_vertices)
                 raise FunnyError((
-                    f'[SKN.dump({mesh.name()})]: Mesh contains {bad_vertices.length()} vertices are shared by mutiple materials, those vertices will be selected in scene.\n'
+                    f'[SKN.dump({mesh.name()})]: Mesh contains {len(bad_vertices)} vertices are shared by mutiple materials, those vertices will be selected in scene.\n'
                     'Save/backup scene first, try one of following methods to fix:\n'
                     '1. Seperate all connected faces that shared those vertices.\n'
                     '2. Check and reassign correct material.\n'
@@ -2011,59 +2669,69 @@ class SKN:
                     '\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.'
                 ))
 
-            # get weights of all vertices
-            # empty vertex component = all vertices
-            component = MFnSingleIndexedComponent()
-            vertex_component = component.create(MFn.kMeshVertComponent)
-            weights = MDoubleArray()
-            util = MScriptUtil()
-            ptr = util.asUintPtr()
-            skin_cluster.getWeights(
-                mesh_dagpath, vertex_component, weights, ptr)
-            weight_influence_count = util.getUint(ptr)
-            # map influence indices by skl joints
+            # loop on face vertices
+            # every face has UVs now so face vertices and uv ids are in same order
+            # to get unique uvs and sum of normals of all faces connect to each vertex
+            vertex_uvs = [[] for i in range(mesh_vertex_count)]
+            vertex_normals = [[0.0, 0.0, 0.0, 0]
+                              for i in range(mesh_vertex_count)]
+            for vertex, uv_index, normal_id in zip(face_vertices, uv_ids, normal_ids):
+                if uv_index not in vertex_uvs[vertex]:
+                    vertex_uvs[vertex].append(uv_index)
+                normal = normals[normal_id]
+                vertex_normal = vertex_normals[vertex]
+                vertex_normal[0] += normal.x
+                vertex_normal[1] += normal.y
+                vertex_normal[2] += normal.z
+                vertex_normal[3] += 1
+
+            # weights are read per vertex from weightList plugs
+            # only non-zero weights exist in those sparse plugs
+            weight_list = skin_cluster.findPlug('weightList')
+            weight_indices = MIntArray()
+            # map influence logical indices by skl joints
             influence_dagpaths = MDagPathArray()
             influence_count = skin_cluster.influenceObjects(influence_dagpaths)
-            mask_influence = MIntArray(influence_count)
-            joint_count = len(skl.joints)
+            mask_influence = {}
             for i in range(influence_count):
                 dagpath = influence_dagpaths[i]
-                match_j = next(j for j in range(joint_count)
-                               if dagpath == skl.joints[j].dagpath)
-                if match_j != None:
-                    mask_influence[i] = match_j
-            # get all uvs
-            u_values = MFloatArray()
-            v_values = MFloatArray()
-            mesh.getUVs(u_values, v_values)
-            # iterator on vertices
+                match_j = skl.dagpath_indices.get(dagpath.fullPathName())
+                if match_j == None:
+                    raise FunnyError(
+                        f'[SKN.dump({mesh.name()})]: Influence {dagpath.partialPathName()} is not a joint of the skeleton.')
+                mask_influence[skin_cluster.indexForInfluenceObject(
+                    dagpath)] = match_j
+            # loop on vertices
             # to dump all new vertices base on unique uv
-            bad_vertices = MIntArray()  # vertex has 4+ influences
-            bad_vertices2 = MIntArray()  # vertex has no UVs
-            iterator = MItMeshVertex(mesh_dagpath)
-            iterator.reset()
-            while not iterator.isDone():
+            bad_vertices = set()  # vertex has 4+ influences
+            bad_vertices2 = set()  # vertex has no UVs
+            for vertex_index in range(mesh_vertex_count):
                 # get shader of this vertex
-                vertex_index = iterator.index()
                 shader_index = vertex_shader[vertex_index]
                 if shader_index == -1:
                     # a strange vertex with no shader ?
                     # let say this vertex is alone and not in any face
                     # just ignore it?
-                    iterator.next()
                     continue
 
                 # influence and weight
                 influences = [0, 0, 0, 0]
                 vertex_weights = [0.0, 0.0, 0.0, 0.0]
                 inf_index = 0
-                for influence in range(weight_influence_count):
-                    weight = weights[vertex_index *
-                                     weight_influence_count + influence]
+                weights_plug = weight_list.elementByLogicalIndex(
+                    vertex_index).child(0)
+                weights_plug.getExistingArrayAttributeIndices(weight_indices)
+                for i in range(weight_indices.length()):
+                    influence = weight_indices[i]
+                    if influence not in mask_influence:
+                        # left over weight of a removed influence
+                        continue
+                    weight = weights_plug.elementByLogicalIndex(
+                        influence).asDouble()
                     if weight > 0.001:  # prune weight 0.001
                         # check 4+ influneces
                         if inf_index > 3:
-                            bad_vertices.append(vertex_index)
+                            bad_vertices.add(vertex_index)
                             break
                         influences[inf_index] = mask_influence[influence]
                         vertex_weights[inf_index] = weight
@@ -2075,120 +2743,65 @@ class SKN:
                         if vertex_weights[i] > 0:
                             vertex_weights[i] /= weight_sum
                 # position
-                position = iterator.position(MSpace.kWorld)
+                position = points[vertex_index]
                 # average of normals of all faces connect to this vertex
-                normals = MVectorArray()
-                iterator.getNormals(normals)
-                normal_count = normals.length()
-                normal = MVector(0.0, 0.0, 0.0)
-                for i in range(normal_count):
-                    normal += normals[i]
-                normal /= normal_count
+                nx, ny, nz, normal_count = vertex_normals[vertex_index]
+                normal = (nx / normal_count, ny /
+                          normal_count, nz / normal_count)
                 # unique uv
-                uv_indices = MIntArray()
-                iterator.getUVIndices(uv_indices)
-                uv_count = uv_indices.length()
-                if uv_count > 0:
-                    seen = []
-                    for i in range(uv_count):
-                        uv_index = uv_indices[i]
-                        if uv_index == -1:
-                            continue
-                            # raise FunnyError(
-                            #    f'[SKN.dump({mesh.name()})]: No uv_index found on a vertex, this error should not happen. Possibly caused by bad mesh history and delete/bake history might fix this problem.')
-                        if uv_index not in seen:
-                            seen.append(uv_index)
-                            uv = Vector(
-                                u_values[uv_index],
-                                1.0 - v_values[uv_index]
-                            )
-                            # dump vertices
-                            vertex = SKNVertex()
-                            vertex.position = Vector(
-                                position.x, position.y, position.z)
-                            vertex.normal = Vector(
-                                normal.x, normal.y, normal.z)
-                            vertex.influences = bytes(influences)
-                            vertex.weights = vertex_weights
-                            vertex.uv = uv
-                            vertex.uv_index = uv_index
-                            vertex.new_index = len(
-                                shader_vertices[shader_index])
-                            shader_vertices[shader_index].append(vertex)
+                uv_indices = vertex_uvs[vertex_index]
+                if len(uv_indices) > 0:
+                    # dump vertices
+                    submesh = shader_submeshes[shader_index]
+                    for uv_index in uv_indices:
+                        map_vertices[shader_index][uv_index] = len(
+                            submesh.positions) // 3
+                        submesh.positions.extend(
+                            (position.x, position.y, position.z))
+                        submesh.normals.extend(normal)
+                        submesh.influences.extend(influences)
+                        submesh.weights.extend(vertex_weights)
+                        submesh.uvs.extend(
+                            (u_values[uv_index], 1.0 - v_values[uv_index]))
                 else:
-                    if vertex_index not in bad_vertices:
-                        bad_vertices.append(vertex_index)
-                iterator.next()
-            if bad_vertices.length() > 0:
-                component = MFnSingleIndexedComponent()
-                vertex_component = component.create(
-                    MFn.kMeshVertComponent)
-                component.addElements(bad_vertices)
-                selections = MSelectionList()
-                selections.add(mesh_dagpath, vertex_component)
-                MGlobal.selectCommand(selections)
+                    bad_vertices2.add(vertex_index)
+            if len(bad_vertices) > 0:
+                MMesh.select(mesh_dagpath, MFn.kMeshVertComponent, bad_vertices)
                 raise FunnyError((
-                    f'[SKN.dump({mesh.name()})]: Mesh contains {bad_vertices.length()} vertices that have weight on 4+ influences, those vertices will be selected in scene.\n'
+                    f'[SKN.dump({mesh.name()})]: Mesh contains {len(bad_vertices)} vertices that have weight on 4+ influences, those vertices will be selected in scene.\n'
                     'Save/backup scene first, try one of following methods to fix:\n'
                     '1. Repaint weight on those vertices.\n'
                     '2. Prune small weights.\n'
                     '3. [recommended] Try auto fix 4 influences button on shelf.'
                     '\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.'
                 ))
-            if bad_vertices2.length() > 0:
+            if len(bad_vertices2) > 0:
+                MMesh.select(mesh_dagpath, MFn.kMeshVertComponent, bad_vertices2)
                 raise FunnyError(
-                    f'[SKN.dump({mesh.name()})]: Mesh contains {bad_vertices2.length()} vertices have no UVs assigned, those vertices will be selected in scene.\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.')
+                    f'[SKN.dump({mesh.name()})]: Mesh contains {len(bad_vertices2)} vertices have no UVs assigned, those vertices will be selected in scene.\nBonus: If there is nothing selected (or they are invisible) after this error message, consider to delete history and rebind the skin, that might fix the problem.')
 
-            # map new vertices base on uv_index
-            map_vertices = {}
-            for shader_index in range(shader_count):
-                map_vertices[shader_index] = {}
-                for vertex in shader_vertices[shader_index]:
-                    map_vertices[shader_index][vertex.uv_index] = vertex.new_index
-            # iterator on faces - 2nd
+            # loop on faces - 2nd
             # to dump indices:
-            # - triangulated indices
+            # - triangulated indices, triangle offsets are relative to face vertices
             # - new indices base on new unique uv vertices
-            iterator = MItMeshPolygon(mesh_dagpath)
-            iterator.reset()
-            while not iterator.isDone():
-                # get shader of this face
-                face_index = iterator.index()
-                shader_index = face_shader[face_index]
-
-                # get triangulated face indices
-                points = MPointArray()
-                indices = MIntArray()
-                iterator.getTriangles(points, indices)
-                face_index_count = indices.length()
-                # get face vertices
-                map_indices = {}
-                vertices = MIntArray()
-                iterator.getVertices(vertices)
-                face_vertex_count = vertices.length()
-                # map face indices by uv_index
-                for i in range(face_vertex_count):
-                    util = MScriptUtil()
-                    ptr = util.asIntPtr()
-                    iterator.getUVIndex(i, ptr)
-                    uv_index = util.getInt(ptr)
-                    map_indices[vertices[i]] = uv_index
-                # map new indices by new vertices through uv_index
-                # and add new indices
-                new_indices = [
-                    map_vertices[shader_index][map_indices[indices[i]]]
-                    for i in range(face_index_count)
-                ]
-                shader_indices[shader_index].extend(new_indices)
-                iterator.next()
+            face_vertex = 0
+            triangle_offset = 0
+            for face_index in range(face_count):
+                shader_vertices = map_vertices[face_shader[face_index]]
+                triangle_index_count = triangle_counts[face_index] * 3
+                shader_indices[face_shader[face_index]].extend(
+                    shader_vertices[uv_ids[face_vertex + offset]]
+                    for offset in triangle_offsets[triangle_offset:triangle_offset+triangle_index_count]
+                )
+                face_vertex += face_vertex_counts[face_index]
+                triangle_offset += triangle_index_count
 
             # return list of submeshes dumped out of this mesh
-            submeshes = [SKNSubmesh() for i in range(shader_count)]
+            submeshes = shader_submeshes
             for i in range(shader_count):
                 submesh = submeshes[i]
                 submesh.name = shader_names[i]
                 submesh.indices = shader_indices[i]
-                submesh.vertices = shader_vertices[i]
             return submeshes
 
         # find mesh in selections
@@ -2248,7 +2861,11 @@ class SKN:
             combined_submesh.name = submesh_name
             previous_max_index = 0
             for submesh in map_submeshes[submesh_name]:
-                combined_submesh.vertices += submesh.vertices
+                combined_submesh.positions += submesh.positions
+                combined_submesh.influences += submesh.influences
+                combined_submesh.weights += submesh.weights
+                combined_submesh.normals += submesh.normals
+                combined_submesh.uvs += submesh.uvs
                 if previous_max_index > 0:
                     previous_max_index += 1
                 combined_submesh.indices.extend(
@@ -2256,14 +2873,24 @@ class SKN:
                 previous_max_index = max(combined_submesh.indices)
             self.submeshes.append(combined_submesh)
 
+        def add_vertices(submesh):
+            submesh.vertex_count = len(submesh.positions) // 3
+            self.positions += submesh.positions
+            self.influences += submesh.influences
+            self.weights += submesh.weights
+            self.normals += submesh.normals
+            self.uvs += submesh.uvs
+
         # calculate SKN indices, vertices and update SKN submeshes data
+        # indices are kept in a list until vertex limit is checked
+        indices = []
+        self.normals = array('f')
         # for first submesh
         self.submeshes[0].index_start = 0
         self.submeshes[0].index_count = len(self.submeshes[0].indices)
-        self.indices += self.submeshes[0].indices
+        indices += self.submeshes[0].indices
         self.submeshes[0].vertex_start = 0
-        self.submeshes[0].vertex_count = len(self.submeshes[0].vertices)
-        self.vertices += self.submeshes[0].vertices
+        add_vertices(self.submeshes[0])
         # for the rest if more than 1 submeshes
         submesh_count = len(self.submeshes)
         if submesh_count > 1:
@@ -2275,12 +2902,10 @@ class SKN:
                 max_index = max(self.submeshes[i-1].indices)
                 self.submeshes[i].indices = [
                     index + max_index+1 for index in self.submeshes[i].indices]
-                self.indices.extend(self.submeshes[i].indices)
+                indices.extend(self.submeshes[i].indices)
 
                 self.submeshes[i].vertex_start = vertex_start
-                self.submeshes[i].vertex_count = len(
-                    self.submeshes[i].vertices)
-                self.vertices.extend(self.submeshes[i].vertices)
+                add_vertices(self.submeshes[i])
 
                 index_start += self.submeshes[i].index_count
                 vertex_start += self.submeshes[i].vertex_count
@@ -2325,10 +2950,11 @@ class SKN:
             self.submeshes = new_submeshes
 
         # check limit vertices
-        vertices_count = len(self.vertices)
+        vertices_count = self.vertex_count()
         if vertices_count > 65535:
             raise FunnyError(
                 f'[SKN.dump()]: Too many vertices found: {vertices_count}, max allowed: 65535 vertices. (base on UVs)')
+        self.indices = array('H', indices)
 
         # check limit submeshes
         submesh_count = len(self.submeshes)
@@ -2338,34 +2964,15 @@ class SKN:
 
 
 # anm
-class ANMPose:
-    __slots__ = (
-        'time', 'translation', 'scale', 'rotation',
-        'translation_index', 'scale_index', 'rotation_index',
-    )
-
-    def __init__(self):
-        self.time = None
-        self.translation = None
-        self.scale = None
-        self.rotation = None
-
-        # for dumping
-        self.translation_index = None
-        self.scale_index = None
-        self.rotation_index = None
-
-
 class ANMTrack:
     __slots__ = (
-        'joint_hash', 'poses',
+        'joint_hash',
         'joint_name', 'curves', 'curve_times', 'curve_values',
         'ik_joint'
     )
 
     def __init__(self):
         self.joint_hash = None
-        self.poses = {}
 
         # for loading
         self.joint_name = None
@@ -2377,28 +2984,303 @@ class ANMTrack:
 
 
 class ANM:
+    compressed_frame_record = Record(
+        ('time', 'H'),  # compressed time
+        ('bits', 'H'),  # transform type + joint hash id
+        ('transform', '6s')  # compressed transform
+    )
+    v5_frame_record = Record(
+        ('indices', '3H')  # translation, scale, rotation index
+    )
+    v4_frame_record = Record(
+        ('joint_hash', 'I'),
+        ('indices', '3H'),  # translation, scale, rotation index
+        (None, '2x')
+    )
+    legacy_track_record = Record(
+        ('name', '32s'),
+        ('flags', 'I')
+    )
+    legacy_frame_record = Record(
+        ('rotation', '4f'),
+        ('translation', '3f')
+    )
+    vec_record = Record(
+        ('vec', '3f')
+    )
+    quat_record = Record(
+        ('quat', '4f')
+    )
+    # r3d2canm error metrics (margin, discontinuity threshold) of rotation, translation, scale
+    # same values as most riot files
+    canm_error_metrics = (0.5, 10.0, 1.0, 10.0, 0.01, 0.2)
+
     def __init__(self):
         self.tracks = []
+        # joint hash -> track index
+        self.track_indices = {}
         self.fps = None
         self.duration = None  # normalized
-        # for dumping v4
         self.frame_count = None
+        # frames per second of dense arrays, only differ from fps
+        # when r3d2canm keys are in between frames
+        self.sample_fps = None
+
+        # dense track x frame data, data of frame f on track t is at t * frame_count + f
+        # 3 floats translation, 3 floats scale, 4 floats rotation
+        self.translations = None
+        self.scales = None
+        self.rotations = None
+        # 1 byte per track x frame, 0 = no data (sparse r3d2canm)
+        self.translation_masks = None
+        self.scale_masks = None
+        self.rotation_masks = None
+
+    def index_tracks(self):
+        # map joint hash to track index, first track wins if a hash is duplicated
+        self.track_indices = {}
+        for i in range(len(self.tracks)):
+            joint_hash = self.tracks[i].joint_hash
+            if joint_hash not in self.track_indices:
+                self.track_indices[joint_hash] = i
+
+    def init_frames(self, frame_count, valid):
+        # allocate dense arrays for current tracks
+        if self.sample_fps == None:
+            self.sample_fps = self.fps
+        self.frame_count = frame_count
+        size = len(self.tracks) * frame_count
+        self.translations = array('f', bytes(size * 12))
+        self.scales = array('f', bytes(size * 12))
+        self.rotations = array('f', bytes(size * 16))
+        self.translation_masks = array('B', [valid]) * size
+        self.scale_masks = array('B', [valid]) * size
+        self.rotation_masks = array('B', [valid]) * size
 
     def flip(self):
         # DO A FLIP!
-        for track in self.tracks:
-            for time in track.poses:
-                pose = track.poses[time]
-                if pose.translation != None:
-                    pose.translation.x = -pose.translation.x
-                if pose.rotation != None:
-                    pose.rotation.y = -pose.rotation.y
-                    pose.rotation.z = -pose.rotation.z
-
-    def read(self, path):
-        with open(path, 'rb') as f:
-            bs = BinaryStream(f)
+        self.translations[0::3] = array(
+            'f', [-x for x in self.translations[0::3]])
+        self.rotations[1::4] = array('f', [-y for y in self.rotations[1::4]])
+        self.rotations[2::4] = array('f', [-z for z in self.rotations[2::4]])
+
+    def set_track_frames(self, track_index, frames, uni_vecs, uni_quats):
+        # fill frames of a track from unique vecs/quats by (translation, scale, rotation) indices
+        start = track_index * self.frame_count
+        end = start + len(frames)
+        self.translations[start*3:end*3] = array(
+            'f', chain.from_iterable(uni_vecs[frame[0]] for frame in frames))
+        self.scales[start*3:end*3] = array(
+            'f', chain.from_iterable(uni_vecs[frame[1]] for frame in frames))
+        self.rotations[start*4:end*4] = array(
+            'f', chain.from_iterable(uni_quats[frame[2]] for frame in frames))
+        self.translation_masks[start:end] = array('B', [1]) * len(frames)
+        self.scale_masks[start:end] = array('B', [1]) * len(frames)
+        self.rotation_masks[start:end] = array('B', [1]) * len(frames)
+
+    @staticmethod
+    def lerp_fits(times, keys, a, b, tolerance):
+        # check if every vec key between key a and key b is close enough to their lerp
+        # tolerance: squared distance
+        ax, ay, az = keys[a]
+        bx, by, bz = keys[b]
+        time_a = times[a]
+        duration = times[b] - time_a
+        for i in range(a+1, b):
+            t = (times[i] - time_a) / duration
+            x, y, z = keys[i]
+            dx = ax + (bx - ax) * t - x
+            dy = ay + (by - ay) * t - y
+            dz = az + (bz - az) * t - z
+            if dx * dx + dy * dy + dz * dz > tolerance:
+                return False
+        return True
+
+    @staticmethod
+    def slerp_fits(times, keys, a, b, tolerance):
+        # check if every quat key between key a and key b is close enough to their slerp
+        # tolerance: cos of half the angle error
+        ax, ay, az, aw = keys[a]
+        bx, by, bz, bw = keys[b]
+        dot = ax * bx + ay * by + az * bz + aw * bw
+        # q and -q are same rotation, slerp the short way
+        if dot < 0.0:
+            bx, by, bz, bw = -bx, -by, -bz, -bw
+            dot = -dot
+        theta = acos(min(dot, 1.0))
+        sin_theta = sin(theta)
+        time_a = times[a]
+        duration = times[b] - time_a
+        for i in range(a+1, b):
+            t = (times[i] - time_a) / duration
+            if sin_theta > 0.001:
+                wa = sin((1.0 - t) * theta) / sin_theta
+                wb = sin(t * theta) / sin_theta
+            else:
+                # nearly same quats, lerp is enough
+                wa = 1.0 - t
+                wb = t
+            qx = ax * wa + bx * wb
+            qy = ay * wa + by * wb
+            qz = az * wa + bz * wb
+            qw = aw * wa + bw * wb
+            x, y, z, w = keys[i]
+            length = sqrt((qx * qx + qy * qy + qz * qz + qw * qw)
+                          * (x * x + y * y + z * z + w * w))
+            if length > 0.0 and abs(qx * x + qy * y + qz * z + qw * w) / length < tolerance:
+                return False
+        return True
+
+    @staticmethod
+    def reduce_keys(times, keys, fits, tolerance):
+        # greedy: from each kept key, jump to the farthest key that still rebuilds every key in between
+        # the jump is found by doubling then binary search, return indices of kept keys
+        count = len(keys)
+        kept = [0]
+        a = 0
+        while a < count - 1:
+            good = a + 1
+            bad = count
+            step = 2
+            while good < count - 1:
+                b = min(a + step, count - 1)
+                if fits(times, keys, a, b, tolerance):
+                    good = b
+                    step *= 2
+                else:
+                    bad = b
+                    break
+            while bad - good > 1:
+                b = (good + bad) // 2
+                if fits(times, keys, a, b, tolerance):
+                    good = b
+                else:
+                    bad = b
+            kept.append(good)
+            a = good
+        return kept
+
+    @staticmethod
+    def cubic_weights(s, ease_in, ease_out):
+        # weights of the 4 window keys p0, p1, p2, p3 at s (0 - 1) between p1 and p2:
+        # hermite with catmull-rom tangents scaled by key times,
+        # tangent p1 = ease_in * (p2 - p0), tangent p2 = ease_out * (p3 - p1)
+        s2 = s * s
+        s3 = s2 * s
+        h00 = 2.0 * s3 - 3.0 * s2 + 1.0
+        h10 = s3 - 2.0 * s2 + s
+        h01 = 3.0 * s2 - 2.0 * s3
+        h11 = s3 - s2
+        return (
+            -h10 * ease_in,
+            h00 - h11 * ease_out,
+            h01 + h10 * ease_in,
+            h11 * ease_out
+        )
 
+    @staticmethod
+    def cubic_misses(times, keys, kept, tolerance):
+        # evaluate dropped keys like the game evaluates r3d2canm: cubic over a window of 4 kept keys,
+        # first and last kept key repeated at both ends
+        # return the worst dropped key of every segment that is out of tolerance
+        # tolerance: squared distance for vecs, cos of half the angle error for quats
+        quat = len(keys[0]) == 4
+        last = len(kept) - 1
+        misses = []
+        for i in range(last):
+            k0 = kept[max(i-1, 0)]
+            k1 = kept[i]
+            k2 = kept[i+1]
+            k3 = kept[min(i+2, last)]
+            if k2 - k1 < 2:
+                continue
+            t0, t1, t2, t3 = times[k0], times[k1], times[k2], times[k3]
+            duration = t2 - t1
+            ease_in = duration / (t2 - t0)
+            ease_out = duration / (t3 - t1)
+            p1 = keys[k1]
+            window = [keys[k0], p1, keys[k2], keys[k3]]
+            if quat:
+                # q and -q are same rotation, blend on the side of p1
+                for j in (0, 2, 3):
+                    q = window[j]
+                    if sum(q[c] * p1[c] for c in range(4)) < 0.0:
+                        window[j] = tuple(-value for value in q)
+            worst = None
+            worst_error = None
+            for k in range(k1+1, k2):
+                weights = ANM.cubic_weights(
+                    (times[k] - t1) / duration, ease_in, ease_out)
+                value = [
+                    sum(weights[j] * window[j][c] for j in range(4))
+                    for c in range(len(p1))
+                ]
+                key = keys[k]
+                if quat:
+                    length = sqrt(sum(c * c for c in value)
+                                  * sum(c * c for c in key))
+                    if length <= 0.0:
+                        continue
+                    # lower cos = bigger angle
+                    error = -abs(sum(value[c] * key[c]
+                                 for c in range(4))) / length
+                    bad = -error < tolerance
+                else:
+                    error = sum((value[c] - key[c]) ** 2 for c in range(3))
+                    bad = error > tolerance
+                if bad and (worst == None or error > worst_error):
+                    worst = k
+                    worst_error = error
+            if worst != None:
+                misses.append(worst)
+        return misses
+
+    def reduce(self, translation_error, rotation_error, scale_error):
+        # drop keys that can be rebuilt by interpolating the kept keys within error,
+        # reduced tracks are only written as r3d2canm (v4/v5 store every frame):
+        # keys are first picked with lerp/slerp, then keys are added back until
+        # the cubic r3d2canm evaluation also rebuilds every dropped key within error
+        # translation/scale: error in distance
+        # rotation: error in degrees
+        # errors are before 16/48 bits quantization of r3d2canm
+        # dropped keys are only unmasked, first and last key of each track are always kept
+        frame_count = self.frame_count
+        before = 0
+        after = 0
+        # tiny slack for float rounding, so error 0 still drops keys that are rebuilt exactly
+        slack = 0.000000000001
+        for values, masks, size, fits, tolerance in (
+            (self.translations, self.translation_masks, 3,
+             ANM.lerp_fits, translation_error * translation_error + slack),
+            (self.scales, self.scale_masks, 3,
+             ANM.lerp_fits, scale_error * scale_error + slack),
+            (self.rotations, self.rotation_masks, 4,
+             ANM.slerp_fits, cos(radians(rotation_error) / 2.0) - slack)
+        ):
+            for t in range(len(self.tracks)):
+                start = t * frame_count
+                times = [f for f in range(frame_count) if masks[start+f]]
+                before += len(times)
+                if len(times) < 3:
+                    after += len(times)
+                    continue
+                keys = [
+                    tuple(values[(start+f)*size:(start+f)*size+size]) for f in times
+                ]
+                kept = ANM.reduce_keys(times, keys, fits, tolerance)
+                while True:
+                    misses = ANM.cubic_misses(times, keys, kept, tolerance)
+                    if len(misses) == 0:
+                        break
+                    kept = sorted(kept + misses)
+                masks[start:start+frame_count] = array('B', bytes(frame_count))
+                for k in kept:
+                    masks[start+times[k]] = 1
+                after += len(kept)
+        MGlobal.displayInfo(f'[ANM.reduce()]: Keys: {before} -> {after}')
+
+    def read(self, path, mapped=True):
+        with BinaryStream.reader(path, mapped) as bs:
             magic = bs.read_ascii(8)
             version = bs.read_uint32()
 
@@ -2438,44 +3320,61 @@ class ANM:
                 for i in range(joint_count):
                     track = self.tracks[i]
                     track.joint_hash = joint_hashes[i]
+                self.index_tracks()
 
                 bs.seek(frames_offset + 12)
-                for i in range(frame_count):
-                    compressed_time, bits = bs.read_uint16(2)
-                    compressed_transform = bs.read_bytes(6)
+                frames = ANM.compressed_frame_record.read(bs, frame_count)
+
+                # keys can be in between frames (half frames),
+                # find the lowest sample rate that put every key on a frame
+                key_times = set(frame[0] for frame in frames)
+                for subframe_count in (1, 2, 4, 8):
+                    self.sample_fps = self.fps * subframe_count
+                    frame_scale = max_time * self.sample_fps / 65535.0
+                    if all(abs(time * frame_scale - round(time * frame_scale)) < 0.05 for time in key_times):
+                        break
+
+                # compressed frames are sparse keys, not every track has data at every frame
+                self.init_frames(round(max_time * self.sample_fps) + 1, 0)
+                track_frame_count = self.frame_count
 
+                # transform type -> track x frame indices, compressed transforms
+                indices = ([], [], [])
+                transforms = ([], [], [])
+                for compressed_time, bits, compressed_transform in frames:
                     # find existed track with joint hash
-                    joint_hash = joint_hashes[bits & 16383]
-                    match_track = next(
-                        (track for track in self.tracks if track.joint_hash == joint_hash), None)
-                    if match_track == None:
+                    track_index = self.track_indices.get(
+                        joint_hashes[bits & 16383])
+                    if track_index == None:
                         # this frame has wrong joint hash?
                         continue
 
-                    # set/get pose at time
-                    time = compressed_time / 65535.0 * max_time
-                    if time not in match_track.poses:
-                        pose = ANMPose()
-                        match_track.poses[time] = pose
-                    else:
-                        pose = match_track.poses[time]
-
-                    # decompress data and add to pose
                     transform_type = bits >> 14
-                    if transform_type == 0:
-                        pose.rotation = CTransform.decompress_quat(
-                            compressed_transform)
-                    elif transform_type == 1:
-                        pose.translation = CTransform.decompress_vec(
-                            translation_min, translation_max, compressed_transform)
-                    elif transform_type == 2:
-                        pose.scale = CTransform.decompress_vec(
-                            scale_min, scale_max, compressed_transform)
-                    else:
+                    if transform_type > 2:
                         raise FunnyError(
                             f'[ANM.read()]: Unknown compressed transform type: {transform_type}.'
                         )
 
+                    # frame index at time
+                    frame = round(compressed_time * frame_scale)
+                    indices[transform_type].append(
+                        track_index * track_frame_count + frame)
+                    transforms[transform_type].append(compressed_transform)
+
+                # decompress all transforms of each type at once and add to track x frame arrays
+                for values, data, masks, size, type_indices in (
+                    (self.rotations, CTransform.decompress_quats(
+                        b''.join(transforms[0])), self.rotation_masks, 4, indices[0]),
+                    (self.translations, CTransform.decompress_vecs(
+                        translation_min, translation_max, b''.join(transforms[1])), self.translation_masks, 3, indices[1]),
+                    (self.scales, CTransform.decompress_vecs(
+                        scale_min, scale_max, b''.join(transforms[2])), self.scale_masks, 3, indices[2])
+                ):
+                    for i in range(len(type_indices)):
+                        index = type_indices[i]
+                        values[index*size:index*size+size] = data[i*size:i*size+size]
+                        masks[index] = 1
+
             elif magic == 'r3d2anmd':
                 if version == 5:
                     # v5
@@ -2520,44 +3419,33 @@ class ANM:
 
                     # read vecs
                     bs.seek(vecs_offset + 12)
-                    uni_vecs = bs.read_vec3(vec_count, True)
+                    uni_vecs = ANM.vec_record.read(bs, vec_count)
 
                     # read quats
                     bs.seek(quats_offset + 12)
-                    uni_quats = [CTransform.decompress_quat(
-                        bs.read_bytes(6)) for i in range(quat_count)]
+                    quats = CTransform.decompress_quats(
+                        bs.read_bytes(quat_count * 6))
+                    uni_quats = list(
+                        zip(quats[0::4], quats[1::4], quats[2::4], quats[3::4]))
 
                     # read frames: translation index, scale index, rotation index
                     bs.seek(frames_offset + 12)
-                    frames = [bs.read_uint16(3) for i in range(
-                        frame_count * track_count)]
+                    frames = ANM.v5_frame_record.read(
+                        bs, frame_count * track_count)
 
                     # create tracks
                     self.tracks = [ANMTrack() for i in range(track_count)]
                     for i in range(track_count):
                         track = self.tracks[i]
                         track.joint_hash = joint_hashes[i]
+                    self.index_tracks()
 
+                    # frames are stored frame by frame, arrays are track by track
+                    self.init_frames(frame_count, 1)
                     for t in range(track_count):
-                        track = self.tracks[t]
-                        for f in range(frame_count):
-                            translation_index, scale_index, rotation_index = frames[f * track_count + t]
-
-                            # rebuild instance
-                            pose = ANMPose()
-                            pose.time = f
-                            translation = uni_vecs[translation_index]
-                            pose.translation = Vector(
-                                translation.x, translation.y, translation.z)
-                            scale = uni_vecs[scale_index]
-                            pose.scale = Vector(scale.x, scale.y, scale.z)
-                            rotation = uni_quats[rotation_index]
-                            pose.rotation = Quaternion(
-                                rotation.x, rotation.y, rotation.z, rotation.w)
-
-                            # time = index / fps
-                            index = f
-                            track.poses[index / self.fps] = pose
+                        self.set_track_frames(t, [
+                            frames[f * track_count + t] for f in range(frame_count)
+                        ], uni_vecs, uni_quats)
 
                 elif version == 4:
                     # v4
@@ -2589,49 +3477,38 @@ class ANM:
                     quat_count = (frames_offset - quats_offset) // 16
 
                     bs.seek(vecs_offset + 12)
-                    uni_vecs = bs.read_vec3(vec_count, True)
+                    uni_vecs = ANM.vec_record.read(bs, vec_count)
 
                     bs.seek(quats_offset + 12)
-                    uni_quats = bs.read_quat(quat_count, True)
+                    uni_quats = ANM.quat_record.read(bs, quat_count)
 
                     bs.seek(frames_offset + 12)
-                    frames = [
-                        (
-                            # joint hash
-                            bs.read_uint32(),
-                            # translation, scale, rotation index
-                            *bs.read_uint16(3),
-                            bs.pad(2)
-                        )
-                        for i in range(frame_count * track_count)
-                    ]
-
-                    # parse data from frames
-                    for joint_hash, translation_index, scale_index, rotation_index, pad in frames:
-                        # rebuild instance
-                        pose = ANMPose()
-                        translation = uni_vecs[translation_index]
-                        pose.translation = Vector(
-                            translation.x, translation.y, translation.z)
-                        scale = uni_vecs[scale_index]
-                        pose.scale = Vector(scale.x, scale.y, scale.z)
-                        rotation = uni_quats[rotation_index]
-                        pose.rotation = Quaternion(
-                            rotation.x, rotation.y, rotation.z, rotation.w)
+                    frames = ANM.v4_frame_record.read(
+                        bs, frame_count * track_count)
 
+                    # group frames by track
+                    track_frames = []
+                    for joint_hash, translation_index, scale_index, rotation_index in frames:
                         # find existed track with joint hash
-                        match_track = next(
-                            (track for track in self.tracks if track.joint_hash == joint_hash), None)
+                        track_index = self.track_indices.get(joint_hash)
 
                         # couldnt found track that has joint hash, create new
-                        if match_track == None:
-                            match_track = ANMTrack()
-                            match_track.joint_hash = joint_hash
-                            self.tracks.append(match_track)
-
-                        # time = index / fps
-                        index = len(match_track.poses)
-                        match_track.poses[index / self.fps] = pose
+                        if track_index == None:
+                            track_index = len(self.tracks)
+                            track = ANMTrack()
+                            track.joint_hash = joint_hash
+                            self.tracks.append(track)
+                            self.track_indices[joint_hash] = track_index
+                            track_frames.append([])
+
+                        # frame index = order of frame in this track
+                        track_frames[track_index].append(
+                            (translation_index, scale_index, rotation_index))
+
+                    self.init_frames(frame_count, 0)
+                    for t in range(len(self.tracks)):
+                        self.set_track_frames(
+                            t, track_frames[t][:frame_count], uni_vecs, uni_quats)
 
                 else:
                     # legacy
@@ -2643,63 +3520,114 @@ class ANM:
                     self.duration = frame_count / self.fps
 
                     self.tracks = [ANMTrack() for i in range(track_count)]
+                    self.init_frames(frame_count, 1)
                     for i in range(track_count):
                         track = self.tracks[i]
-                        track.joint_hash = Hash.elf(bs.read_padded_ascii(32))
-                        bs.pad(4)  # flags
-                        for index in range(frame_count):
-                            pose = ANMPose()
-                            pose.rotation = bs.read_quat()
-                            pose.translation = bs.read_vec3()
-                            # legacy not support scaling
-                            pose.scale = Vector(1.0, 1.0, 1.0)
-
-                            # time = index / fps
-                            track.poses[index / self.fps] = pose
+                        name, flags = bs.unpack(ANM.legacy_track_record.struct)
+                        track.joint_hash = Hash.elf(
+                            name.replace(b'\x00', b'').decode('ascii'))
+                        frames = ANM.legacy_frame_record.read(bs, frame_count)
+                        start = i * frame_count
+                        end = start + frame_count
+                        self.rotations[start*4:end*4] = array(
+                            'f', chain.from_iterable(frame[0:4] for frame in frames))
+                        self.translations[start*3:end*3] = array(
+                            'f', chain.from_iterable(frame[4:7] for frame in frames))
+                        # legacy not support scaling
+                        self.scales[start*3:end*3] = array(
+                            'f', [1.0]) * (frame_count * 3)
+                    self.index_tracks()
             else:
                 raise FunnyError(
                     f'[ANM.read()]: Wrong signature file: {magic}')
 
-    def write(self, path):
-        # build unique vecs + quats
+    @staticmethod
+    def quantize(values, size, tolerance, canonical_sign=False):
+        # key of every size floats in values: integer steps of tolerance
+        # canonical_sign: q and -q get same key
+        scale = 1.0 / tolerance
+        keys = list(zip(*[
+            [round(value * scale) for value in values[i::size]] for i in range(size)
+        ]))
+        if canonical_sign:
+            keys = [max(key, tuple(-k for k in key)) for key in keys]
+        return keys
+
+    def write(self, path, version=4, tolerance=0.000001):
+        if version not in (4, 5):
+            raise FunnyError(
+                f'[ANM.write()]: Unsupported r3d2anmd version: {version}.')
+
+        # build unique vecs + quats, values closer than tolerance are same
+        # key -> index in unique table
         uni_vecs = {}
         uni_quats = {}
+        # unique tables: flat floats, 6 bytes compressed quats for v5
+        vecs = array('f')
+        quats = array('f')
+        compressed_quats = []
+
+        # frames: joint hash, translation index, scale index, rotation index
+        frames = []
+
+        frame_count = self.frame_count
+        translations = self.translations
+        scales = self.scales
+        rotations = self.rotations
+        translation_keys = ANM.quantize(translations, 3, tolerance)
+        scale_keys = ANM.quantize(scales, 3, tolerance)
+        if version == 5:
+            # v5 quats are 6 bytes compressed, unique by compressed bytes
+            compressed = CTransform.compress_quats(rotations)
+            rotation_keys = [
+                compressed[i:i+6] for i in range(0, len(compressed), 6)
+            ]
+        else:
+            rotation_keys = ANM.quantize(rotations, 4, tolerance, True)
+        for frame in range(frame_count):
+            for t in range(len(self.tracks)):
+                index = t * frame_count + frame
+
+                translation_key = translation_keys[index]
+                translation_index = uni_vecs.get(translation_key)
+                if translation_index == None:
+                    translation_index = len(uni_vecs)
+                    uni_vecs[translation_key] = translation_index
+                    vecs.extend(translations[index*3:index*3+3])
+
+                scale_key = scale_keys[index]
+                scale_index = uni_vecs.get(scale_key)
+                if scale_index == None:
+                    scale_index = len(uni_vecs)
+                    uni_vecs[scale_key] = scale_index
+                    vecs.extend(scales[index*3:index*3+3])
+
+                rotation_key = rotation_keys[index]
+                rotation_index = uni_quats.get(rotation_key)
+                if rotation_index == None:
+                    rotation_index = len(uni_quats)
+                    uni_quats[rotation_key] = rotation_index
+                    if version == 5:
+                        compressed_quats.append(rotation_key)
+                    else:
+                        quats.extend(rotations[index*4:index*4+4])
 
-        vec_index = 0
-        quat_index = 0
-        for frame in range(self.frame_count):
-            for track in self.tracks:
-                pose = track.poses[frame]
-                translation_key = f'{pose.translation.x:.6f} {pose.translation.y:.6f} {pose.translation.z:.6f}'
-                scale_key = f'{pose.scale.x:.6f} {pose.scale.y:.6f} {pose.scale.z:.6f}'
-                rotation_key = f'{pose.rotation.x:.6f} {pose.rotation.y:.6f} {pose.rotation.z:.6f} {pose.rotation.w:.6f}'
-                if translation_key not in uni_vecs:
-                    uni_vecs[translation_key] = vec_index
-                    pose.translation_index = vec_index
-                    vec_index += 1
-                else:
-                    pose.translation_index = uni_vecs[translation_key]
-                if scale_key not in uni_vecs:
-                    uni_vecs[scale_key] = vec_index
-                    pose.scale_index = vec_index
-                    vec_index += 1
-                else:
-                    pose.scale_index = uni_vecs[scale_key]
-                if rotation_key not in uni_quats:
-                    uni_quats[rotation_key] = quat_index
-                    pose.rotation_index = quat_index
-                    quat_index += 1
-                else:
-                    pose.rotation_index = uni_quats[rotation_key]
+                frames.append((
+                    self.tracks[t].joint_hash,
+                    translation_index, scale_index, rotation_index
+                ))
 
-        with open(path, 'wb') as f:
-            bs = BinaryStream(f)
+        # frame indices are 16 bits
+        if len(uni_vecs) > 65536 or len(uni_quats) > 65536:
+            raise FunnyError(
+                f'[ANM.write()]: Too many unique vecs/quats: {len(uni_vecs)}/{len(uni_quats)}, limit: 65536, try a bigger tolerance.')
 
+        with BinaryStream.writer(path) as bs:
             bs.write_ascii('r3d2anmd')  # magic
+            bs.write_uint32(version)  # version
+            bs.placeholder('resource size', BinaryStream.struct_uint32)
             bs.write_uint32(
-                4,  # version
-                0,  # resource size
-                0xBE0794D3,  # format token
+                0xBE0794D3 if version == 4 else 0,  # format token
                 0,  # ?
                 0,  # flags,
                 len(self.tracks),  # track count
@@ -2707,55 +3635,218 @@ class ANM:
             )
             bs.write_float(1.0 / self.fps)  # frame duration = 1 / fps
 
-            # tracks offset, asset name offset, time offset
-            bs.write_int32(0, 0, 0)
+            if version == 5:
+                bs.placeholder('joint hashes offset',
+                               BinaryStream.struct_int32)
+                # asset name offset, time offset
+                bs.write_int32(0, 0)
+            else:
+                # tracks offset, asset name offset, time offset
+                bs.write_int32(0, 0, 0)
 
             bs.write_int32(64)  # vecs offset
-            quats_offset_offset = bs.tell()
-            bs.write_int32(0, 0)  # quats offset, frames offset - later
+            bs.placeholder('quats offset', BinaryStream.struct_int32)
+            bs.placeholder('frames offset', BinaryStream.struct_int32)
 
             # pad 12 empty bytes
             bs.write_bytes(bytes([0])*12)
 
             # uni vecs
-            bs.write_float(
-                *[
-                    float(value)
-                    for vec_key in uni_vecs
-                    for value in vec_key.split()
-                ]
-            )
+            bs.write_bytes(vecs.tobytes())
 
             # uni quats
             quats_offset = bs.tell()
-            bs.write_float(
-                *[
-                    float(value)
-                    for quat_key in uni_quats
-                    for value in quat_key.split()
-                ]
-            )
+            if version == 5:
+                bs.write_bytes(b''.join(compressed_quats))
+
+                # joint hashes, v5 frames refer to joint by its order here
+                joint_hashes_offset = bs.tell()
+                bs.write_uint32(*[track.joint_hash for track in self.tracks])
+                bs.fill('joint hashes offset', joint_hashes_offset - 12)
+            else:
+                bs.write_bytes(quats.tobytes())
 
             # frames
             frames_offset = bs.tell()
-            for frame in range(self.frame_count):
-                for track in self.tracks:
-                    bs.write_uint32(track.joint_hash)
-                    bs.write_uint16(
-                        track.poses[frame].translation_index,
-                        track.poses[frame].scale_index,
-                        track.poses[frame].rotation_index,
-                    )
-                    bs.write_uint16(0)  # pad
+            if version == 5:
+                ANM.v5_frame_record.write(
+                    bs, [frame[1:] for frame in frames])
+            else:
+                ANM.v4_frame_record.write(bs, frames)
 
             # quats offset and frames offset
-            bs.seek(quats_offset_offset)
             # need to minus 12 padded bytes
-            bs.write_int32(quats_offset - 12, frames_offset - 12)
+            bs.fill('quats offset', quats_offset - 12)
+            bs.fill('frames offset', frames_offset - 12)
+
+            # resource size
+            bs.fill('resource size', bs.end())
+
+    def write_canm(self, path):
+        # compressed keys, streamed in the order the game evaluates them:
+        # each joint + transform type has a window of 4 hot keys, the next key is streamed
+        # when time passes the key 2 before it, so the stream is sorted by that time
+        track_count = len(self.tracks)
+        if track_count > 16384:
+            raise FunnyError(
+                f'[ANM.write_canm()]: Too many joints: {track_count}, r3d2canm limit: 16384.')
+        frame_count = self.frame_count
+        max_time = (frame_count - 1) / self.sample_fps
+        # compressed time: 0 - 65535 over whole animation, truncated like riot files
+        time_steps = frame_count - 1 if frame_count > 1 else 1
+
+        # transform type (0 = rotation, 1 = translation, 2 = scale) -> track x frame indices of keys
+        indices = ([], [], [])
+        # transform type -> compressed time of keys
+        times = ([], [], [])
+        # channels: track index, transform type, key indices
+        channels = []
+        masks = (self.rotation_masks, self.translation_masks, self.scale_masks)
+        for t in range(track_count):
+            start = t * frame_count
+            for transform_type in range(3):
+                type_masks = masks[transform_type]
+                key_frames = [
+                    frame for frame in range(frame_count) if type_masks[start+frame]]
+                first = len(indices[transform_type])
+                if len(key_frames) == 0:
+                    # no data, still need a key: None = identity transform
+                    key_frames = [0]
+                    indices[transform_type].append(None)
+                else:
+                    indices[transform_type].extend(
+                        start + frame for frame in key_frames)
+                last = first + len(key_frames) - 1
+                times[transform_type].extend(
+                    frame * 65535 // time_steps for frame in key_frames)
+                # first and last key are repeated so the window is full at both ends
+                keys = [first] + list(range(first, last+1)) + [last]
+                while len(keys) < 4:
+                    keys.append(last)
+                channels.append((t, transform_type, keys))
+
+        # frames: compressed time, bits, transform type, key index
+        # start with the first 4 keys of every channel
+        frames = []
+        # channel -> stream positions of its keys
+        positions = []
+        # channel -> time that each key after first 4 is streamed
+        switch_times = []
+        for t, transform_type, keys in channels:
+            positions.append(list(range(len(frames), len(frames)+4)))
+            switch_times.append([
+                times[transform_type][keys[j-2]] for j in range(4, len(keys))
+            ])
+            for key in keys[:4]:
+                frames.append((
+                    times[transform_type][key],
+                    transform_type << 14 | t,
+                    transform_type,
+                    key
+                ))
+        # then the rest, stable sort keep joint order on same time
+        streamed = []
+        for c in range(len(channels)):
+            for j in range(4, len(channels[c][2])):
+                streamed.append((switch_times[c][j-4], c, j))
+        streamed.sort(key=lambda item: item[0])
+        for switch_time, c, j in streamed:
+            t, transform_type, keys = channels[c]
+            positions[c].append(len(frames))
+            frames.append((
+                times[transform_type][keys[j]],
+                transform_type << 14 | t,
+                transform_type,
+                keys[j]
+            ))
+
+        # jump caches: window of every channel at evenly spaced times
+        # so the game can start evaluating in the middle of the stream
+        jump_cache_count = len(frames) // 1024 + 1
+        jump_caches = []
+        for k in range(jump_cache_count):
+            cache_time = k * 65535.0 / jump_cache_count
+            for c in range(len(channels)):
+                streamed_count = 4 + \
+                    bisect_right(switch_times[c], cache_time)
+                jump_caches.extend(
+                    positions[c][streamed_count-4:streamed_count])
+
+        # identity: no rotation, no translation (anm has no bind pose), scale 1
+        rotations = array('f', chain.from_iterable(
+            self.rotations[index*4:index*4+4] if index != None else (0.0, 0.0, 0.0, 1.0) for index in indices[0]))
+        translations = array('f', chain.from_iterable(
+            self.translations[index*3:index*3+3] if index != None else (0.0, 0.0, 0.0) for index in indices[1]))
+        scales = array('f', chain.from_iterable(
+            self.scales[index*3:index*3+3] if index != None else (1.0, 1.0, 1.0) for index in indices[2]))
+
+        # quantization ranges of vecs
+        ranges = []
+        for values in (translations, scales):
+            if len(values) > 0:
+                ranges.append(Vector(
+                    min(values[0::3]), min(values[1::3]), min(values[2::3])))
+                ranges.append(Vector(
+                    max(values[0::3]), max(values[1::3]), max(values[2::3])))
+            else:
+                ranges.append(Vector(0.0, 0.0, 0.0))
+                ranges.append(Vector(0.0, 0.0, 0.0))
+        translation_min, translation_max, scale_min, scale_max = ranges
+
+        transforms = (
+            CTransform.compress_quats(rotations),
+            CTransform.compress_vecs(
+                translation_min, translation_max, translations),
+            CTransform.compress_vecs(scale_min, scale_max, scales)
+        )
+        frames = [
+            (compressed_time, bits,
+             transforms[transform_type][index*6:index*6+6])
+            for compressed_time, bits, transform_type, index in frames
+        ]
+
+        with BinaryStream.writer(path) as bs:
+            bs.write_ascii('r3d2canm')  # magic
+            bs.write_uint32(1)  # version
+            bs.placeholder('resource size', BinaryStream.struct_uint32)
+            bs.write_uint32(
+                0x6D6E6163,  # format token
+                0,  # flags
+                track_count,  # joint count
+                len(frames),  # frame count
+                jump_cache_count
+            )
+            bs.write_float(max_time, self.fps)
+            bs.write_float(*ANM.canm_error_metrics)
+            bs.write_vec3(translation_min, translation_max,
+                          scale_min, scale_max)
+
+            bs.placeholder('frames offset', BinaryStream.struct_int32)
+            bs.placeholder('jump caches offset', BinaryStream.struct_int32)
+            bs.placeholder('joint hashes offset', BinaryStream.struct_int32)
+
+            # frames
+            frames_offset = bs.tell()
+            ANM.compressed_frame_record.write(bs, frames)
+
+            # jump caches, frame indices are 16 bits if possible
+            jump_caches_offset = bs.tell()
+            if len(frames) <= 65536:
+                bs.write_uint16(*jump_caches)
+            else:
+                bs.write_uint32(*jump_caches)
+
+            # joint hashes
+            joint_hashes_offset = bs.tell()
+            bs.write_uint32(*[track.joint_hash for track in self.tracks])
+
+            # offsets are relative to 12 bytes of magic + version
+            bs.fill('frames offset', frames_offset - 12)
+            bs.fill('jump caches offset', jump_caches_offset - 12)
+            bs.fill('joint hashes offset', joint_hashes_offset - 12)
 
             # resource size
-            bs.seek(12)
-            bs.write_uint32(bs.end())
+            bs.fill('resource size', bs.end())
 
     def load(self, delchannel=False):
         # ensure scene fps
@@ -2786,6 +3877,7 @@ class ANM:
 
         # file's joints that found in scene
         scene_tracks = []
+        scene_track_indices = []
         # attribute name for getting curve
         attributes = [
             'tx', 'ty', 'tz',
@@ -2801,9 +3893,9 @@ class ANM:
             joint_name = ik_joint.name()
 
             # find file's joints that match this scene's joint's name
-            match_track = next(
-                (track for track in self.tracks if track.joint_hash == Hash.elf(joint_name)), None)
-            if match_track != None:
+            track_index = self.track_indices.get(Hash.elf(joint_name))
+            if track_index != None:
+                match_track = self.tracks[track_index]
                 # get name to slerp rotation curve later
                 match_track.joint_name = joint_name
                 match_track.ik_joint = ik_joint
@@ -2811,65 +3903,69 @@ class ANM:
                     match_track.curve_times[attr] = MTimeArray()
                     match_track.curve_values[attr] = MDoubleArray()
                 scene_tracks.append(match_track)
+                scene_track_indices.append(track_index)
             iterator.next()
 
         if len(scene_tracks) == 0:
             raise FunnyError(
                 '[ANM.load()]: No data joints found in scene, please import SKL first before import ANM.')
 
+        # name file's joints that not found in scene by known names
+        if len(scene_tracks) < len(self.tracks):
+            missing_names = []
+            for track in self.tracks:
+                if track.ik_joint == None:
+                    names = Hash.unhash(track.joint_hash)
+                    missing_names.append(
+                        names[0] if len(names) > 0 else f'{track.joint_hash:08x}')
+            MGlobal.displayWarning(
+                f'[ANM.load()]: Missing joints in scene: {", ".join(missing_names)}')
+
         # bind current pose to frame 0 - very helpful if its bind pose
         # this also create the curves so dont need to call MFnAnimCurve.create()
         joint_names = ' '.join([track.joint_name for track in scene_tracks])
         MGlobal.executeCommand(
             f'currentTime 0;setKeyframe -breakdown 0 -hierarchy none -controlPoints 0 -shape 0 -at translateX -at translateY -at translateZ -at scaleX -at scaleY -at scaleZ -at rotateX -at rotateY -at rotateZ {joint_names};')
 
-        # get global times
-        times = []
-        for track in scene_tracks:
-            for time in track.poses:
-                if time not in times:
-                    times.append(time)
-        # fill gloal times
-        for track in scene_tracks:
-            for time in times:
-                if time not in track.poses:
-                    track.poses[time] = None
-        # MTime instance at time  (dict comp)
-        mtimes = {time: MTime(current + time * self.fps + 1, ui_unit)
-                  for time in times}
+        # MTime instance at frame
+        frame_count = self.frame_count
+        frame_step = self.fps / self.sample_fps
+        mtimes = [MTime(current + frame * frame_step + 1, ui_unit)
+                  for frame in range(frame_count)]
 
         # build curve data
-        for time in times:
-            for track in scene_tracks:
-                pose = track.poses[time]
-                if pose != None:
-                    mtime = mtimes[time]
-                    if pose.translation != None:
-                        track.curve_times['tx'].append(mtime)
-                        track.curve_values['tx'].append(pose.translation.x)
-                        track.curve_times['ty'].append(mtime)
-                        track.curve_values['ty'].append(pose.translation.y)
-                        track.curve_times['tz'].append(mtime)
-                        track.curve_values['tz'].append(pose.translation.z)
-
-                    if pose.rotation != None:
-                        euler = MQuaternion(
-                            pose.rotation.x, pose.rotation.y, pose.rotation.z, pose.rotation.w
-                        ).asEulerRotation()
-                        track.curve_times['rx'].append(mtime)
-                        track.curve_values['rx'].append(euler.x)
-                        track.curve_times['ry'].append(mtime)
-                        track.curve_values['ry'].append(euler.y)
-                        track.curve_times['rz'].append(mtime)
-                        track.curve_values['rz'].append(euler.z)
-
-                    if pose.scale != None:
-                        track.curve_times['sx'].append(mtime)
-                        track.curve_values['sx'].append(pose.scale.x)
-                        track.curve_times['sy'].append(mtime)
-                        track.curve_values['sy'].append(pose.scale.y)
-                        track.curve_times['sz'].append(mtime)
-                        track.curve_values['sz'].append(pose.scale.z)
+        for track_index, track in zip(scene_track_indices, scene_tracks):
+            for frame in range(frame_count):
+                index = track_index * frame_count + frame
+                mtime = mtimes[frame]
+                if self.translation_masks[index]:
+                    tx, ty, tz = self.translations[index*3:index*3+3]
+                    track.curve_times['tx'].append(mtime)
+                    track.curve_values['tx'].append(tx)
+                    track.curve_times['ty'].append(mtime)
+                    track.curve_values['ty'].append(ty)
+                    track.curve_times['tz'].append(mtime)
+                    track.curve_values['tz'].append(tz)
+
+                if self.rotation_masks[index]:
+                    euler = MQuaternion(
+                        *self.rotations[index*4:index*4+4]
+                    ).asEulerRotation()
+                    track.curve_times['rx'].append(mtime)
+                    track.curve_values['rx'].append(euler.x)
+                    track.curve_times['ry'].append(mtime)
+                    track.curve_values['ry'].append(euler.y)
+                    track.curve_times['rz'].append(mtime)
+                    track.curve_values['rz'].append(euler.z)
+
+                if self.scale_masks[index]:
+                    sx, sy, sz = self.scales[index*3:index*3+3]
+                    track.curve_times['sx'].append(mtime)
+                    track.curve_values['sx'].append(sx)
+                    track.curve_times['sy'].append(mtime)
+                    track.curve_values['sy'].append(sy)
+                    track.curve_times['sz'].append(mtime)
+                    track.curve_values['sz'].append(sz)
 
         # set keys on curve
         for track in scene_tracks:
@@ -2917,6 +4013,7 @@ class ANM:
             self.tracks.append(track)
 
             iterator.next()
+        self.index_tracks()
 
         # dump fps
         ui_unit = MTime.uiUnit()
@@ -2927,27 +4024,29 @@ class ANM:
         # if its not then well, its the ppl fault, not mine. haha suckers
         start = int(MAnimControl.animationStartTime().value())
         end = int(MAnimControl.animationEndTime().value())
-        self.frame_count = abs(end-start)
+        self.init_frames(abs(end-start), 1)
+        frame_count = self.frame_count
 
-        for frame in range(self.frame_count):
+        for frame in range(frame_count):
             MAnimControl.setCurrentTime(MTime(frame+start+1, ui_unit))
-            for track in self.tracks:
+            for t in range(len(self.tracks)):
+                track = self.tracks[t]
+                index = t * frame_count + frame
 
-                pose = ANMPose()
                 # translation
                 translation = track.ik_joint.getTranslation(MSpace.kTransform)
-                pose.translation = Vector(
-                    translation.x, translation.y, translation.z)
+                self.translations[index*3:index*3+3] = array(
+                    'f', (translation.x, translation.y, translation.z))
                 # scale
                 util = MScriptUtil()
                 util.createFromDouble(0.0, 0.0, 0.0)
                 ptr = util.asDoublePtr()
                 track.ik_joint.getScale(ptr)
-                pose.scale = Vector(
+                self.scales[index*3:index*3+3] = array('f', (
                     util.getDoubleArrayItem(ptr, 0),
                     util.getDoubleArrayItem(ptr, 1),
                     util.getDoubleArrayItem(ptr, 2)
-                )
+                ))
                 # rotation
                 orient = MQuaternion()
                 track.ik_joint.getOrientation(orient)
@@ -2955,13 +4054,18 @@ class ANM:
                 rotation = MQuaternion()
                 track.ik_joint.getRotation(rotation, MSpace.kTransform)
                 rotation = axe * rotation * orient
-                pose.rotation = Quaternion(
-                    rotation.x, rotation.y, rotation.z, rotation.w)
-                track.poses[frame] = pose
+                self.rotations[index*4:index*4+4] = array(
+                    'f', (rotation.x, rotation.y, rotation.z, rotation.w))
 
 
 # static object - sco/scb
 class SO:
+    scb_face_record = Record(
+        ('indices', '3I'),
+        ('material', '64s'),
+        ('uvs', '6f')  # u u u, v v v
+    )
+
     def __init__(self):
         self.name = None
         self.central = None
@@ -3055,10 +4159,8 @@ class SO:
 
                 index += 1
 
-    def read_scb(self, path):
-        with open(path, 'rb') as f:
-            bs = BinaryStream(f)
-
+    def read_scb(self, path, mapped=True):
+        with BinaryStream.reader(path, mapped) as bs:
             magic = bs.read_ascii(8)
             if magic != 'r3d2Mesh':
                 raise FunnyError(
@@ -3093,17 +4195,17 @@ class SO:
             self.central = bs.read_vec3()
             # no pivot in scb
 
-            for i in range(face_count):
-                face = bs.read_uint32(3)
+            for record in SO.scb_face_record.read(bs, face_count):
+                face = record[0:3]
                 if face[0] == face[1] or face[1] == face[2] or face[2] == face[0]:
                     continue
                 self.indices.extend(face)
 
-                self.material = bs.read_padded_ascii(64)
-
-                uvs = bs.read_float(6)
+                self.material = record[3].replace(
+                    b'\x00', b'').decode('ascii')
 
                 # u u u, v v v
+                uvs = record[4:10]
                 self.uvs.append(Vector(uvs[0], uvs[3]))
                 self.uvs.append(Vector(uvs[1], uvs[4]))
                 self.uvs.append(Vector(uvs[2], uvs[5]))
@@ -3162,9 +4264,7 @@ class SO:
                     max.z = vertex.z
             return min, max
 
-        with open(path, 'wb') as f:
-            bs = BinaryStream(f)
-
+        with BinaryStream.writer(path) as bs:
             bs.write_ascii('r3d2Mesh')  # magic
             bs.write_uint16(3, 2)  # major, minor
 
@@ -3190,55 +4290,35 @@ class SO:
             bs.write_vec3(self.central)
 
             # faces - easy peasy squeezy last part
+            material = self.material.encode('ascii')
+            records = []
             for i in range(face_count):
                 index = i * 3
-                bs.write_uint32(
-                    self.indices[index], self.indices[index+1], self.indices[index+2])
-
-                bs.write_padded_ascii(64, self.material)
-
-                # u u u, v v v
-                bs.write_float(
-                    self.uvs[index].x, self.uvs[index +
-                                                1].x, self.uvs[index+2].x,
+                records.append((
+                    self.indices[index], self.indices[index+1], self.indices[index+2],
+                    material,
+                    # u u u, v v v
+                    self.uvs[index].x, self.uvs[index+1].x, self.uvs[index+2].x,
                     self.uvs[index].y, self.uvs[index+1].y, self.uvs[index+2].y
-                )
+                ))
+            SO.scb_face_record.write(bs, records)
 
     def load(self):
-        vertex_count = len(self.vertices)
         index_count = len(self.indices)
         face_count = index_count // 3
 
-        # create mesh
-        vertices = MFloatPointArray(vertex_count)
-        u_values = MFloatArray(index_count)
-        v_values = MFloatArray(index_count)
-        poly_count = MIntArray(face_count, 3)
-        poly_indices = MIntArray(index_count)
-        uv_indices = MIntArray(index_count)
-        for i in range(vertex_count):
-            vertex = self.vertices[i]
-            vertices[i].x = vertex.x-self.central.x
-            vertices[i].y = vertex.y-self.central.y
-            vertices[i].z = vertex.z-self.central.z
-        for i in range(index_count):
-            u_values[i] = self.uvs[i].x
-            v_values[i] = 1.0 - self.uvs[i].y
-            poly_indices[i] = self.indices[i]
-            uv_indices[i] = i
-
-        mesh = MFnMesh()
-        mesh.create(
-            vertex_count,
-            face_count,
-            vertices,
-            poly_count,
-            poly_indices,
-            u_values,
-            v_values
-        )
-        mesh.assignUVs(
-            poly_count, uv_indices
+        # create mesh, 1 uv per index
+        central = self.central
+        mesh = MMesh.create(
+            [
+                value
+                for vertex in self.vertices
+                for value in (vertex.x - central.x, vertex.y - central.y, vertex.z - central.z)
+            ],
+            self.indices,
+            [uv.x for uv in self.uvs],
+            [1.0 - uv.y for uv in self.uvs],
+            range(index_count)
         )
 
         # name + central
@@ -3459,23 +4539,6 @@ class SO:
                 '[SO.dump(riot.so)]: Found riot.so (scb/sco), updated value.')
 
 
-class MAPGEOVertex:
-    __slots__ = (
-        'position', 'normal', 'diffuse_uv', 'lightmap_uv',
-        'color', 'uv_index', 'new_index',
-    )
-
-    def __init__(self):
-        self.position = None
-        self.normal = None
-        self.diffuse_uv = None
-        self.lightmap_uv = None
-        self.color = None
-
-        self.uv_index = None
-        self.new_index = None
-
-
 class MAPGEOSubmesh:
     __slots__ = (
         'name',
@@ -3493,16 +4556,49 @@ class MAPGEOSubmesh:
 
 class MAPGEOModel:
     __slots__ = (
-        'name', 'submeshes', 'vertices', 'indices', 'layer',
-        'bucket_hash', 'bb', 'lightmap', 'lightmap_so',
-        'use_color', 'bush', 'matrix'
+        'name', 'submeshes', '_indices',
+        '_positions', 'normals', '_diffuse_uvs', '_lightmap_uvs', '_colors',
+        'layer', 'bucket_hash', 'bb', 'lightmap', 'lightmap_so',
+        'use_color', 'bush', 'matrix', 'toc'
     )
 
+    # geometry of a lazy read model is decoded from file on first access
+    def geometry(name):
+        slot = '_' + name
+
+        def getter(self):
+            if self.toc != None:
+                self.toc[0].decode(self)
+            return getattr(self, slot)
+
+        def setter(self, value):
+            setattr(self, slot, value)
+        return property(getter, setter)
+
+    indices = geometry('indices')
+    positions = geometry('positions')
+    diffuse_uvs = geometry('diffuse_uvs')
+    lightmap_uvs = geometry('lightmap_uvs')
+    colors = geometry('colors')
+    del geometry
+
     def __init__(self):
+        # lazy read: (mapgeo, vertex count, vb ids, vd id, ib id) to decode geometry later
+        self.toc = None
+
         self.name = None
         self.submeshes = []
-        self.vertices = []
         self.indices = []
+
+        # vertices as flat arrays, not 1 object per vertex
+        # models share the same arrays if they share the same vertex buffer
+        # 3 floats position, 3 floats normal, 2 floats diffuse uv, 2 floats lightmap uv, 4 bytes bgra color
+        self.positions = array('f')
+        self.normals = None  # not read, only dumped
+        self.diffuse_uvs = None
+        self.lightmap_uvs = None
+        self.colors = None
+
         self.layer = None
         self.bucket_hash = None
         self.bb = None
@@ -3512,6 +4608,9 @@ class MAPGEOModel:
         self.matrix = None
         self.bush = None
 
+    def vertex_count(self):
+        return len(self.positions) // 3
+
 
 class MAPGEOBucketGrid:
     def __init__(self):
@@ -3528,13 +4627,272 @@ class MAPGEOPlanarReflector:  # hope its the last name
         self.prs = []
 
 
+# uniform grid on x/z plane over world bounding boxes of models
+# for region queries without decoding any geometry
+class MAPGEOGrid:
+    def __init__(self, models, cell_size=None):
+        self.models = models
+        # model index -> (min x, min y, min z, max x, max y, max z)
+        self.bbs = [MAPGEOGrid.world_bb(model) for model in models]
+        # (cell x, cell z) -> model indices
+        self.cells = {}
+
+        if len(self.bbs) == 0:
+            self.cell_size = 1.0
+            return
+        if cell_size == None:
+            # about 1 model per cell
+            min_x = min(bb[0] for bb in self.bbs)
+            min_z = min(bb[2] for bb in self.bbs)
+            max_x = max(bb[3] for bb in self.bbs)
+            max_z = max(bb[5] for bb in self.bbs)
+            side = ceil(sqrt(len(self.bbs)))
+            cell_size = max(max_x - min_x, max_z - min_z) / side
+        self.cell_size = cell_size if cell_size > 0 else 1.0
+
+        for model_index in range(len(self.bbs)):
+            for cell in self.cell_range(self.bbs[model_index]):
+                model_indices = self.cells.get(cell)
+                if model_indices == None:
+                    model_indices = self.cells[cell] = []
+                model_indices.append(model_index)
+
+    # bounding box of model in world space = 8 bounding box corners * model matrix
+    @staticmethod
+    def world_bb(model):
+        if model.bb == None:
+            positions = model.positions
+            bb_min = (min(positions[0::3]), min(
+                positions[1::3]), min(positions[2::3]))
+            bb_max = (max(positions[0::3]), max(
+                positions[1::3]), max(positions[2::3]))
+        else:
+            bb_min, bb_max = tuple(model.bb[0]), tuple(model.bb[1])
+        m = model.matrix
+        xs = []
+        ys = []
+        zs = []
+        for x in (bb_min[0], bb_max[0]):
+            for y in (bb_min[1], bb_max[1]):
+                for z in (bb_min[2], bb_max[2]):
+                    xs.append(x*m[0] + y*m[4] + z*m[8] + m[12])
+                    ys.append(x*m[1] + y*m[5] + z*m[9] + m[13])
+                    zs.append(x*m[2] + y*m[6] + z*m[10] + m[14])
+        return (min(xs), min(ys), min(zs), max(xs), max(ys), max(zs))
+
+    @staticmethod
+    def intersect_box(bb, box_min, box_max):
+        return (
+            bb[0] <= box_max[0] and bb[3] >= box_min[0] and
+            bb[1] <= box_max[1] and bb[4] >= box_min[1] and
+            bb[2] <= box_max[2] and bb[5] >= box_min[2]
+        )
+
+    @staticmethod
+    def intersect_sphere(bb, center, radius):
+        # distance from sphere center to closest point of bounding box
+        distance = 0.0
+        for i in range(3):
+            if center[i] < bb[i]:
+                distance += (bb[i] - center[i]) ** 2
+            elif center[i] > bb[i+3]:
+                distance += (center[i] - bb[i+3]) ** 2
+        return distance <= radius * radius
+
+    def cell_range(self, bb):
+        size = self.cell_size
+        return [
+            (x, z)
+            for x in range(floor(bb[0] / size), floor(bb[3] / size) + 1)
+            for z in range(floor(bb[2] / size), floor(bb[5] / size) + 1)
+        ]
+
+    def candidates(self, bb):
+        model_indices = set()
+        for cell in self.cell_range(bb):
+            model_indices.update(self.cells.get(cell, ()))
+        return sorted(model_indices)
+
+    # models intersect box: min (x, y, z), max (x, y, z)
+    def query_box(self, box_min, box_max):
+        return [
+            self.models[i]
+            for i in self.candidates((*box_min, *box_max))
+            if MAPGEOGrid.intersect_box(self.bbs[i], box_min, box_max)
+        ]
+
+    # models intersect sphere: center (x, y, z), radius
+    def query_sphere(self, center, radius):
+        bb = (
+            center[0] - radius, center[1] - radius, center[2] - radius,
+            center[0] + radius, center[1] + radius, center[2] + radius
+        )
+        return [
+            self.models[i]
+            for i in self.candidates(bb)
+            if MAPGEOGrid.intersect_sphere(self.bbs[i], center, radius)
+        ]
+
+
+class MAPGEOFilter:
+    def __init__(self, layers=None, bucket_hash=None, bush=None, box=None, sphere=None):
+        # layers: layer indices 0-7 (set1-set8) to keep, None for all layers
+        self.layers = layers
+        # bucket_hash: only keep models with this bucket hash, None for all
+        self.bucket_hash = bucket_hash
+        # bush: True to only keep bushes, False to only keep non bushes, None for all
+        self.bush = bush
+        # box: (min, max), sphere: (center, radius), in file space
+        # only keep models that world bounding box intersects with, None for all
+        self.box = box
+        self.sphere = sphere
+
+    # options: 'layers=1,2;buckethash=0123abcd;bush=1;box=x1,y1,z1,x2,y2,z2;sphere=x,y,z,r'
+    # layers are set numbers 1-8
+    # box and sphere are in maya space, where x is flipped from file space
+    @staticmethod
+    def from_options(options):
+        values = {}
+        for option in options.split(';'):
+            if '=' in option:
+                name, value = option.split('=', 1)
+                values[name.strip()] = value.strip()
+        model_filter = MAPGEOFilter()
+        try:
+            if values.get('layers', '') != '':
+                model_filter.layers = [
+                    int(layer)-1 for layer in values['layers'].split(',')]
+            if values.get('buckethash', '') != '':
+                model_filter.bucket_hash = int(values['buckethash'], 16)
+            if values.get('bush', '') != '':
+                model_filter.bush = values['bush'] == '1'
+            if values.get('box', '') != '':
+                x1, y1, z1, x2, y2, z2 = (
+                    float(value) for value in values['box'].split(','))
+                model_filter.box = (
+                    (min(-x1, -x2), min(y1, y2), min(z1, z2)),
+                    (max(-x1, -x2), max(y1, y2), max(z1, z2))
+                )
+            if values.get('sphere', '') != '':
+                x, y, z, radius = (
+                    float(value) for value in values['sphere'].split(','))
+                model_filter.sphere = ((-x, y, z), radius)
+        except ValueError:
+            raise FunnyError(
+                f'[MAPGEOFilter.from_options()]: Invalid filter options: {options}')
+        if model_filter.layers == None and model_filter.bucket_hash == None and model_filter.bush == None and model_filter.box == None and model_filter.sphere == None:
+            return None
+        return model_filter
+
+    def match(self, model):
+        if self.layers != None:
+            layer = model.layer[0]
+            if not any(layer & (1 << i) for i in self.layers):
+                return False
+        if self.bucket_hash != None:
+            bucket_hash = model.bucket_hash if model.bucket_hash != None else 0
+            if bucket_hash != self.bucket_hash:
+                return False
+        if self.bush != None:
+            if bool(model.bush) != self.bush:
+                return False
+        return True
+
+    # models that match, then box/sphere region queries through a grid of them
+    def filter(self, models):
+        models = [model for model in models if self.match(model)]
+        if self.box == None and self.sphere == None:
+            return models
+        grid = MAPGEOGrid(models)
+        kept = None
+        if self.box != None:
+            kept = set(id(model) for model in grid.query_box(*self.box))
+        if self.sphere != None:
+            in_sphere = set(id(model)
+                            for model in grid.query_sphere(*self.sphere))
+            kept = in_sphere if kept == None else kept & in_sphere
+        # keep file order
+        return [model for model in models if id(model) in kept]
+
+
 class MAPGEO:
+    vertex_description_record = Record(
+        ('usage', 'I'),
+        ('desc_count', 'I'),
+        ('descs', '30I')  # 15 desc=(name, format)
+    )
+    planar_reflector_record = Record(
+        ('matrix', '64s'),  # matrix4 transform of viewpoint?
+        ('plane', '24s'),  # 2 vec3 position to indicate the plane
+        ('normal', '12s')  # vec3 normal, direction of plane
+    )
+    # desc format -> struct format of 1 vertex element
+    vertex_formats = {
+        0: 'f',  # 1 float32
+        1: '2f',  # 2 float32
+        2: '3f',  # 3 float32
+        3: '4f',  # 4 float 32
+        4: '4B',  # 4 byte BGRA
+        5: '4B',  # 4 byte ZYXW
+        6: '4B',  # 4 byte RGBA
+        7: '4B',  # 4 byte XYZW
+        8: '2f'  # unknown 8 bytes
+    }
+    known_descs = (
+        0,  # position
+        1,  # blendweight
+        2,  # normal
+        3,  # fog coord
+        4,  # 1st color
+        5,  # 2nd color
+        6,  # blendindex
+        7,  # diffuse uv, also texcoord 0
+        8,  # texcoord 1
+        9,  # texcoord 2
+        10,  # texcoord 3
+        11,  # texcoord 4
+        12,  # come with version 14? what is this
+        13,  # texcoord 6
+        14,  # lightmap uv, also texcoord 7
+        15,  # tangent
+    )
+    # vertex description -> vertex record, field name = desc name
+    vertex_records = {}
+
     def __init__(self):
         self.models = []
         self.bucket_grids = []
         self.planar_reflector = None
 
+        # lazy read: the file stays opened until close()
+        self.reader = None
+        self.bs = None
+        self.vds = None
+        self.vbos = None  # vb id -> (offset, size)
+        self.ibos = None  # ib id -> (offset, size)
+        # decode each buffer once, models share the same arrays
+        # vb id -> desc name -> array, ib id -> array
+        self.decoded_vbs = {}
+        self.decoded_ibs = {}
+
+    @staticmethod
+    def vertex_record(vd):
+        vd = tuple(vd)
+        record = MAPGEO.vertex_records.get(vd)
+        if record == None:
+            for desc_name, desc_format in vd:
+                if desc_name not in MAPGEO.known_descs:
+                    raise FunnyError(
+                        f'[MAPGEO.vertex_record()]: Unknown vertex description name: {desc_name}')
+            record = Record(*(
+                (desc_name, MAPGEO.vertex_formats[desc_format])
+                for desc_name, desc_format in vd
+            ))
+            MAPGEO.vertex_records[vd] = record
+        return record
+
     def flip(self):
+        flipped = set()
         for model in self.models:
 
             # flip transfom matrix
@@ -3548,426 +4906,566 @@ class MAPGEO:
             matrix = MTransform.compose(
                 position, scale, rotation, MSpace.kWorld).asMatrix()
             model.matrix = [matrix(i, j) for i in range(4) for j in range(4)]
-            for vertex in model.vertices:
-                vertex.position.x = -vertex.position.x
-                if vertex.normal != None:
-                    vertex.normal.y = -vertex.normal.y
-                    vertex.normal.z = -vertex.normal.z
 
-    def read(self, path):
-        with open(path, 'rb') as f:
-            bs = BinaryStream(f)
+            # flip bounding box, min x and max x swap
+            if model.bb != None:
+                bb_min, bb_max = model.bb
+                model.bb = (
+                    Vector(-bb_max.x, bb_min.y, bb_min.z),
+                    Vector(-bb_min.x, bb_max.y, bb_max.z)
+                )
 
-            magic = bs.read_ascii(4)
-            if magic != 'OEGM':
-                raise FunnyError(
-                    f'[MAPGEO.read()]: Wrong file signature: {magic}')
+            # shared vertex arrays must be flipped only once
+            if id(model.positions) not in flipped:
+                flipped.add(id(model.positions))
+                positions = model.positions
+                positions[0::3] = array('f', [-x for x in positions[0::3]])
+            if model.normals != None and id(model.normals) not in flipped:
+                flipped.add(id(model.normals))
+                normals = model.normals
+                normals[1::3] = array('f', [-y for y in normals[1::3]])
+                normals[2::3] = array('f', [-z for z in normals[2::3]])
+
+    # lazy: only read the table of contents, keep the file opened
+    # and decode geometry of a model when it is first accessed, call close() when done
+    # models: False to skip all buffers and models, only read bucket grids and planar reflector
+    # model_filter: MAPGEOFilter to only keep some models, others are never decoded
+    def read(self, path, mapped=True, lazy=False, models=True, model_filter=None):
+        self.reader = BinaryStream.reader(path, mapped)
+        self.bs = self.reader.__enter__()
+        try:
+            self.read_contents(self.bs, models, model_filter)
+            if not lazy:
+                for model in self.models:
+                    self.decode(model)
+        except:
+            self.close()
+            raise
+        if not lazy:
+            self.close()
+
+    # spatial index of models for region queries
+    # in the current space of models: file space, or maya space after flip()
+    def grid(self, cell_size=None):
+        return MAPGEOGrid(self.models, cell_size)
+
+    def close(self):
+        if self.reader != None:
+            self.reader.__exit__(None, None, None)
+            self.reader = None
+            self.bs = None
+
+    def read_column(self, vb_id, vd, desc_name, typecode, vertex_count):
+        record = MAPGEO.vertex_record(vd)
+        columns = self.decoded_vbs.get(vb_id)
+        if columns == None:
+            columns = self.decoded_vbs[vb_id] = {}
+        column = columns.get(desc_name)
+        if column == None:
+            offset, size = self.vbos[vb_id]
+            self.bs.seek(offset)
+            data = self.bs.read_bytes(size - size % record.size)
+            column = columns[desc_name] = record.column_array(
+                data, desc_name, typecode)
+        # model uses less vertices than its buffer has
+        # cache the slice too, models with same buffer and count share it
+        values = record.slices[desc_name]
+        value_count = vertex_count * (values.stop - values.start)
+        if len(column) > value_count:
+            key = (desc_name, vertex_count)
+            sliced = columns.get(key)
+            if sliced == None:
+                sliced = columns[key] = column[:value_count]
+            return sliced
+        return column
+
+    def read_index_buffer(self, ib_id):
+        indices = self.decoded_ibs.get(ib_id)
+        if indices == None:
+            offset, size = self.ibos[ib_id]
+            self.bs.seek(offset)
+            indices = self.decoded_ibs[ib_id] = array(
+                'H', self.bs.read_bytes(size - size % 2))
+        return indices
+
+    # decode vertex and index buffers of a lazy read model
+    def decode(self, model):
+        toc = model.toc
+        if toc == None:
+            return
+        if self.bs == None:
+            raise FunnyError(
+                f'[MAPGEO.decode({model.name})]: File is closed, can not decode model geometry.')
+        model.toc = None
+        vertex_count, vb_ids, vd_id, ib_id = toc[1:]
+        for i in range(len(vb_ids)):
+            vb_id = vb_ids[i]
+            vd = self.vds[vd_id+i]
+            for desc_name, desc_format in vd:
+                if desc_name == 0:
+                    model.positions = self.read_column(
+                        vb_id, vd, 0, 'f', vertex_count)
+                elif desc_name == 4:
+                    model.colors = self.read_column(
+                        vb_id, vd, 4, 'B', vertex_count)
+                elif desc_name == 7:
+                    model.diffuse_uvs = self.read_column(
+                        vb_id, vd, 7, 'f', vertex_count)
+                elif desc_name == 14:
+                    model.lightmap_uvs = self.read_column(
+                        vb_id, vd, 14, 'f', vertex_count)
+        model.indices = self.read_index_buffer(ib_id)
+
+    # skip 1 model record by its sizes
+    @staticmethod
+    def skip_model(bs, version, use_seperate_point_lights):
+        if version < 12:
+            bs.pad(bs.read_int32())  # name
+        # vertex count, vb count, vd id, vb ids
+        bs.pad(4)
+        vb_count = bs.read_uint32()
+        bs.pad(4 + 4*vb_count)
+        # index count, ib id
+        bs.pad(8)
+        if version >= 13:
+            bs.pad(1)  # layer
+        if version >= 15:
+            bs.pad(4)  # bucket hash
+        submesh_count = bs.read_uint32()
+        for i in range(submesh_count):
+            bs.pad(4)  # hash
+            bs.pad(bs.read_int32())  # name
+            bs.pad(16)  # index start, index count, min vertex, max vertex
+        if version != 5:
+            bs.pad(1)  # flip normals
+        # bounding box, transform matrix, quality
+        bs.pad(24 + 64 + 1)
+        if version >= 7 and version <= 12:
+            bs.pad(1)  # layer
+        if version >= 14:
+            bs.pad(1)  # bush
+        if version >= 11:
+            bs.pad(1)  # render flag
+        if use_seperate_point_lights == 1 and version < 7:
+            bs.pad(12)  # seperated point light
+        if version < 9:
+            bs.pad(108)  # 9 light probes
+        # lightmap + so
+        bs.pad(bs.read_int32() + 16)
+        if version >= 9:
+            # baked light + so
+            bs.pad(bs.read_int32() + 16)
+            if version >= 12:
+                # baked paint + so
+                bs.pad(bs.read_int32() + 16)
+
+    def read_contents(self, bs, models=True, model_filter=None):
+        magic = bs.read_ascii(4)
+        if magic != 'OEGM':
+            raise FunnyError(
+                f'[MAPGEO.read()]: Wrong file signature: {magic}')
 
-            version = bs.read_uint32()
-            if version not in (5, 6, 7, 9, 11, 12, 13, 14, 15):
-                raise FunnyError(
-                    f'[MAPGEO.read()]: Unsupported file version: {version}')
+        version = bs.read_uint32()
+        if version not in (5, 6, 7, 9, 11, 12, 13, 14, 15):
+            raise FunnyError(
+                f'[MAPGEO.read()]: Unsupported file version: {version}')
 
-            use_seperate_point_lights = 0
-            if version < 7:
-                use_seperate_point_lights = bs.read_byte()[0]
+        use_seperate_point_lights = 0
+        if version < 7:
+            use_seperate_point_lights = bs.read_byte()[0]
 
-            if version >= 9:
-                # baked terrain sampler 1
+        if version >= 9:
+            # baked terrain sampler 1
+            bs.pad(bs.read_int32())
+            if version >= 11:
+                # baked terrain sampler 2
                 bs.pad(bs.read_int32())
-                if version >= 11:
-                    # baked terrain sampler 2
-                    bs.pad(bs.read_int32())
-
-            # vertex descriptions
-            vd_count = bs.read_uint32()
-            vds = [None]*vd_count
-            for i in range(vd_count):
-                bs.pad(4)  # usage
-                desc_count = bs.read_uint32()
-                vds[i] = [
-                    # desc=(name, format)
-                    (bs.read_uint32(), bs.read_uint32())
-                    for j in range(desc_count)
-                ]
-                bs.pad(8 * (15 - desc_count))  # pad empty vertex descriptions
-
-            # vertex buffers offsets
-            # -> to read vertex later using vertex descriptions
-            vb_count = bs.read_uint32()
-            vbos = [None]*vb_count
-            for i in range(vb_count):
-                if version >= 13:
-                    bs.pad(1)  # layer
-                vb_size = bs.read_uint32()
-                vbos[i] = bs.tell()
-                bs.pad(vb_size)
 
-            # index buffers
-            ib_count = bs.read_uint32()
-            ibs = [None]*ib_count
-            for i in range(ib_count):
-                if version >= 13:
-                    bs.pad(1)  # layer
-                ib_size = bs.read_uint32()
-                ibs[i] = bs.read_uint16(ib_size // 2, True)
-
-            # for skip reading same vertex buffer
-            unpacked_vbs = [None]*vb_count
-            known_formats = {
-                0: ('f', 4, 1),  # 1 float32
-                1: ('2f', 8, 2),  # 2 float32
-                2: ('3f', 12, 3),  # 3 float32
-                3: ('4f', 16, 4),  # 4 float 32
-                4: ('4B', 4, 4),  # 4 byte BGRA
-                5: ('4B', 4, 4),  # 4 byte ZYXW
-                6: ('4B', 4, 4),  # 4 byte RGBA
-                7: ('4B', 4, 4),  # 4 byte XYZW
-                8: ('2f', 8, 2)  # unknown 8 bytes
-            }
-            known_descs = [
-                0,  # position
-                1,  # blendweight
-                2,  # normal
-                3,  # fog coord
-                4,  # 1st color
-                5,  # 2nd color
-                6,  # blendindex
-                7,  # diffuse uv, also texcoord 0
-                8,  # texcoord 1
-                9,  # texcoord 2
-                10,  # texcoord 3
-                11,  # texcoord 4
-                12,  # come with version 14? what is this
-                13,  # texcoord 6
-                14,  # lightmap uv, also texcoord 7
-                15,  # tangent
-            ]
+        if not models:
+            # skip vertex descriptions, vertex buffers, index buffers and models
+            bs.pad(bs.read_uint32() * MAPGEO.vertex_description_record.size)
+            for i in range(2):
+                buffer_count = bs.read_uint32()
+                for j in range(buffer_count):
+                    if version >= 13:
+                        bs.pad(1)  # layer
+                    bs.pad(bs.read_uint32())
             model_count = bs.read_uint32()
-            self.models = [MAPGEOModel() for i in range(model_count)]
             for model_id in range(model_count):
-                model = self.models[model_id]
-                if version < 12:
-                    model.name = bs.read_ascii(bs.read_int32())
-                else:
-                    model.name = f'MapGeo_Instance_{model_id}'
-                vertex_count, vb_count, vd_id = bs.read_uint32(3)
+                MAPGEO.skip_model(bs, version, use_seperate_point_lights)
+            self.read_tail(bs, version)
+            return
 
-                # read vertex buffer ids
-                vb_ids = bs.read_int32(vb_count, True)
+        # vertex descriptions
+        vd_count = bs.read_uint32()
+        self.vds = [
+            # desc=(name, format), ignore empty vertex descriptions
+            [(record[2+j*2], record[3+j*2]) for j in range(record[1])]
+            for record in MAPGEO.vertex_description_record.read(bs, vd_count)
+        ]
 
-                for i in range(vb_count):
-                    vb_id = vb_ids[i]
-                    vd = vds[vd_id+i]
+        # vertex buffers offsets and sizes
+        # -> to read vertex later using vertex descriptions
+        vb_count = bs.read_uint32()
+        self.vbos = [None]*vb_count
+        for i in range(vb_count):
+            if version >= 13:
+                bs.pad(1)  # layer
+            vb_size = bs.read_uint32()
+            self.vbos[i] = (bs.tell(), vb_size)
+            bs.pad(vb_size)
+
+        # index buffers offsets and sizes
+        ib_count = bs.read_uint32()
+        self.ibos = [None]*ib_count
+        for i in range(ib_count):
+            if version >= 13:
+                bs.pad(1)  # layer
+            ib_size = bs.read_uint32()
+            self.ibos[i] = (bs.tell(), ib_size)
+            bs.pad(ib_size)
+
+        model_count = bs.read_uint32()
+        self.models = [MAPGEOModel() for i in range(model_count)]
+        for model_id in range(model_count):
+            model = self.models[model_id]
+            if version < 12:
+                model.name = bs.read_ascii(bs.read_int32())
+            else:
+                model.name = f'MapGeo_Instance_{model_id}'
+            vertex_count, vb_count, vd_id = bs.read_uint32(3)
 
-                    # skip unpacked vertex buffers
-                    if unpacked_vbs[vb_id] != None:
-                        continue
+            # read vertex buffer ids
+            vb_ids = bs.read_int32(vb_count, True)
 
-                    unpacked_vbs[vb_id] = []
-                    # vertex format & size through vertex descriptions
-                    vertex_size = 0
-                    vertex_format = ''
-                    for desc_name, desc_format in vd:
-                        if desc_name not in known_descs:
-                            raise FunnyError(
-                                f'[MAPGEO.read()]: Unknown vertex description name: {desc_name}')
-                        vertex_format += known_formats[desc_format][0]
-                        vertex_size += known_formats[desc_format][1]
-
-                    # read all vertices of this buffer
-                    return_offset = bs.tell()
-                    bs.seek(vbos[vb_id])
-                    unpacked_vbs[vb_id] = Struct(
-                        vertex_format*vertex_count).unpack(bs.read_bytes(vertex_size*vertex_count))
-                    bs.seek(return_offset)
-
-                model.use_color = False
-                model.vertices = [MAPGEOVertex() for j in range(vertex_count)]
-                for i in range(vb_count):
-                    vb_id = vb_ids[i]
-                    vd = vds[vd_id+i]
-                    unpacked_vb = unpacked_vbs[vb_id]
-
-                    current_index = 0
-                    for j in range(vertex_count):
-                        vertex = model.vertices[j]
-                        for desc_name, desc_format in vd:
-                            if desc_name == 0:
-                                vertex.position = Vector(
-                                    unpacked_vb[current_index],
-                                    unpacked_vb[current_index+1],
-                                    unpacked_vb[current_index+2]
-                                )
-                            elif desc_name == 4:
-                                vertex.color = (
-                                    unpacked_vb[current_index],
-                                    unpacked_vb[current_index+1],
-                                    unpacked_vb[current_index+2],
-                                    unpacked_vb[current_index+3],
-                                )
-                                model.use_color = True
-                            elif desc_name == 7:
-                                vertex.diffuse_uv = Vector(
-                                    unpacked_vb[current_index],
-                                    unpacked_vb[current_index+1]
-                                )
-                            elif desc_name == 12 and version >= 13:
-                                model.bush = True
-                            elif desc_name == 14:
-                                vertex.lightmap_uv = Vector(
-                                    unpacked_vb[current_index],
-                                    unpacked_vb[current_index+1]
-                                )
-                            current_index += known_formats[desc_format][2]
-
-                # model indices
-                bs.pad(4)  # index_count
-                ib_id = bs.read_int32()
-                model.indices = ibs[ib_id]
+            model.use_color = False
+            for i in range(vb_count):
+                vd = self.vds[vd_id+i]
+                # raise error on unknown descs
+                MAPGEO.vertex_record(vd)
+                for desc_name, desc_format in vd:
+                    if desc_name == 4:
+                        model.use_color = True
+                    elif desc_name == 12 and version >= 13:
+                        model.bush = True
+
+            # model indices
+            bs.pad(4)  # index_count
+            ib_id = bs.read_int32()
+
+            # geometry is decoded later
+            model.toc = (self, vertex_count, vb_ids, vd_id, ib_id)
 
-                # layer
-                model.layer = bytes([255])
-                if version >= 13:
-                    model.layer = bs.read_byte()
-                if version >= 15:
-                    model.bucket_hash = bs.read_uint32()
+            # layer
+            model.layer = bytes([255])
+            if version >= 13:
+                model.layer = bs.read_byte()
+            if version >= 15:
+                model.bucket_hash = bs.read_uint32()
+
+            # submeshes
+            submesh_count = bs.read_uint32()
+            model.submeshes = [MAPGEOSubmesh()
+                               for i in range(submesh_count)]
+            for i in range(submesh_count):
+                submesh = model.submeshes[i]
+                bs.pad(4)  # hash
+                # maya doesnt allow '/' in name, so use __ instead, bruh
+                submesh.name = bs.read_ascii(
+                    bs.read_int32()).replace('/', '__')
+                # no material
+                if submesh.name == '-missing@environment-':
+                    submesh.name = 'missing_environment'
+                submesh.index_start, submesh.index_count, submesh.min_vertex, submesh.max_vertex = bs.read_uint32(
+                    4)
 
-                # submeshes
-                submesh_count = bs.read_uint32()
-                model.submeshes = [MAPGEOSubmesh()
-                                   for i in range(submesh_count)]
-                for i in range(submesh_count):
-                    submesh = model.submeshes[i]
-                    bs.pad(4)  # hash
-                    # maya doesnt allow '/' in name, so use __ instead, bruh
-                    submesh.name = bs.read_ascii(
-                        bs.read_int32()).replace('/', '__')
-                    # no material
-                    if submesh.name == '-missing@environment-':
-                        submesh.name = 'missing_environment'
-                    submesh.index_start, submesh.index_count, submesh.min_vertex, submesh.max_vertex = bs.read_uint32(
-                        4)
+            if version != 5:
+                # flip normals
+                bs.pad(1)
 
-                if version != 5:
-                    # flip normals
-                    bs.pad(1)
+            # bounding box: min, max
+            model.bb = bs.read_vec3(2)
 
-                # bounding box
-                bs.pad(24)
+            # transform matrix
+            model.matrix = list(bs.read_float(16))
 
-                # transform matrix
-                model.matrix = list(bs.read_float(16))
+            # quality: 1, 2, 4, 8, 16
+            # all quality = 1|2|4|8|16 = 31
+            bs.pad(1)
 
-                # quality: 1, 2, 4, 8, 16
-                # all quality = 1|2|4|8|16 = 31
-                bs.pad(1)
+            # layer - below version 13
+            if version >= 7 and version <= 12:
+                model.layer = bs.read_byte()
 
-                # layer - below version 13
-                if version >= 7 and version <= 12:
-                    model.layer = bs.read_byte()
+            # bush - version 14
+            if version >= 14:
+                model.bush = bs.read_byte()[0]
 
-                # bush - version 14
-                if version >= 14:
-                    model.bush = bs.read_byte()[0]
+            if version >= 11:
+                # render flag
+                bs.pad(1)
 
-                if version >= 11:
-                    # render flag
-                    bs.pad(1)
+            if use_seperate_point_lights == 1 and version < 7:
+                # pad seperated point light
+                bs.pad(12)
 
-                if use_seperate_point_lights == 1 and version < 7:
-                    # pad seperated point light
-                    bs.pad(12)
+            if version < 9:
+                # pad 9 light probes
+                bs.pad(108)
 
-                if version < 9:
-                    # pad 9 light probes
-                    bs.pad(108)
+            # lightmap
+            model.lightmap = bs.read_ascii(
+                bs.read_int32())
+            # lightmap so (scale & offset)
+            # real lightmap uv = lightmap uv * lightmap scale + lightmap offset
+            model.lightmap_so = bs.read_float(4)
 
-                # lightmap
-                model.lightmap = bs.read_ascii(
-                    bs.read_int32())
-                # lightmap so (scale & offset)
-                # real lightmap uv = lightmap uv * lightmap scale + lightmap offset
-                model.lightmap_so = bs.read_float(4)
-
-                if version >= 9:
-                    # baked light
+            if version >= 9:
+                # baked light
+                bs.pad(bs.read_int32())
+                # baked light so
+                bs.pad(16)
+
+                if version >= 12:
+                    # baked paint
                     bs.pad(bs.read_int32())
-                    # baked light so
+                    # baked paint so
                     bs.pad(16)
 
-                    if version >= 12:
-                        # baked paint
-                        bs.pad(bs.read_int32())
-                        # baked paint so
-                        bs.pad(16)
-
-            # for modded file with no bucket grid, planar reflector: stop reading
-            current = bs.tell()
-            end = bs.end()
-            if current == end:
-                print('No bucket grid')
-                return
+        # drop filtered out models before any geometry is decoded
+        if model_filter != None:
+            self.models = model_filter.filter(self.models)
 
-            # there is no reason to read bucket grids below suporting version
-            if version in (13, 15):
+        self.read_tail(bs, version)
+
+    # bucket grids and planar reflector after models
+    def read_tail(self, bs, version):
+        # for modded file with no bucket grid, planar reflector: stop reading
+        current = bs.tell()
+        end = bs.end()
+        if current == end:
+            print('No bucket grid')
+            return
+
+        # there is no reason to read bucket grids below suporting version
+        if version in (13, 15):
+            if version > 13:
+                # bucket grids
+                bucket_grid_count = bs.read_uint32()
+            else:
+                bucket_grid_count = 1
+            self.bucket_grids = [MAPGEOBucketGrid() for i in range(bucket_grid_count)]
+            for i in range(bucket_grid_count):
                 if version > 13:
-                    # bucket grids
-                    bucket_grid_count = bs.read_uint32()
-                else:
-                    bucket_grid_count = 1
-                self.bucket_grids = [MAPGEOBucketGrid() for i in range(bucket_grid_count)]
-                for i in range(bucket_grid_count):
-                    if version > 13:
-                        # hash
-                        self.bucket_grids[i].hash = bs.read_uint32()
-                    # min/max x/z(16), max out stick x/z(8), bucket size x/z(8)
-                    self.bucket_grids[i].header = bs.read_bytes(32)
-                    bucket_size = bs.read_uint16()
-                    self.bucket_grids[i].no_bucket = bs.read_byte()[0]
-                    self.bucket_grids[i].bucket_flag = bs.read_byte()[0]
-                    vertex_count, index_count = bs.read_uint32(2)
-                    if self.bucket_grids[i].no_bucket == 0:
-                        self.bucket_grids[i].vertices = bs.read_bytes(12*vertex_count)
-                        self.bucket_grids[i].indices = bs.read_bytes(2*index_count)
-                        # max stick out x/z(8)
-                        # start index + base vertex(8)
-                        # inside face count + sticking out face count(4)
-                        self.bucket_grids[i].buckets = bs.read_bytes(
-                            20*bucket_size*bucket_size)
-                        if self.bucket_grids[i].bucket_flag >= 1:
-                            # if first bit = 1, read face flags
-                            self.bucket_grids[i].face_flags = bs.read_bytes(
-                                index_count//3)
-
-                self.planar_reflector = MAPGEOPlanarReflector()
-                pr_count = bs.read_uint32()
-                self.planar_reflector.prs = [None]*pr_count
-                for i in range(pr_count):
-                    self.planar_reflector.prs[i] = (
-                        # matrix4 transform of viewpoint?
-                        bs.read_bytes(64),
-                        # 2 vec3 position to indicate the plane
-                        bs.read_bytes(24),
-                        # vec3 normal, direction of plane
-                        bs.read_bytes(12)
-                    )
+                    # hash
+                    self.bucket_grids[i].hash = bs.read_uint32()
+                # min/max x/z(16), max out stick x/z(8), bucket size x/z(8)
+                self.bucket_grids[i].header = bs.read_bytes(32)
+                bucket_size = bs.read_uint16()
+                self.bucket_grids[i].no_bucket = bs.read_byte()[0]
+                self.bucket_grids[i].bucket_flag = bs.read_byte()[0]
+                vertex_count, index_count = bs.read_uint32(2)
+                if self.bucket_grids[i].no_bucket == 0:
+                    self.bucket_grids[i].vertices = bs.read_bytes(12*vertex_count)
+                    self.bucket_grids[i].indices = bs.read_bytes(2*index_count)
+                    # max stick out x/z(8)
+                    # start index + base vertex(8)
+                    # inside face count + sticking out face count(4)
+                    self.bucket_grids[i].buckets = bs.read_bytes(
+                        20*bucket_size*bucket_size)
+                    if self.bucket_grids[i].bucket_flag >= 1:
+                        # if first bit = 1, read face flags
+                        self.bucket_grids[i].face_flags = bs.read_bytes(
+                            index_count//3)
+
+            self.planar_reflector = MAPGEOPlanarReflector()
+            pr_count = bs.read_uint32()
+            self.planar_reflector.prs = MAPGEO.planar_reflector_record.read(
+                bs, pr_count)
+
+    # reorder triangles for vertex cache and vertices for fetch order of each model, in place
+    # models that share arrays get the same reordered arrays
+    def optimize(self):
+        before_misses = 0
+        after_misses = 0
+        triangle_count = 0
+        # arrays key -> (old arrays, new arrays)
+        optimized = {}
+        for model in self.models:
+            arrays = (
+                model.indices, model.positions, model.normals,
+                model.diffuse_uvs, model.lightmap_uvs, model.colors
+            )
+            key = tuple(id(values) for values in arrays)
+            if key not in optimized:
+                old_indices = model.indices
+                indices = array('H', old_indices)
+                for submesh in model.submeshes:
+                    index_start = submesh.index_start
+                    index_end = index_start + submesh.index_count
+                    indices[index_start:index_end] = array('H', VertexCache.tipsify(
+                        old_indices[index_start:index_end]))
+                # keep the original order if it is already better
+                if VertexCache.misses(indices) >= VertexCache.misses(old_indices):
+                    indices = old_indices
+                order = VertexCache.fetch_order(
+                    indices, 0, model.vertex_count())
+                remap = [0]*len(order)
+                for new_index in range(len(order)):
+                    remap[order[new_index]] = new_index
+                optimized[key] = (arrays, (
+                    array('H', [remap[index] for index in indices]),
+                    VertexCache.reorder(model.positions, 3, order),
+                    VertexCache.reorder(model.normals, 3, order) if model.normals != None else None,
+                    VertexCache.reorder(model.diffuse_uvs, 2, order) if model.diffuse_uvs != None else None,
+                    VertexCache.reorder(model.lightmap_uvs, 2, order) if model.lightmap_uvs != None else None,
+                    VertexCache.reorder(model.colors, 4, order) if model.colors != None else None
+                ))
+            before_misses += VertexCache.misses(model.indices)
+            triangle_count += len(model.indices) // 3
+
+            model.indices, model.positions, model.normals, model.diffuse_uvs, model.lightmap_uvs, model.colors = optimized[
+                key][1]
+            after_misses += VertexCache.misses(model.indices)
+
+            # vertex range of submeshes changed
+            for submesh in model.submeshes:
+                submesh_indices = model.indices[submesh.index_start:
+                                                submesh.index_start+submesh.index_count]
+                if len(submesh_indices) > 0:
+                    submesh.min_vertex = min(submesh_indices)
+                    submesh.max_vertex = max(submesh_indices)
+
+        if triangle_count > 0:
+            MGlobal.displayInfo(
+                f'[MAPGEO.optimize()]: Vertex cache ACMR: {before_misses/triangle_count:.3f} -> {after_misses/triangle_count:.3f}')
+
+    def write(self, path, version, optimize=False):
+        if optimize:
+            self.optimize()
 
-    def write(self, path, version):
         def prepare():
             vds = []
             vbs = []
             ibs = []
+            # model index -> (vd id, vb id, ib id)
+            model_buffers = []
+            # same descriptions, same packed buffers on same layer are written once
+            # content -> id
+            vd_ids = {}
+            vb_ids = {}
+            ib_ids = {}
+            # instanced models share the same arrays, dont pack them again
+            # arrays key -> id
+            shared_vbs = {}
+            shared_ibs = {}
             for model in self.models:
-                vertex_format = ''
-                vb = []
-                min = Vector(float("inf"), float("inf"), float("inf"))
-                max = Vector(float("-inf"), float("-inf"), float("-inf"))
-                for vertex in model.vertices:
-                    # flatten float values
-                    if vertex.position != None:
-                        vertex_format += '3f'
-                        vb.extend((
-                            vertex.position.x, vertex.position.y, vertex.position.z))
-                    if vertex.normal != None:
-                        vertex_format += '3f'
-                        vb.extend((
-                            vertex.normal.x, vertex.normal.y, vertex.normal.z))
-                    if model.use_color:
-                        vertex_format += '4B'
-                        if vertex.color != None:
-                            vb.extend(vertex.color)
-                        else:
-                            vb.extend((255, 255, 255, 255))
-                    if vertex.diffuse_uv != None:
-                        vertex_format += '2f'
-                        vb.extend((
-                            vertex.diffuse_uv.x, vertex.diffuse_uv.y))
-                    if model.bush != 0:
-                        vertex_format += '3f'
-                        if version > 13:
-                            x = uniform(-0.005, 0.005) * \
-                                vertex.position.x + vertex.position.x
-                            y = uniform(-0.005, 0.005) * \
-                                vertex.position.y + vertex.position.y
-                            z = uniform(-0.005, 0.005) * \
-                                vertex.position.z + vertex.position.z
-                            vb.extend((x, y, z))
-                        else:
-                            vb.extend((vertex.position.x, vertex.position.y, vertex.position.z))
-                    if vertex.lightmap_uv != None:
-                        vertex_format += '2f'
-                        vb.extend((
-                            vertex.lightmap_uv.x, vertex.lightmap_uv.y))
-
-                    # find bounding box
-                    if min.x > vertex.position.x:
-                        min.x = vertex.position.x
-                    if min.y > vertex.position.y:
-                        min.y = vertex.position.y
-                    if min.z > vertex.position.z:
-                        min.z = vertex.position.z
-                    if max.x < vertex.position.x:
-                        max.x = vertex.position.x
-                    if max.y < vertex.position.y:
-                        max.y = vertex.position.y
-                    if max.z < vertex.position.z:
-                        max.z = vertex.position.z
-
-                # vertex descriptions
-                vd = []
-                vertex = model.vertices[0]
-                if vertex.position != None:
-                    vd.append((0, 2))
-                if vertex.normal != None:
+                vertex_count = model.vertex_count()
+                positions = model.positions
+
+                # bounding box
+                model.bb = (
+                    Vector(min(positions[0::3]), min(
+                        positions[1::3]), min(positions[2::3])),
+                    Vector(max(positions[0::3]), max(
+                        positions[1::3]), max(positions[2::3]))
+                )
+
+                # index buffers
+                ib_key = (model.layer, id(model.indices))
+                ib_id = shared_ibs.get(ib_key)
+                if ib_id == None:
+                    ib = (model.layer, array('H', model.indices).tobytes())
+                    ib_id = ib_ids.get(ib)
+                    if ib_id == None:
+                        ib_id = ib_ids[ib] = len(ibs)
+                        ibs.append(ib)
+                    shared_ibs[ib_key] = ib_id
+
+                vb_key = (
+                    model.layer, model.use_color, model.bush != 0,
+                    id(positions), id(model.normals), id(model.colors),
+                    id(model.diffuse_uvs), id(model.lightmap_uvs)
+                )
+                vd_vb_ids = shared_vbs.get(vb_key)
+                if vd_vb_ids != None:
+                    model_buffers.append((*vd_vb_ids, ib_id))
+                    continue
+
+                # vertex descriptions and their flat columns
+                vd = [(0, 2)]
+                columns = [(positions, 3)]
+                if model.normals != None:
                     vd.append((2, 2))
+                    columns.append((model.normals, 3))
                 if model.use_color:
                     vd.append((4, 4))
-                if vertex.diffuse_uv != None:
+                    if model.colors != None:
+                        columns.append((model.colors, 4))
+                    else:
+                        columns.append((array('B', [255])*(vertex_count*4), 4))
+                if model.diffuse_uvs != None:
                     vd.append((7, 1))
+                    columns.append((model.diffuse_uvs, 2))
                 if model.bush != 0:
                     vd.append((12, 2))
-                if vertex.lightmap_uv != None:
+                    if version > 13:
+                        columns.append(([
+                            uniform(-0.005, 0.005) * value + value
+                            for value in positions
+                        ], 3))
+                    else:
+                        columns.append((positions, 3))
+                if model.lightmap_uvs != None:
                     vd.append((14, 1))
+                    columns.append((model.lightmap_uvs, 2))
 
-                vds.append(vd)
-                # vertex buffers
-                vbs.append((
-                    model.layer,
-                    Struct(vertex_format).pack(*vb)
-                ))
-                # index buffers
-                ibs.append((
+                vd = tuple(vd)
+                vd_id = vd_ids.get(vd)
+                if vd_id == None:
+                    vd_id = vd_ids[vd] = len(vds)
+                    vds.append(vd)
+
+                # vertex buffers: interleave columns back into records
+                vb = (
                     model.layer,
-                    Struct(f'{len(model.indices)}H').pack(*model.indices)
-                ))
-                # bounding box
-                model.bb = (min, max)
+                    bytes(MAPGEO.vertex_record(vd).pack(list(zip(*(
+                        column[i::width]
+                        for column, width in columns
+                        for i in range(width)
+                    )))))
+                )
+                vb_id = vb_ids.get(vb)
+                if vb_id == None:
+                    vb_id = vb_ids[vb] = len(vbs)
+                    vbs.append(vb)
 
-            return vds, vbs, ibs
+                shared_vbs[vb_key] = (vd_id, vb_id)
+                model_buffers.append((vd_id, vb_id, ib_id))
 
-        with open(path, 'wb+') as f:
-            bs = BinaryStream(f)
+            return vds, vbs, ibs, model_buffers
 
+        with BinaryStream.writer(path) as bs:
             bs.write_ascii('OEGM')
             bs.write_uint32(
                 version,  # version
                 0, 0  # baked terrain sampler 1 and 2
             )
 
-            vds, vbs, ibs = prepare()
+            vds, vbs, ibs, model_buffers = prepare()
 
             # vertex descriptions
             bs.write_uint32(len(vds))
-            for vd in vds:
-                bs.write_uint32(0)  # usage: static
-                vd_count = len(vd)
-                bs.write_uint32(vd_count)
-                for desc in vd:
-                    bs.write_uint32(*desc)
-                # fill remaining empty vertex descriptions
-                fill = (0, 2)*(15-vd_count)
-                bs.write_uint32(*fill)
+            MAPGEO.vertex_description_record.write(bs, [
+                (
+                    0,  # usage: static
+                    len(vd),
+                    *[value for desc in vd for value in desc],
+                    # fill remaining empty vertex descriptions
+                    *(0, 2)*(15-len(vd))
+                )
+                for vd in vds
+            ])
 
             # vertex buffers
             bs.write_uint32(len(vbs))
@@ -3985,17 +5483,17 @@ class MAPGEO:
 
             # model
             bs.write_uint32(len(self.models))
-            model_id = 0
-            for model in self.models:
+            for model_id in range(len(self.models)):
+                model = self.models[model_id]
+                vd_id, vb_id, ib_id = model_buffers[model_id]
                 bs.write_uint32(
-                    len(model.vertices),  # vertex count
+                    model.vertex_count(),  # vertex count
                     1,  # vb count
-                    model_id,  # vd id
-                    model_id,  # vb id
+                    vd_id,  # vd id
+                    vb_id,  # vb id
                     len(model.indices),  # index count
-                    model_id  # ib id
+                    ib_id  # ib id
                 )
-                model_id += 1
 
                 # layer
                 bs.write_bytes(model.layer)
@@ -4078,10 +5576,8 @@ class MAPGEO:
 
             if self.planar_reflector != None:
                 bs.write_uint32(len(self.planar_reflector.prs))
-                for m, b, v in self.planar_reflector.prs:
-                    bs.write_bytes(m)
-                    bs.write_bytes(b)
-                    bs.write_bytes(v)
+                MAPGEO.planar_reflector_record.write(
+                    bs, self.planar_reflector.prs)
 
     def load(self, ssmat=False):
         # to call only 1 cmd
@@ -4122,47 +5618,41 @@ class MAPGEO:
         group_transform = MFnTransform()
         group_transform.create()
         group_name = 'MapID'
+        # models with the same shared arrays, lightmap and submeshes are loaded as instances of 1 mesh
+        # instance key -> mesh
+        instanced_meshes = {}
         for model in self.models:
             MGlobal.displayInfo(f'[MAPGEO.load()]: Loading {model.name}')
 
-            vertex_count = len(model.vertices)
-            index_count = len(model.indices)
-            face_count = index_count // 3
-
-            # create mesh
-            vertices = MFloatPointArray(vertex_count)
-            u_values = MFloatArray(vertex_count)
-            v_values = MFloatArray(vertex_count)
-            poly_count = MIntArray(face_count, 3)
-            poly_indices = MIntArray(index_count)
-            for i in range(vertex_count):
-                vertex = model.vertices[i]
-                vertices[i].x = vertex.position.x
-                vertices[i].y = vertex.position.y
-                vertices[i].z = vertex.position.z
-                u_values[i] = vertex.diffuse_uv.x
-                v_values[i] = 1.0 - vertex.diffuse_uv.y
-            for i in range(index_count):
-                poly_indices[i] = model.indices[i]
-
-            mesh = MFnMesh()
-            mesh.create(
-                vertex_count,
-                face_count,
-                vertices,
-                poly_count,
-                poly_indices,
-                u_values,
-                v_values
-            )
-            mesh.assignUVs(
-                poly_count, poly_indices
+            instance_key = (
+                id(model.positions), id(model.indices), id(model.diffuse_uvs),
+                id(model.lightmap_uvs), id(model.colors),
+                model.lightmap, model.lightmap_so,
+                tuple((submesh.name, submesh.index_start, submesh.index_count)
+                      for submesh in model.submeshes)
             )
+            mesh = instanced_meshes.get(instance_key)
+            instanced = mesh != None
+            if instanced:
+                # new transform sharing the mesh of previous model
+                transform = MFnTransform()
+                transform.create()
+                transform.addChild(mesh.object(), MFnTransform.kNextPos, True)
+            else:
+                # create mesh
+                diffuse_uvs = model.diffuse_uvs
+                mesh = MMesh.create(
+                    model.positions,
+                    model.indices,
+                    diffuse_uvs[0::2],
+                    [1.0 - v for v in diffuse_uvs[1::2]]
+                )
+                mesh.setName(f'{model.name}Shape')
+                transform = MFnTransform(mesh.parent(0))
+                instanced_meshes[instance_key] = mesh
 
             # name and transform
-            mesh.setName(f'{model.name}Shape')
             mesh_name = mesh.name()
-            transform = MFnTransform(mesh.parent(0))
             transform.setName(model.name)
             transform_name = transform.name()
             matrix = MMatrix()
@@ -4177,45 +5667,37 @@ class MAPGEO:
                 full_lightmap = '__'.join(temp_lightmap[:-1])
                 group_name = f'riot_{full_lightmap}'
 
-                mesh.createUVSetWithName(short_lightmap)
-                lightmap_u_values = MFloatArray(vertex_count)
-                lightmap_v_values = MFloatArray(vertex_count)
-                for i in range(vertex_count):
-                    vertex = model.vertices[i]
-                    lightmap_u_values[i] = vertex.lightmap_uv.x * \
-                        model.lightmap_so[0] + model.lightmap_so[2]
-                    lightmap_v_values[i] = 1.0-(vertex.lightmap_uv.y *
-                                                model.lightmap_so[1] + model.lightmap_so[3])
-
-                mesh.setUVs(
-                    lightmap_u_values, lightmap_v_values, short_lightmap
-                )
-                mesh.assignUVs(
-                    poly_count, poly_indices, short_lightmap
-                )
+            if not instanced:
+                # lightmap uv
+                if lightmap_flag:
+                    scale_u, scale_v, offset_u, offset_v = model.lightmap_so
+                    lightmap_uvs = model.lightmap_uvs
+                    MMesh.add_uv_set(
+                        mesh, short_lightmap,
+                        [u * scale_u + offset_u for u in lightmap_uvs[0::2]],
+                        [1.0-(v * scale_v + offset_v)
+                         for v in lightmap_uvs[1::2]],
+                        model.indices
+                    )
 
-            # color
-            if model.use_color:
-                colors = MColorArray(vertex_count, MColor(1.0, 1.0, 1.0, 1.0))
-                vertex_indices = MIntArray(vertex_count)
-                for i in range(vertex_count):
-                    vertex_indices[i] = i
-                    if vertex.color != None:
-                        colors[i].b = vertex.color[0] / 255.0
-                        colors[i].g = vertex.color[1] / 255.0
-                        colors[i].r = vertex.color[2] / 255.0
-                        colors[i].a = vertex.color[3] / 255.0
-                mesh.setVertexColors(colors, vertex_indices)
+                # color
+                if model.use_color:
+                    # bgra bytes -> rgba
+                    colors = array('B', model.colors)
+                    colors[0::4] = model.colors[2::4]
+                    colors[2::4] = model.colors[0::4]
+                    MMesh.set_colors(mesh, [value / 255.0 for value in colors])
 
             for submesh in model.submeshes:
                 submesh_name = submesh.name
                 # shading group
                 face_start = submesh.index_start // 3
                 face_end = (submesh.index_start + submesh.index_count) // 3
-                # add submesh faces to shading group
-                execmd += f'sets -e -forceElement "{submesh_name}_SG" {mesh_name}.f[{face_start}:{face_end}];'
+                # add submesh faces of this instance to shading group
+                execmd += f'sets -e -forceElement "{submesh_name}_SG" {transform_name}|{mesh_name}.f[{face_start}:{face_end}];'
 
-            mesh.updateSurface()
+            if not instanced:
+                mesh.updateSurface()
 
             # convert layer in byte to 8 char binary string, example: 10101010
             # from RIGHT to LEFT, if the char at index 3 is '1' -> the object appear on layer index 3
@@ -4301,8 +5783,24 @@ class MAPGEO:
         group_name = group_transform.name()
 
         # auto freeze selected group transform
-        MGlobal.executeCommand(
-            f'makeIdentity -apply true -t 1 -r 1 -s 1 -n 0 -pn 1 -jointOrient;')
+        # freezing would bake instance transforms into their shared mesh, skip it if any mesh is instanced
+        # each model then takes its matrix from its own dagpath, relative to the parent of the group
+        has_instances = False
+        dagpath = MDagPath()
+        iterator = MItDag(MItDag.kDepthFirst, MFn.kMesh)
+        iterator.reset(group_transform.object())
+        while not iterator.isDone():
+            iterator.getPath(dagpath)
+            if dagpath.isInstanced():
+                has_instances = True
+                break
+            iterator.next()
+        if has_instances:
+            MGlobal.displayWarning(
+                f'[MAPGEO.dump()]: {group_name} has instanced meshes, skip freezing its transform.')
+        else:
+            MGlobal.executeCommand(
+                f'makeIdentity -apply true -t 1 -r 1 -s 1 -n 0 -pn 1 -jointOrient;')
 
         # layer
         layer_models = {}
@@ -4338,6 +5836,8 @@ class MAPGEO:
 
         # const define
         NO_COLOR = MColor(-1.0, -1.0, -1.0, -1.0)
+        # (mesh node, model) of dumped instanced meshes
+        instanced_models = []
         # iterator all meshes in group transform
         mesh_dagpath = MDagPath()
         iteratorMesh = MItDag(MItDag.kDepthFirst, MFn.kMesh)
@@ -4354,10 +5854,11 @@ class MAPGEO:
             model = MAPGEOModel()
 
             # name and transform
-            transform = MFnTransform(mesh.parent(0))
+            # transform of this path, an instanced mesh has 1 parent per instance
+            transform = MFnTransform(mesh_dagpath.transform())
             model.name = transform.name()
             MGlobal.displayInfo(f'[MAPGEO.dump()]: Dumping {model.name}')
-            matrix = transform.transformationMatrix()
+            matrix = mesh_dagpath.inclusiveMatrix() * selected_dagpath.exclusiveMatrixInverse()
             model.matrix = [matrix(i, j) for i in range(4) for j in range(4)]
 
             # layer
@@ -4379,6 +5880,31 @@ class MAPGEO:
                     model.bucket_hash = int(MGlobal.executeCommandStringResult(f'getAttr {model.name}.buckethash'), 16)
                 except:
                     model.bucket_hash = 0
+
+            # instanced mesh: share geometry of the model dumped from the same mesh
+            # so they are written as shared buffers
+            if mesh_dagpath.isInstanced():
+                shape = mesh_dagpath.node()
+                source = None
+                for instanced_shape, instanced_model in instanced_models:
+                    if instanced_shape == shape:
+                        source = instanced_model
+                        break
+                if source != None:
+                    model.submeshes = source.submeshes
+                    model.indices = source.indices
+                    model.positions = source.positions
+                    model.normals = source.normals
+                    model.diffuse_uvs = source.diffuse_uvs
+                    model.lightmap_uvs = source.lightmap_uvs
+                    model.colors = source.colors
+                    model.use_color = source.use_color
+                    model.lightmap = source.lightmap
+                    self.models.append(model)
+                    iteratorMesh.next()
+                    continue
+                instanced_models.append((shape, model))
+
             # get shader/materials
             shaders = MObjectArray()
             face_shader = MIntArray()
@@ -4497,6 +6023,8 @@ class MAPGEO:
             model.use_color = False
             # iterator on vertices
             # to dump all new vertices base on uv_index
+            # vertex = (uv_index, position, normal, diffuse uv, lightmap uv, bgra color)
+            vertices = []
             normals = MVectorArray()
             uv_indices = MIntArray()
             iterator = MItMeshVertex(mesh_dagpath)
@@ -4514,34 +6042,29 @@ class MAPGEO:
                         continue
                     if uv_index not in seen:
                         seen.append(uv_index)
-                        vertex = MAPGEOVertex()
 
                         # position
                         position = iterator.position(MSpace.kTransform)
-                        vertex.position = Vector(
-                            position.x, position.y, position.z)
 
                         # average of normals of all faces connect to this vertex
                         iterator.getNormals(normals)
                         normal_count = normals.length()
-                        vertex.normal = Vector(0.0, 0.0, 0.0)
-                        for i in range(normal_count):
-                            vertex.normal.x += normals[i].x
-                            vertex.normal.y += normals[i].y
-                            vertex.normal.z += normals[i].z
-                        vertex.normal.x /= normal_count
-                        vertex.normal.y /= normal_count
-                        vertex.normal.z /= normal_count
+                        normal = (
+                            sum(normals[j].x for j in range(normal_count)) / normal_count,
+                            sum(normals[j].y for j in range(normal_count)) / normal_count,
+                            sum(normals[j].z for j in range(normal_count)) / normal_count
+                        )
 
                         # uv
-                        vertex.diffuse_uv = Vector(
+                        diffuse_uv = (
                             u_values[uv_index],
                             1.0 - v_values[uv_index]
                         )
+                        lightmap_uv = (0.0, 0.0)
                         if lightmap_flag:
                             if uv_index >= 0 and uv_index < lightmap_uv_count:
                                 if lightmap_u_values[uv_index] != None and lightmap_v_values[uv_index] != None:
-                                    vertex.lightmap_uv = Vector(
+                                    lightmap_uv = (
                                         lightmap_u_values[uv_index],
                                         1.0 - lightmap_v_values[uv_index]
                                     )
@@ -4549,21 +6072,26 @@ class MAPGEO:
                                     bad_lightmap_mesh = True
                             else:
                                 bad_lightmap_mesh = True
-                        vertex.uv_index = uv_index
 
                         # color
                         color = MColor()
                         iterator.getColor(color)
                         if color != NO_COLOR:
-                            vertex.color = (
+                            color = (
                                 int(color.b * 255.0),
                                 int(color.g * 255.0),
                                 int(color.r * 255.0),
                                 int(color.a * 255.0)
                             )
                             model.use_color = True
+                        else:
+                            color = (255, 255, 255, 255)
 
-                        model.vertices.append(vertex)
+                        vertices.append((
+                            uv_index,
+                            (position.x, position.y, position.z),
+                            normal, diffuse_uv, lightmap_uv, color
+                        ))
                 iterator.next()
 
             if lightmap_flag:
@@ -4571,8 +6099,20 @@ class MAPGEO:
                     MGlobal.displayWarning(
                         f'[MAPGEO.dump({mesh.name()})]: This mesh contains a vertex that has diffuse UV but no lightmap UV.')
 
-            # sort vertices by uv_index
-            model.vertices.sort(key=lambda vertex: vertex.uv_index)
+            # sort vertices by uv_index, then split them into columns
+            vertices.sort(key=lambda vertex: vertex[0])
+            model.positions = array('f', chain.from_iterable(
+                vertex[1] for vertex in vertices))
+            model.normals = array('f', chain.from_iterable(
+                vertex[2] for vertex in vertices))
+            model.diffuse_uvs = array('f', chain.from_iterable(
+                vertex[3] for vertex in vertices))
+            if lightmap_flag:
+                model.lightmap_uvs = array('f', chain.from_iterable(
+                    vertex[4] for vertex in vertices))
+            if model.use_color:
+                model.colors = array('B', chain.from_iterable(
+                    vertex[5] for vertex in vertices))
 
             # create MAPGEOModel data
             index_start = 0
@@ -0,0 +1,85 @@
+# benchmark: create a grid mesh with per element api 1.0 array fills vs MMesh.create bulk path
+# run in maya script editor with lol_maya.py plugin loaded
+import time
+import importlib.util
+import maya.cmds as cmds
+from maya.OpenMaya import MFloatPointArray, MFloatArray, MIntArray, MFnMesh
+
+
+def load_plugin_module():
+    path = cmds.pluginInfo('lol_maya', query=True, path=True)
+    spec = importlib.util.spec_from_file_location('lol_maya_benchmark', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def grid(size):
+    # size x size quads, 2 triangles each
+    positions = []
+    u_values = []
+    v_values = []
+    for y in range(size + 1):
+        for x in range(size + 1):
+            positions.extend((float(x), 0.0, float(y)))
+            u_values.append(x / size)
+            v_values.append(y / size)
+    indices = []
+    for y in range(size):
+        for x in range(size):
+            a = y * (size + 1) + x
+            b = a + 1
+            c = a + size + 1
+            d = c + 1
+            indices.extend((a, c, b, b, c, d))
+    return positions, indices, u_values, v_values
+
+
+def create_per_element(positions, indices, u_values, v_values):
+    # old way: fill every element through api 1.0 wrappers
+    vertex_count = len(positions) // 3
+    index_count = len(indices)
+    face_count = index_count // 3
+    vertices = MFloatPointArray(vertex_count)
+    us = MFloatArray(vertex_count)
+    vs = MFloatArray(vertex_count)
+    poly_count = MIntArray(face_count, 3)
+    poly_indices = MIntArray(index_count)
+    for i in range(vertex_count):
+        vertices[i].x = positions[i*3]
+        vertices[i].y = positions[i*3+1]
+        vertices[i].z = positions[i*3+2]
+        us[i] = u_values[i]
+        vs[i] = v_values[i]
+    for i in range(index_count):
+        poly_indices[i] = indices[i]
+    mesh = MFnMesh()
+    mesh.create(vertex_count, face_count, vertices,
+                poly_count, poly_indices, us, vs)
+    mesh.assignUVs(poly_count, poly_indices)
+    return mesh
+
+
+def run(sizes=(50, 100, 200, 300)):
+    lol_maya = load_plugin_module()
+    for size in sizes:
+        data = grid(size)
+        vertex_count = len(data[0]) // 3
+
+        start = time.perf_counter()
+        create_per_element(*data)
+        per_element = time.perf_counter() - start
+
+        start = time.perf_counter()
+        lol_maya.MMesh.create(*data)
+        bulk = time.perf_counter() - start
+
+        print(
+            f'{vertex_count} vertices: per element {per_element:.3f}s, bulk {bulk:.3f}s, '
+            f'{per_element / vertex_count * 1e6:.2f} vs {bulk / vertex_count * 1e6:.2f} us/vertex'
+        )
+    cmds.file(new=True, force=True)
+
+
+if __name__ == '__main__':
+    run()
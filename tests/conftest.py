@@ -0,0 +1,75 @@
+# run with mayapy: mayapy -m pytest tests
+# or with plain python: maya modules are stubbed, only file format code can be tested
+import os
+import sys
+import types
+import importlib.util
+import pytest
+
+
+def stub_maya():
+    # the few maya names lol_maya.py needs at import and in file format code
+    class MGlobal:
+        @staticmethod
+        def displayInfo(message):
+            pass
+
+        @staticmethod
+        def displayWarning(message):
+            pass
+
+        @staticmethod
+        def executeCommand(*args):
+            pass
+
+        @staticmethod
+        def executeCommandStringResult(command):
+            # FunnyError shows a dialog
+            return ''
+
+    class MPxFileTranslator:
+        pass
+
+    modules = {
+        'maya': {},
+        'maya.OpenMaya': {'MGlobal': MGlobal},
+        'maya.OpenMayaAnim': {},
+        'maya.OpenMayaMPx': {
+            'MPxFileTranslator': MPxFileTranslator,
+            'asMPxPtr': lambda obj: obj
+        },
+        'maya.api': {},
+        'maya.api.OpenMaya': {},
+        'maya.api.OpenMayaAnim': {},
+    }
+    for name, names in modules.items():
+        module = types.ModuleType(name)
+        module.__dict__.update(names)
+        sys.modules[name] = module
+
+
+try:
+    import maya.OpenMaya
+except ImportError:
+    stub_maya()
+
+
+root = os.path.join(os.path.dirname(__file__), '..')
+
+
+def load_plugin_module():
+    path = os.path.join(root, 'plug-ins', 'lol_maya.py')
+    spec = importlib.util.spec_from_file_location('lol_maya_test', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope='session')
+def lol_maya():
+    return load_plugin_module()
+
+
+@pytest.fixture(scope='session')
+def characters_path():
+    return os.path.join(root, 'characters', 'ambessa', 'skins', 'base')
@@ -0,0 +1,248 @@
+import os
+import random
+from math import sqrt, acos, degrees
+import pytest
+
+
+def anm_path(characters_path, name):
+    return os.path.join(characters_path, 'animations', name)
+
+
+def make_anm(lol_maya, frame_count, track_count):
+    anm = lol_maya.ANM()
+    anm.fps = 30.0
+    anm.duration = frame_count / anm.fps
+    anm.tracks = [lol_maya.ANMTrack() for i in range(track_count)]
+    for i in range(track_count):
+        anm.tracks[i].joint_hash = i + 1
+    anm.index_tracks()
+    anm.init_frames(frame_count, 1)
+    return anm
+
+
+def random_quats(count):
+    values = []
+    for i in range(count):
+        quat = [random.uniform(-1.0, 1.0) for j in range(4)]
+        length = sqrt(sum(value * value for value in quat))
+        values.extend(value / length for value in quat)
+    return values
+
+
+def quat_angle(a, b):
+    # angle in degrees between 2 quats, q and -q are same rotation
+    length = sqrt(sum(x * x for x in a) * sum(x * x for x in b))
+    dot = abs(sum(x * y for x, y in zip(a, b))) / length
+    return degrees(2.0 * acos(min(dot, 1.0)))
+
+
+def cubic(window, times, time):
+    # r3d2canm evaluation: hermite with catmull-rom tangents scaled by key times
+    t0, t1, t2, t3 = times
+    p0, p1, p2, p3 = window
+    duration = t2 - t1
+    ease_in = duration / (t2 - t0)
+    ease_out = duration / (t3 - t1)
+    s = (time - t1) / duration
+    h00 = 2 * s**3 - 3 * s**2 + 1
+    h10 = s**3 - 2 * s**2 + s
+    h01 = 3 * s**2 - 2 * s**3
+    h11 = s**3 - s**2
+    return [
+        h00 * p1[c] + h10 * ease_in * (p2[c] - p0[c]) +
+        h01 * p2[c] + h11 * ease_out * (p3[c] - p1[c])
+        for c in range(len(p1))
+    ]
+
+
+def max_cubic_errors(original, result):
+    # evaluate every original key from the kept keys of result
+    # return max translation distance, rotation degrees, scale distance
+    frame_count = original.frame_count
+    errors = []
+    for values, masks, result_values, result_masks, size in (
+        (original.translations, original.translation_masks,
+         result.translations, result.translation_masks, 3),
+        (original.rotations, original.rotation_masks,
+         result.rotations, result.rotation_masks, 4),
+        (original.scales, original.scale_masks,
+         result.scales, result.scale_masks, 3)
+    ):
+        worst = 0.0
+        for t in range(len(original.tracks)):
+            start = t * frame_count
+            keys = [f for f in range(frame_count) if result_masks[start+f]]
+            for f in range(frame_count):
+                if not masks[start+f] or len(keys) < 2:
+                    continue
+                i = 0
+                while i < len(keys) - 2 and keys[i+1] <= f:
+                    i += 1
+                frames = [keys[max(i-1, 0)], keys[i], keys[i+1],
+                          keys[min(i+2, len(keys)-1)]]
+                window = [
+                    list(result_values[(start+k)*size:(start+k)*size+size]) for k in frames]
+                if size == 4:
+                    for j in (0, 2, 3):
+                        if sum(x * y for x, y in zip(window[j], window[1])) < 0.0:
+                            window[j] = [-x for x in window[j]]
+                value = cubic(window, frames, f)
+                key = values[(start+f)*size:(start+f)*size+size]
+                if size == 4:
+                    error = quat_angle(value, key)
+                else:
+                    error = sqrt(sum((x - y) ** 2 for x, y in zip(value, key)))
+                worst = max(worst, error)
+        errors.append(worst)
+    return errors
+
+
+def test_compress_quats_round_trip(lol_maya):
+    random.seed(1)
+    quats = random_quats(500) + [0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, -1.0]
+    data = lol_maya.CTransform.compress_quats(lol_maya.array('f', quats))
+    assert len(data) == len(quats) // 4 * 6
+    result = lol_maya.CTransform.decompress_quats(data)
+    for i in range(0, len(quats), 4):
+        assert quat_angle(quats[i:i+4], result[i:i+4]) < 0.01
+
+
+def test_compress_vecs_round_trip(lol_maya):
+    random.seed(2)
+    vecs = [random.uniform(-50.0, 80.0) for i in range(300)]
+    vec_min = lol_maya.Vector(min(vecs[0::3]), min(vecs[1::3]), min(vecs[2::3]))
+    vec_max = lol_maya.Vector(max(vecs[0::3]), max(vecs[1::3]), max(vecs[2::3]))
+    data = lol_maya.CTransform.compress_vecs(
+        vec_min, vec_max, lol_maya.array('f', vecs))
+    assert len(data) == len(vecs) * 2
+    result = lol_maya.CTransform.decompress_vecs(vec_min, vec_max, data)
+    # 16 bits over a range of 130
+    assert result.tolist() == pytest.approx(vecs, abs=130.0 / 65535)
+
+
+@pytest.mark.parametrize('version', [4, 5])
+def test_write_anmd_round_trip(lol_maya, characters_path, tmp_path, version):
+    anm = lol_maya.ANM()
+    anm.read(anm_path(characters_path, 'spell4_start.domina.anm'))
+    path = str(tmp_path / f'v{version}.anm')
+    anm.write(path, version=version)
+
+    result = lol_maya.ANM()
+    result.read(path)
+    assert result.frame_count == anm.frame_count
+    assert result.fps == pytest.approx(anm.fps)
+    assert [track.joint_hash for track in result.tracks] == [
+        track.joint_hash for track in anm.tracks]
+    assert result.translations.tolist() == pytest.approx(
+        anm.translations.tolist(), abs=1e-5)
+    assert result.scales.tolist() == pytest.approx(
+        anm.scales.tolist(), abs=1e-5)
+    # v5 quats are 48 bits
+    for i in range(0, len(anm.rotations), 4):
+        assert quat_angle(
+            anm.rotations[i:i+4], result.rotations[i:i+4]) < 0.01
+
+
+def test_write_canm_round_trip(lol_maya, characters_path, tmp_path):
+    anm = lol_maya.ANM()
+    anm.read(anm_path(characters_path, 'joke_loop.domina.anm'))
+    path = str(tmp_path / 'canm.anm')
+    anm.write_canm(path)
+
+    result = lol_maya.ANM()
+    result.read(path)
+    assert result.frame_count == anm.frame_count
+    assert [track.joint_hash for track in result.tracks] == [
+        track.joint_hash for track in anm.tracks]
+    for values, masks, result_values, result_masks, size in (
+        (anm.translations, anm.translation_masks,
+         result.translations, result.translation_masks, 3),
+        (anm.scales, anm.scale_masks, result.scales, result.scale_masks, 3)
+    ):
+        assert result_masks == masks
+        span = max(values) - min(values)
+        assert result_values.tolist() == pytest.approx(
+            values.tolist(), abs=span / 65535 + 1e-6)
+    assert result.rotation_masks == anm.rotation_masks
+    for i in range(0, len(anm.rotations), 4):
+        if anm.rotation_masks[i//4]:
+            assert quat_angle(
+                anm.rotations[i:i+4], result.rotations[i:i+4]) < 0.01
+
+
+def test_write_canm_empty_track_is_identity(lol_maya, tmp_path):
+    anm = make_anm(lol_maya, 4, 2)
+    for f in range(4):
+        anm.translations[f*3:f*3+3] = lol_maya.array('f', (f, 2.0, 3.0))
+        anm.scales[f*3:f*3+3] = lol_maya.array('f', (2.0, 2.0, 2.0))
+        anm.rotations[f*4:f*4+4] = lol_maya.array('f', (0.0, 0.0, 0.0, 1.0))
+    # second track has no key at all
+    anm.translation_masks[4:8] = lol_maya.array('B', bytes(4))
+    anm.scale_masks[4:8] = lol_maya.array('B', bytes(4))
+    anm.rotation_masks[4:8] = lol_maya.array('B', bytes(4))
+
+    path = str(tmp_path / 'empty.anm')
+    anm.write_canm(path)
+
+    result = lol_maya.ANM()
+    result.read(path)
+    start = result.track_indices[2] * result.frame_count
+    assert result.scale_masks[start] == 1
+    assert result.scales[start*3:start*3+3].tolist() == pytest.approx(
+        [1.0, 1.0, 1.0], abs=1e-3)
+    assert result.rotations[start*4:start*4+4].tolist() == pytest.approx(
+        [0.0, 0.0, 0.0, 1.0], abs=1e-3)
+    assert result.translations[start*3:start*3+3].tolist() == pytest.approx(
+        [0.0, 0.0, 0.0], abs=1e-3)
+    # first track keeps its data
+    start = result.track_indices[1] * result.frame_count
+    assert result.scales[start*3:start*3+3].tolist() == pytest.approx(
+        [2.0, 2.0, 2.0], abs=1e-3)
+
+
+def test_reduce_exact_keeps_only_needed_keys(lol_maya):
+    anm = make_anm(lol_maya, 30, 1)
+    for f in range(30):
+        # linear translation, constant rotation, scale with a bump at frame 15
+        anm.translations[f*3:f*3+3] = lol_maya.array('f', (f, 0.0, -2.0 * f))
+        anm.rotations[f*4:f*4+4] = lol_maya.array('f', (0.0, 0.0, 0.0, 1.0))
+        bump = 2.0 if f == 15 else 1.0
+        anm.scales[f*3:f*3+3] = lol_maya.array('f', (bump, 1.0, 1.0))
+    anm.reduce(0.0, 0.0, 0.0)
+
+    def kept(masks):
+        return [f for f in range(30) if masks[f]]
+    assert kept(anm.translation_masks) == [0, 29]
+    assert kept(anm.rotation_masks) == [0, 29]
+    # cubic tangents around the bump spread it to neighbour frames, they are kept
+    scale_keys = kept(anm.scale_masks)
+    assert 15 in scale_keys and 14 in scale_keys and 16 in scale_keys
+    assert len(scale_keys) < 30
+
+
+def test_reduce_error_bound_after_write_canm(lol_maya, characters_path, tmp_path):
+    # every frame is a key in r3d2anmd
+    path = anm_path(characters_path, 'spell4_start.domina.anm')
+    original = lol_maya.ANM()
+    original.read(path)
+    anm = lol_maya.ANM()
+    anm.read(path)
+    before = sum(anm.translation_masks) + sum(anm.rotation_masks) + \
+        sum(anm.scale_masks)
+    anm.reduce(0.1, 0.5, 0.01)
+    after = sum(anm.translation_masks) + sum(anm.rotation_masks) + \
+        sum(anm.scale_masks)
+    assert after < before
+
+    reduced_path = str(tmp_path / 'reduced.anm')
+    anm.write_canm(reduced_path)
+    result = lol_maya.ANM()
+    result.read(reduced_path)
+    translation_error, rotation_error, scale_error = max_cubic_errors(
+        original, result)
+    # error bound + 16/48 bits quantization
+    translation_span = max(original.translations) - min(original.translations)
+    scale_span = max(original.scales) - min(original.scales)
+    assert translation_error <= 0.1 + translation_span / 65535
+    assert rotation_error <= 0.5 + 0.01
+    assert scale_error <= 0.01 + scale_span / 65535
@@ -0,0 +1,155 @@
+import random
+import pytest
+
+
+def make_model(lol_maya, name, x, layer, positions, indices, uvs):
+    model = lol_maya.MAPGEOModel()
+    model.name = name
+    model.positions = positions
+    model.indices = indices
+    model.diffuse_uvs = uvs
+    submesh = lol_maya.MAPGEOSubmesh()
+    submesh.name = 'Maps/KitPieces/mat'
+    submesh.index_start = 0
+    submesh.index_count = len(indices)
+    submesh.min_vertex = 0
+    submesh.max_vertex = len(positions) // 3 - 1
+    model.submeshes = [submesh]
+    model.layer = bytes([layer])
+    model.bucket_hash = 0
+    model.bush = 0
+    model.use_color = False
+    model.lightmap = ''
+    model.matrix = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0,
+                    0.0, 0.0, 1.0, 0.0, x, 0.0, 0.0, 1.0]
+    return model
+
+
+@pytest.fixture
+def mapgeo_path(lol_maya, tmp_path):
+    # 6 models along x, models 0, 2, 4 share the same arrays on set1, models 1, 3, 5 on set2
+    random.seed(3)
+    vertex_count = 20
+    shared = (
+        lol_maya.array('f', [random.uniform(-5.0, 5.0)
+                       for i in range(vertex_count*3)]),
+        lol_maya.array('H', [random.randrange(vertex_count)
+                       for i in range(vertex_count*3)]),
+        lol_maya.array('f', [random.random() for i in range(vertex_count*2)])
+    )
+    mg = lol_maya.MAPGEO()
+    for i in range(6):
+        if i % 2 == 0:
+            arrays = shared
+        else:
+            arrays = (
+                lol_maya.array('f', [random.uniform(-5.0, 5.0)
+                               for j in range(vertex_count*3)]),
+                lol_maya.array('H', [random.randrange(vertex_count)
+                               for j in range(vertex_count*3)]),
+                lol_maya.array('f', [random.random()
+                               for j in range(vertex_count*2)])
+            )
+        mg.models.append(make_model(
+            lol_maya, f'MapGeo_Instance_{i}', i * 100.0, 1 << (i % 2), *arrays))
+    bucket_grid = lol_maya.MAPGEOBucketGrid()
+    bucket_grid.hash = 0
+    bucket_grid.header = bytes(32)
+    bucket_grid.no_bucket = 1
+    bucket_grid.bucket_flag = 0
+    bucket_grid.vertices = b''
+    bucket_grid.indices = b''
+    bucket_grid.buckets = b''
+    mg.bucket_grids = [bucket_grid]
+    mg.planar_reflector = lol_maya.MAPGEOPlanarReflector()
+    path = str(tmp_path / 'test.mapgeo')
+    mg.write(path, 15)
+    return path
+
+
+def geometry(model):
+    return (model.positions.tolist(), model.indices.tolist(),
+            model.diffuse_uvs.tolist())
+
+
+def test_lazy_read_matches_full_read(lol_maya, mapgeo_path):
+    full = lol_maya.MAPGEO()
+    full.read(mapgeo_path)
+    assert [model.name for model in full.models] == [
+        f'MapGeo_Instance_{i}' for i in range(6)]
+
+    lazy = lol_maya.MAPGEO()
+    lazy.read(mapgeo_path, lazy=True)
+    try:
+        # nothing decoded before first access
+        assert all(model.toc != None for model in lazy.models)
+        for full_model, lazy_model in zip(full.models, lazy.models):
+            assert geometry(lazy_model) == geometry(full_model)
+        # models written from shared arrays share them again
+        assert lazy.models[0].positions is lazy.models[2].positions
+        assert lazy.models[0].indices is lazy.models[4].indices
+        assert lazy.models[1].positions is not lazy.models[3].positions
+    finally:
+        lazy.close()
+    assert lazy.bs == None
+
+
+def test_lazy_read_closed_file_can_not_decode(lol_maya, mapgeo_path):
+    mg = lol_maya.MAPGEO()
+    mg.read(mapgeo_path, lazy=True)
+    mg.close()
+    with pytest.raises(lol_maya.FunnyError):
+        mg.models[0].positions
+
+
+def test_write_read_round_trip(lol_maya, mapgeo_path, tmp_path):
+    mg = lol_maya.MAPGEO()
+    mg.read(mapgeo_path)
+    path = str(tmp_path / 'rewrite.mapgeo')
+    mg.write(path, 15)
+    result = lol_maya.MAPGEO()
+    result.read(path)
+    assert [geometry(model) for model in result.models] == [
+        geometry(model) for model in mg.models]
+    assert [model.layer for model in result.models] == [
+        model.layer for model in mg.models]
+
+
+@pytest.mark.parametrize('options, names', [
+    ('layers=1', ['MapGeo_Instance_0', 'MapGeo_Instance_2', 'MapGeo_Instance_4']),
+    ('layers=2,3', ['MapGeo_Instance_1', 'MapGeo_Instance_3', 'MapGeo_Instance_5']),
+    # box and sphere are in maya space, x is flipped
+    ('box=-260,-10,-10,-40,10,10', ['MapGeo_Instance_1', 'MapGeo_Instance_2']),
+    ('sphere=-400,0,0,30', ['MapGeo_Instance_4']),
+    ('layers=2;box=-460,-10,-10,-40,10,10', ['MapGeo_Instance_1', 'MapGeo_Instance_3']),
+])
+def test_filter_options(lol_maya, mapgeo_path, options, names):
+    model_filter = lol_maya.MAPGEOFilter.from_options(options)
+    mg = lol_maya.MAPGEO()
+    mg.read(mapgeo_path, lazy=True, model_filter=model_filter)
+    try:
+        assert [model.name for model in mg.models] == names
+    finally:
+        mg.close()
+
+
+def test_filter_options_empty(lol_maya):
+    assert lol_maya.MAPGEOFilter.from_options(
+        'ssmat=0;layers=;buckethash=;bush=;box=;sphere=;optimize=0') == None
+
+
+def test_grid_queries(lol_maya, mapgeo_path):
+    mg = lol_maya.MAPGEO()
+    mg.read(mapgeo_path, lazy=True)
+    try:
+        grid = mg.grid()
+        names = [model.name for model in grid.query_box(
+            (150.0, -10.0, -10.0), (320.0, 10.0, 10.0))]
+        assert sorted(names) == ['MapGeo_Instance_2', 'MapGeo_Instance_3']
+        names = [model.name for model in grid.query_sphere(
+            (0.0, 0.0, 0.0), 1.0)]
+        assert names == ['MapGeo_Instance_0']
+        # queries only use bounding boxes, no geometry decoded
+        assert all(model.toc != None for model in mg.models)
+    finally:
+        mg.close()
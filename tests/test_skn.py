@@ -0,0 +1,74 @@
+import os
+import random
+
+
+def read_skn(lol_maya, characters_path):
+    skn = lol_maya.SKN()
+    skn.read(os.path.join(characters_path, 'ambessa_base.domina.skn'))
+    return skn
+
+
+def vertex(skn, index):
+    return (
+        tuple(skn.positions[index*3:index*3+3]),
+        tuple(skn.influences[index*4:index*4+4]),
+        tuple(skn.weights[index*4:index*4+4]),
+        tuple(skn.uvs[index*2:index*2+2])
+    )
+
+
+def triangles(skn):
+    # triangles as vertex data, rotated to start at the smallest vertex so winding is kept
+    result = []
+    indices = skn.indices
+    for i in range(0, len(indices), 3):
+        triangle = [vertex(skn, index) for index in indices[i:i+3]]
+        first = triangle.index(min(triangle))
+        result.append(tuple(triangle[first:] + triangle[:first]))
+    return sorted(result)
+
+
+def test_optimize_keeps_triangles(lol_maya, characters_path):
+    skn = read_skn(lol_maya, characters_path)
+    # riot meshes are already optimized, shuffle triangles of each submesh
+    random.seed(4)
+    for submesh in skn.submeshes:
+        start = submesh.index_start
+        faces = [skn.indices[i:i+3].tolist()
+                 for i in range(start, start+submesh.index_count, 3)]
+        random.shuffle(faces)
+        skn.indices[start:start+submesh.index_count] = lol_maya.array(
+            'H', [index for face in faces for index in face])
+    before_triangles = triangles(skn)
+    before_acmr = lol_maya.VertexCache.acmr(skn.indices)
+
+    skn.optimize()
+
+    assert lol_maya.VertexCache.acmr(skn.indices) < before_acmr
+    assert triangles(skn) == before_triangles
+    # submeshes keep their own vertex range
+    for submesh in skn.submeshes:
+        submesh_indices = skn.indices[submesh.index_start:
+                                      submesh.index_start+submesh.index_count]
+        assert min(submesh_indices) >= submesh.vertex_start
+        assert max(submesh_indices) < submesh.vertex_start + submesh.vertex_count
+
+
+def test_write_read_round_trip(lol_maya, characters_path, tmp_path):
+    skn = read_skn(lol_maya, characters_path)
+    # normals are not read, only dumped from maya
+    skn.normals = lol_maya.array('f', [0.0, 1.0, 0.0]) * skn.vertex_count()
+    path = str(tmp_path / 'test.skn')
+    skn.write(path)
+
+    result = lol_maya.SKN()
+    result.read(path)
+    assert [(submesh.name, submesh.vertex_start, submesh.vertex_count,
+             submesh.index_start, submesh.index_count) for submesh in result.submeshes] == [
+        (submesh.name, submesh.vertex_start, submesh.vertex_count,
+         submesh.index_start, submesh.index_count) for submesh in skn.submeshes]
+    assert result.indices == skn.indices
+    assert result.positions == skn.positions
+    assert result.influences == skn.influences
+    assert result.weights == skn.weights
+    assert result.uvs == skn.uvs